@@ -0,0 +1,63 @@
+# Benchmark del índice IVF frente a la búsqueda exacta: recall@1 y latencia
+# Uso: python -m benchmarks.bench_ann --identidades 200000 --nprobe 1 4 8 16 32
+import argparse
+import time
+import numpy as np
+from clases.galeria import FaceGallery
+from benchmarks.datos import synthetic_identities, noisy_queries
+
+
+def build_gallery(vectors, ann=None):
+    gallery = FaceGallery()
+    if ann:
+        gallery.enable_ann(nlist=ann['nlist'], nprobe=ann['nprobe'], min_templates=0)
+    for i, vector in enumerate(vectors):
+        gallery.add(f"u{i}", vector)
+    gallery.prepare()
+    return gallery
+
+
+def run_queries(gallery, queries, exact=False):
+    """Devuelve (mejor nombre por consulta, latencias en ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        top = gallery.identify(query, k=1, exact=exact)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(top[0][0] if top else None)
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@1 y latencia del índice IVF")
+    parser.add_argument('--identidades', type=int, default=100000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = synthetic_identities(args.identidades, seed=args.semilla)
+    _, queries = noisy_queries(vectors, args.consultas, seed=args.semilla + 1)
+
+    gallery = build_gallery(vectors, ann={'nlist': args.nlist, 'nprobe': args.nprobe[0]})
+    start = time.perf_counter()
+    gallery.identify(queries[0])  # entrena el índice
+    print(f"🏗️  Entrenamiento IVF ({args.nlist} listas): {time.perf_counter() - start:.2f}s")
+
+    truth, exact_latency = run_queries(gallery, queries, exact=True)
+    print(f"{'MODO':<14} {'RECALL@1':>9} {'P50 ms':>9} {'P99 ms':>9}")
+    print("-" * 44)
+    print(f"{'exacta':<14} {1.0:>9.3f} {np.percentile(exact_latency, 50):>9.3f} "
+          f"{np.percentile(exact_latency, 99):>9.3f}")
+
+    for nprobe in args.nprobe:
+        gallery._ann.nprobe = nprobe
+        found, latency = run_queries(gallery, queries)
+        recall = np.mean([a == b for a, b in zip(found, truth)])
+        print(f"{'ivf nprobe=' + str(nprobe):<14} {recall:>9.3f} {np.percentile(latency, 50):>9.3f} "
+              f"{np.percentile(latency, 99):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Comparación de memoria y precisión de la galería según el almacenamiento
+# Uso: python -m benchmarks.bench_cuantizacion --identidades 100000
+import argparse
+import time
+import numpy as np
+from clases.galeria import FaceGallery, STORAGE_DTYPES
+from benchmarks.datos import synthetic_identities, noisy_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria y precisión por tipo de almacenamiento")
+    parser.add_argument('--identidades', type=int, default=100000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = synthetic_identities(args.identidades, seed=args.semilla)
+    labels, queries = noisy_queries(vectors, args.consultas, seed=args.semilla + 1)
+
+    reference = None
+    print(f"{'ALMACENAMIENTO':<15} {'MB TOTAL':>9} {'MB PLANT.':>10} {'B/IDENT.':>9} "
+          f"{'RECALL@1':>9} {'=FLOAT32':>9} {'ERR MAX':>9} {'P50 ms':>8}")
+    print("-" * 86)
+
+    for storage in STORAGE_DTYPES:
+        gallery = FaceGallery(storage=storage)
+        for i, vector in enumerate(vectors):
+            gallery.add(f"u{i}", vector)
+        gallery.prepare()
+
+        best, scores, latencies = [], [], []
+        for query in queries:
+            start = time.perf_counter()
+            top = gallery.identify(query, k=1)
+            latencies.append((time.perf_counter() - start) * 1000)
+            best.append(top[0][0])
+            scores.append(gallery.scores(query))
+
+        scores = np.vstack(scores)
+        if reference is None:
+            reference = (best, scores)
+
+        usage = gallery.memory_usage()
+        recall = np.mean([name == f"u{label}" for name, label in zip(best, labels)])
+        agreement = np.mean([a == b for a, b in zip(best, reference[0])])
+        max_error = float(np.abs(scores - reference[1]).max())
+        print(f"{storage:<15} {usage['total'] / 1e6:>9.1f} {usage['plantillas'] / 1e6:>10.1f} "
+              f"{usage['total'] / len(gallery):>9.0f} {recall:>9.3f} {agreement:>9.3f} "
+              f"{max_error:>9.5f} {np.percentile(latencies, 50):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Velocidad y precisión de los extractores de características sobre un conjunto etiquetado local
+# Uso: python -m benchmarks.bench_descriptores --datos caras/ [--recortadas] [--tipos hist256_v1 lbp_u2_7x7_v1]
+#      (caras/<persona>/*.jpg o caras/<persona>.N.jpg, como known_faces_dir)
+import argparse
+import os
+import re
+import time
+import cv2
+import numpy as np
+from clases.descriptores import DESCRIPTORS
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pgm', '.bmp')
+NUMBERED_NAME = re.compile(r'^(.*)\.\d+$')
+
+
+def load_faces(folder, cropped):
+    """Recortes en gris ecualizado y etiqueta de cada imagen con rostro detectado"""
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    labels, rois = [], []
+    missed = 0
+    detection = 0.0
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+            if cropped:
+                roi = gray
+            else:
+                started = time.perf_counter()
+                faces = cascade.detectMultiScale(gray, 1.3, 5)
+                detection += time.perf_counter() - started
+                if len(faces) == 0:
+                    missed += 1
+                    continue
+                x, y, w, h = faces[0]
+                roi = gray[y:y+h, x:x+w]
+
+            if os.path.abspath(root) != os.path.abspath(folder):
+                label = os.path.basename(root)
+            else:
+                stem = os.path.splitext(filename)[0]
+                match = NUMBERED_NAME.match(stem)
+                label = match.group(1) if match else stem
+            labels.append(label)
+            rois.append(roi)
+    return np.array(labels), rois, missed, detection
+
+
+def rank1_accuracy(scores, labels):
+    """Identificación dejando uno fuera: la mejor identidad del resto de imágenes es la correcta"""
+    identities, owners = np.unique(labels, return_inverse=True)
+    scores = scores.copy()
+    np.fill_diagonal(scores, -np.inf)
+    per_identity = np.full((len(labels), len(identities)), -np.inf, dtype=np.float32)
+    for identity in range(len(identities)):
+        per_identity[:, identity] = scores[:, owners == identity].max(axis=1)
+    # Solo cuentan las consultas cuya identidad tiene alguna otra imagen
+    counts = np.bincount(owners)
+    queries = counts[owners] > 1
+    return float(np.mean(per_identity[queries].argmax(axis=1) == owners[queries]))
+
+
+def equal_error_rate(scores, labels):
+    """EER de verificación sobre todos los pares y el umbral en que se alcanza"""
+    upper = np.triu_indices(len(labels), k=1)
+    pair_scores = scores[upper]
+    same = labels[upper[0]] == labels[upper[1]]
+    genuine = np.sort(pair_scores[same])
+    impostor = np.sort(pair_scores[~same])
+    if not len(genuine) or not len(impostor):
+        return float('nan'), float('nan')
+
+    thresholds = np.unique(np.quantile(pair_scores, np.linspace(0, 1, 2001)))
+    far = 1 - np.searchsorted(impostor, thresholds, side='left') / len(impostor)
+    frr = np.searchsorted(genuine, thresholds, side='left') / len(genuine)
+    best = np.argmin(np.abs(far - frr))
+    return float((far[best] + frr[best]) / 2), float(thresholds[best])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparativa de extractores de características")
+    parser.add_argument('--datos', required=True, help="Carpeta con imágenes etiquetadas por persona")
+    parser.add_argument('--recortadas', action='store_true', help="Las imágenes ya son recortes del rostro")
+    parser.add_argument('--tipos', nargs='+', default=list(DESCRIPTORS), choices=list(DESCRIPTORS))
+    parser.add_argument('--repeticiones', type=int, default=3, help="Pasadas de extracción cronometradas")
+    args = parser.parse_args()
+
+    labels, rois, missed, detection = load_faces(args.datos, args.recortadas)
+    if len(rois) < 2:
+        raise SystemExit("❌ Se necesitan al menos dos rostros etiquetados")
+    print(f"📂 {len(rois)} rostros de {len(np.unique(labels))} personas "
+          f"({missed} imágenes sin rostro detectado)")
+    if not args.recortadas:
+        print(f"🔍 Detección Haar (común a ambos extractores): "
+              f"{detection / (len(rois) + missed) * 1e6:.0f} us/imagen")
+
+    print(f"{'TIPO':<16} {'DIM':>6} {'US/ROSTRO':>10} {'RANK-1':>7} {'EER':>7} {'UMBRAL EER':>11}")
+    print("-" * 62)
+    for feature_type in args.tipos:
+        dim, descriptor = DESCRIPTORS[feature_type]
+        timings = []
+        for _ in range(args.repeticiones):
+            started = time.perf_counter()
+            features = np.stack([descriptor(roi) for roi in rois]).astype(np.float32)
+            timings.append((time.perf_counter() - started) / len(rois) * 1e6)
+
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        features /= np.maximum(norms, 1e-12)
+        scores = features @ features.T
+        eer, threshold = equal_error_rate(scores, labels)
+        print(f"{feature_type:<16} {dim:>6} {min(timings):>10.0f} {rank1_accuracy(scores, labels):>7.3f} "
+              f"{eer:>7.3f} {threshold:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Latencia por frame, sensibilidad y memoria de cada detector de rostros en CPU
+# Uso: python -m benchmarks.bench_detectores --positivas caras/ [--anotaciones cajas.csv] [--negativas fondos/]
+#      cajas.csv: archivo,x,y,w,h (una fila por rostro, rutas relativas a --positivas)
+import argparse
+import csv
+import multiprocessing
+import os
+import resource
+import time
+import cv2
+import numpy as np
+from clases.detectores import DETECTOR_BACKENDS, create_detector
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def list_images(folder):
+    paths = []
+    for root, _, files in os.walk(folder or ''):
+        paths += [os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return paths
+
+
+def load_annotations(filename, folder):
+    """Recuadros anotados por imagen: {ruta: [(x, y, w, h), ...]}"""
+    boxes = {}
+    with open(filename, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            path = os.path.join(folder, row['archivo'])
+            boxes.setdefault(path, []).append(tuple(int(row[key]) for key in ('x', 'y', 'w', 'h')))
+    return boxes
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend, positives, negatives, annotations, repetitions, threads):
+    """Mide un detector en un proceso limpio para que la memoria sea solo suya"""
+    cv2.setNumThreads(threads)
+    images = [(path, cv2.imread(path)) for path in positives]
+    images = [(path, image) for path, image in images if image is not None]
+    background = [image for image in (cv2.imread(path) for path in negatives) if image is not None]
+    baseline = peak_rss_mb()
+
+    try:
+        detector = create_detector(backend)
+    except (FileNotFoundError, cv2.error, ValueError) as e:
+        return {'detector': backend, 'error': str(e)}
+    loaded = peak_rss_mb()
+
+    latencies = []
+    found = expected = detected_images = 0
+    for path, image in images:
+        for _ in range(repetitions):
+            started = time.perf_counter()
+            faces = detector.detect(image)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if path in annotations:
+            # Un rostro anotado cuenta si algún recuadro lo cubre con IoU >= 0.5
+            for box in annotations[path]:
+                expected += 1
+                found += any(iou(box, face) >= 0.5 for face in faces)
+        else:
+            expected += 1
+            found += len(faces) > 0
+        detected_images += len(faces) > 0
+
+    false_positives = sum(len(detector.detect(image)) for image in background)
+    return {
+        'detector': backend,
+        'p50_ms': float(np.percentile(latencies, 50)) if latencies else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if latencies else 0.0,
+        'sensibilidad': found / expected if expected else float('nan'),
+        'falsos_por_imagen': false_positives / len(background) if background else float('nan'),
+        'memoria_modelo_mb': loaded - baseline,
+        'memoria_total_mb': peak_rss_mb() - baseline,
+        'imagenes': len(images)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparativa de detectores de rostros")
+    parser.add_argument('--positivas', required=True, help="Imágenes con al menos un rostro")
+    parser.add_argument('--anotaciones', help="CSV archivo,x,y,w,h para medir la sensibilidad por rostro")
+    parser.add_argument('--negativas', help="Imágenes sin rostros para contar falsos positivos")
+    parser.add_argument('--detectores', nargs='+', default=list(DETECTOR_BACKENDS), choices=DETECTOR_BACKENDS)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--hilos', type=int, default=1, help="Hilos de OpenCV por detector")
+    args = parser.parse_args()
+
+    positives = list_images(args.positivas)
+    negatives = list_images(args.negativas)
+    annotations = load_annotations(args.anotaciones, args.positivas) if args.anotaciones else {}
+    if not positives:
+        raise SystemExit("❌ No hay imágenes en --positivas")
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'DETECTOR':<9} {'P50 MS':>8} {'P99 MS':>8} {'SENSIB.':>8} {'FP/IMG':>7} "
+          f"{'MODELO MB':>10} {'TOTAL MB':>9}")
+    print("-" * 64)
+    for backend in args.detectores:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_backend, (backend, positives, negatives, annotations,
+                                              args.repeticiones, args.hilos))
+        if 'error' in result:
+            print(f"{backend:<9} ⚠️  {result['error']}")
+            continue
+        print(f"{backend:<9} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['sensibilidad']:>8.3f} "
+              f"{result['falsos_por_imagen']:>7.2f} {result['memoria_modelo_mb']:>10.1f} "
+              f"{result['memoria_total_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Benchmark de la identificación repartida en K procesos frente a un solo proceso
+# Uso: python -m benchmarks.bench_fragmentos --tamanos 100000 400000 --fragmentos 1 2 4
+import argparse
+import time
+import numpy as np
+from clases.galeria import FaceGallery
+from clases.galeria_fragmentada import ShardedGallery
+from benchmarks.datos import synthetic_identities, noisy_queries
+
+
+def measure(identify_batch, queries, batch_size):
+    """Latencia por consulta individual (p50/p99 en ms) y rendimiento por lotes (consultas/s)"""
+    latencies = []
+    for query in queries[:200]:
+        started = time.perf_counter()
+        identify_batch(query[None, :])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        identify_batch(queries[start:start + batch_size])
+    throughput = len(queries) / (time.perf_counter() - started)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identificación 1:N repartida en fragmentos")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[100000, 400000])
+    parser.add_argument('--fragmentos', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--consultas', type=int, default=1000)
+    parser.add_argument('--lote', type=int, default=32)
+    parser.add_argument('--almacenamiento', default='float32', choices=['float32', 'float16', 'uint8'])
+    args = parser.parse_args()
+
+    print(f"{'PLANTILLAS':>10} {'MODO':<14} {'P50 MS':>8} {'P99 MS':>8} {'CONSULTAS/S':>12} {'ACIERTO':>8}")
+    print("-" * 66)
+    for size in args.tamanos:
+        identities = synthetic_identities(size, seed=0)
+        labels, queries = noisy_queries(identities, args.consultas, seed=1)
+        gallery = FaceGallery(storage=args.almacenamiento)
+        for i, vector in enumerate(identities):
+            gallery.add(f"u{i}", vector, f"u{i}/0.jpg")
+
+        def accuracy(identify_batch):
+            results = identify_batch(queries[:200])
+            return np.mean([bool(top) and top[0][0] == f"u{label}" for top, label in zip(results, labels)])
+
+        baseline = lambda batch: gallery.identify_batch(list(batch))
+        p50, p99, throughput = measure(baseline, queries, args.lote)
+        print(f"{size:>10} {'1 proceso':<14} {p50:>8.2f} {p99:>8.2f} {throughput:>12.0f} "
+              f"{accuracy(baseline):>8.3f}")
+
+        for shards in args.fragmentos:
+            sharded = ShardedGallery(shards, storage=args.almacenamiento)
+            try:
+                started = time.perf_counter()
+                sharded.load(gallery)
+                load_ms = (time.perf_counter() - started) * 1000
+                p50, p99, throughput = measure(sharded.identify_batch, queries, args.lote)
+                label = f"{shards} fragmentos"
+                print(f"{size:>10} {label:<14} {p50:>8.2f} {p99:>8.2f} {throughput:>12.0f} "
+                      f"{accuracy(sharded.identify_batch):>8.3f}  (reparto {load_ms:.0f} ms)")
+            finally:
+                sharded.close()
+
+
+if __name__ == "__main__":
+    main()
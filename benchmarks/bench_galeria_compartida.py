@@ -0,0 +1,124 @@
+# Benchmark de la galería en memoria compartida: RSS por proceso y latencia de propagación
+# Uso: python -m benchmarks.bench_galeria_compartida --identidades 200000 --procesos 4
+import argparse
+import os
+import pickle
+import time
+import multiprocessing
+import numpy as np
+from clases.galeria import FaceGallery
+from clases.galeria_compartida import SharedGalleryPublisher, SharedGalleryReader
+from benchmarks.datos import synthetic_identities
+
+
+def memory_status():
+    """RSS anónima y compartida del proceso actual en MB (Linux)"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssShmem'):
+                values[key] = int(value.split()[0]) / 1024
+    return values
+
+
+def shared_worker(prefix, query, updates, results):
+    """Adjunta la galería compartida, la usa y mide cuándo ve cada generación"""
+    reader = SharedGalleryReader(prefix)
+    gallery = reader.refresh()
+    gallery.identify(query)
+    results.put(('memoria', os.getpid(), memory_status()))
+
+    seen = reader.generation
+    while seen < updates + 1:
+        reader.refresh()
+        if reader.generation != seen:
+            seen = reader.generation
+            results.put(('generacion', seen, time.perf_counter()))
+        else:
+            time.sleep(0.0005)
+    reader.close()
+
+
+def private_worker(payload, query, results):
+    """Referencia: cada proceso deserializa su propia copia de la galería"""
+    gallery = pickle.loads(payload)
+    gallery.identify(query)
+    results.put(('memoria', os.getpid(), memory_status()))
+
+
+def build_gallery(count, seed):
+    gallery = FaceGallery()
+    for i, vector in enumerate(synthetic_identities(count, seed=seed)):
+        gallery.add(f"u{i}", vector)
+    return gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS y propagación de la galería compartida")
+    parser.add_argument('--identidades', type=int, default=100000)
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--actualizaciones', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    gallery = build_gallery(args.identidades, args.semilla)
+    query = synthetic_identities(1, seed=args.semilla + 99)[0]
+    prefix = f"bench_galeria_{os.getpid()}"
+    publisher = SharedGalleryPublisher(prefix)
+    publisher.publish(gallery)
+
+    # 'spawn' evita que los procesos hereden por fork la galería del proceso principal
+    context = multiprocessing.get_context('spawn')
+    try:
+        # Copia privada por proceso
+        results = context.Queue()
+        payload = pickle.dumps(gallery)
+        workers = [context.Process(target=private_worker, args=(payload, query, results))
+                   for _ in range(args.procesos)]
+        for worker in workers:
+            worker.start()
+        private = [results.get()[2] for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        # Memoria compartida
+        results = context.Queue()
+        workers = [context.Process(target=shared_worker, args=(prefix, query, args.actualizaciones, results))
+                   for _ in range(args.procesos)]
+        for worker in workers:
+            worker.start()
+        shared = [results.get()[2] for _ in workers]
+
+        latencies = []
+        extra = synthetic_identities(args.actualizaciones, seed=args.semilla + 7)
+        for i, vector in enumerate(extra):
+            published_at = time.perf_counter()
+            gallery.add(f"nuevo{i}", vector)
+            generation = publisher.publish(gallery)
+            seen = 0
+            while seen < len(workers):
+                kind, value, at = results.get()
+                if kind == 'generacion' and value == generation:
+                    latencies.append((at - published_at) * 1000)
+                    seen += 1
+        for worker in workers:
+            worker.join()
+    finally:
+        publisher.close()
+
+    print(f"📦 Galería: {args.identidades} identidades, "
+          f"{gallery.memory_usage()['plantillas'] / 1e6:.1f} MB de plantillas")
+    print(f"{'MODO':<12} {'RSS MB':>9} {'ANÓN MB':>9} {'COMPART. MB':>12}")
+    print("-" * 45)
+    for label, samples in (('privada', private), ('compartida', shared)):
+        print(f"{label:<12} {np.mean([s['VmRSS'] for s in samples]):>9.1f} "
+              f"{np.mean([s['RssAnon'] for s in samples]):>9.1f} "
+              f"{np.mean([s['RssShmem'] for s in samples]):>12.1f}")
+    print(f"\n⏱️  Propagación de {args.actualizaciones} altas a {args.procesos} procesos "
+          f"(incluye alta y publicación): p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Generador de carga para el servicio de reconocimiento por micro-lotes
+# Uso: python -m benchmarks.carga_reconocimiento --clientes 1 8 32 --peticiones 400 [--url http://host:8200]
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import urllib.request
+import cv2
+import numpy as np
+import config
+from clases.reconocimiento_fac import FacialRecognition
+from clases.servicio_reconocimiento import RecognitionServer
+from benchmarks.datos import synthetic_identities
+
+
+def load_images(folder, limit=200):
+    """Imágenes JPEG del directorio indicado; si no hay, imágenes sintéticas sin rostro"""
+    paths = []
+    for extension in ('jpg', 'jpeg', 'png'):
+        paths += glob.glob(os.path.join(folder, '**', f'*.{extension}'), recursive=True)
+    images = []
+    for path in sorted(paths)[:limit]:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(cv2.imencode('.jpg', image)[1].tobytes())
+    if images:
+        return images, True
+
+    rng = np.random.default_rng(0)
+    for _ in range(16):
+        image = cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (9, 9), 0)
+        images.append(cv2.imencode('.jpg', image)[1].tobytes())
+    return images, False
+
+
+def post_image(url, payload):
+    request = urllib.request.Request(url + '/reconocer', data=payload, headers={'Content-Type': 'image/jpeg'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def run_clients(url, images, clients, requests):
+    """Lanza ``clients`` hilos que envían ``requests`` peticiones en total"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            try:
+                post_image(url, images[index % len(images)])
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, latencies, errors
+
+
+def fetch_metrics(url):
+    """Métricas del servicio desde la última lectura"""
+    with urllib.request.urlopen(url + '/reconocer/metricas?reiniciar=1', timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga concurrente sobre POST /reconocer")
+    parser.add_argument('--url', help="Servicio ya en marcha; sin ella se arranca uno local")
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--peticiones', type=int, default=400)
+    parser.add_argument('--imagenes', default=config.SYSTEM_CONFIG['known_faces_dir'])
+    parser.add_argument('--identidades', type=int, default=20000, help="Galería sintética del servicio local")
+    parser.add_argument('--lote', type=int, default=None)
+    parser.add_argument('--espera-ms', type=float, default=None)
+    parser.add_argument('--procesos', type=int, default=None)
+    args = parser.parse_args()
+
+    images, with_faces = load_images(args.imagenes)
+    if not with_faces:
+        print("⚠️  Sin imágenes de rostros: se miden decodificación y detección, no la comparación")
+
+    server = None
+    url = args.url
+    if not url:
+        recognizer = FacialRecognition(None, load_faces=False)
+        vectors = synthetic_identities(args.identidades, seed=0)
+        recognizer.gallery_service.bulk_load([(f"u{i}", f"u{i}/0.jpg", vector)
+                                              for i, vector in enumerate(vectors)])
+        server = RecognitionServer(recognizer, port=0, batch_size=args.lote,
+                                   max_wait_ms=args.espera_ms, workers=args.procesos)
+        server.start()
+        url = f"http://localhost:{server.port}"
+
+    try:
+        post_image(url, images[0])      # calentamiento de los procesos de extracción
+        fetch_metrics(url)
+        print(f"{'CLIENTES':>8} {'PETICIONES/S':>13} {'P50 MS':>8} {'P99 MS':>8} {'LOTE MEDIO':>11} "
+              f"{'LLENADO':>8} {'COLA P99':>9} {'ERRORES':>8}")
+        print("-" * 82)
+        for clients in args.clientes:
+            throughput, latencies, errors = run_clients(url, images, clients, args.peticiones)
+            metrics = fetch_metrics(url)
+            p50 = np.percentile(latencies, 50) if latencies else 0.0
+            p99 = np.percentile(latencies, 99) if latencies else 0.0
+            print(f"{clients:>8} {throughput:>13.1f} {p50:>8.1f} {p99:>8.1f} "
+                  f"{metrics['tamano_medio_lote']:>11.2f} {metrics['llenado_medio_lote']:>8.2f} "
+                  f"{metrics['espera_cola_p99_ms']:>9.1f} {len(errors):>8}")
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
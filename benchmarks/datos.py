@@ -0,0 +1,21 @@
+# Datos sintéticos compartidos por los benchmarks
+import numpy as np
+from clases.galeria import FEATURE_DIM
+from clases.datos_sinteticos import synthetic_face  # noqa: F401 (compartido con generar-datos)
+
+
+def synthetic_identities(count, dim=FEATURE_DIM, seed=0):
+    """Vectores no negativos con forma de histograma (uno por identidad)"""
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(shape=2.0, scale=1.0, size=(count, dim)).astype(np.float32)
+    return base / np.linalg.norm(base, axis=1, keepdims=True)
+
+
+def noisy_queries(identities, count, noise=0.35, seed=1):
+    """Consultas ruidosas de identidades conocidas; devuelve (índices, vectores)"""
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, len(identities), size=count)
+    noise_matrix = rng.gamma(shape=2.0, scale=1.0, size=(count, identities.shape[1])).astype(np.float32)
+    noise_matrix /= np.linalg.norm(noise_matrix, axis=1, keepdims=True)
+    queries = identities[labels] + noise * noise_matrix
+    return labels, queries.astype(np.float32)
@@ -0,0 +1,93 @@
+# Prueba de estrés del servicio de galería: altas/bajas concurrentes con identificaciones
+# Uso: python -m benchmarks.estres_galeria --lectores 8 --escritores 2 --segundos 10
+import argparse
+import threading
+import time
+from clases.galeria import FaceGallery
+from clases.servicio_galeria import GalleryService
+from benchmarks.datos import synthetic_identities
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés lectores-escritor del servicio de galería")
+    parser.add_argument('--identidades', type=int, default=5000)
+    parser.add_argument('--lectores', type=int, default=8)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    args = parser.parse_args()
+
+    stable = synthetic_identities(args.identidades, seed=0)
+    churn = synthetic_identities(1000, seed=1)
+
+    service = GalleryService(lambda: FaceGallery(max_templates=3))
+    service.bulk_load([(f"u{i}", f"u{i}.jpg", vector) for i, vector in enumerate(stable)])
+
+    stop = threading.Event()
+    errors = []
+    counters = {'identificaciones': 0, 'verificaciones': 0, 'altas': 0, 'bajas': 0}
+    counter_lock = threading.Lock()
+
+    def count(key, amount=1):
+        with counter_lock:
+            counters[key] += amount
+
+    def reader(seed):
+        index = seed
+        try:
+            while not stop.is_set():
+                index = (index + 7919) % len(stable)
+                snapshot = service.snapshot()
+                top = snapshot.identify(stable[index], k=3)
+                # Los usuarios estables nunca se modifican: deben reconocerse siempre
+                if not top or top[0][0] != f"u{index}" or top[0][1] < 0.999:
+                    errors.append(f"identificación incorrecta de u{index}: {top[:1]}")
+                if snapshot.verify(stable[index], f"u{index}") < 0.999:
+                    errors.append(f"verificación incorrecta de u{index}")
+                # Coherencia interna de la instantánea
+                if len(snapshot.names()) != len(snapshot):
+                    errors.append("instantánea inconsistente")
+                count('identificaciones')
+                count('verificaciones')
+        except Exception as e:
+            errors.append(f"lector: {e!r}")
+
+    def writer(seed):
+        index = seed
+        try:
+            while not stop.is_set():
+                index = (index + 1) % len(churn)
+                name = f"temporal{index % 50}"
+                service.enroll(name, churn[index], f"{name}/{index}.jpg")
+                count('altas')
+                if index % 5 == 0:
+                    service.remove(f"temporal{(index * 7) % 50}")
+                    count('bajas')
+        except Exception as e:
+            errors.append(f"escritor: {e!r}")
+
+    threads = [threading.Thread(target=reader, args=(i * 101,)) for i in range(args.lectores)]
+    threads += [threading.Thread(target=writer, args=(i * 13,)) for i in range(args.escritores)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.segundos)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    print(f"⏱️  {elapsed:.1f}s, {args.lectores} lectores, {args.escritores} escritores, "
+          f"versión final {service.version}")
+    for key, value in counters.items():
+        print(f"   {key:<16} {value:>8} ({value / elapsed:.0f}/s)")
+
+    if errors:
+        print(f"❌ {len(errors)} errores; primeros:")
+        for error in errors[:10]:
+            print(f"   {error}")
+        raise SystemExit(1)
+    print("✅ Sin errores ni resultados inconsistentes")
+
+
+if __name__ == "__main__":
+    main()
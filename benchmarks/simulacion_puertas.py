@@ -0,0 +1,191 @@
+# Simulación local de varias puertas contra la galería central (un proceso por nodo)
+# Uso: python -m benchmarks.simulacion_puertas --nodos 4 --identidades 20000 --altas 20
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from clases.reconocimiento_fac import FacialRecognition
+from clases.galeria_central import CentralGalleryServer, DoorNode
+from benchmarks.datos import synthetic_identities, noisy_queries
+
+TOKEN = 'simulacion-puertas'     # secreto compartido entre el central y los nodos
+
+
+def node_worker(node_id, url, snapshot_path, interval, stop, results):
+    """Nodo de puerta: identifica consultas sin parar y informa de cada versión nueva"""
+    recognizer = FacialRecognition(None, load_faces=False)
+    events_path = os.path.join(os.path.dirname(snapshot_path), f"{node_id}.jsonl")
+    node = DoorNode(recognizer, url, node_id, snapshot_path, sync_interval=interval, event_batch=50,
+                    events_path=events_path, token=TOKEN)
+    node.start()
+    seed = int(node_id.rsplit('-', 1)[1])
+    _, queries = noisy_queries(synthetic_identities(1000, seed=0), 500, seed=seed)
+
+    seen_version = None
+    identified = offline_identified = recorded = 0
+    index = 0
+    while not stop.is_set():
+        version = node.version
+        if version != seen_version:
+            seen_version = version
+            results.put(('version', node_id, version, time.perf_counter()))
+
+        gallery = recognizer.gallery
+        if len(gallery):
+            top = gallery.identify(queries[index % len(queries)])
+            identified += 1
+            if not node.online:
+                offline_identified += 1
+            node.record_access(None, top[0][0] if top else "Desconocido",
+                               'PERMITIDO' if top else 'DENEGADO', top[0][1] if top else 0.0, None)
+            recorded += 1
+        index += 1
+        time.sleep(0.005)
+
+    node.stop()
+    results.put(('fin', node_id, {'identificaciones': identified, 'sin_conexion': offline_identified,
+                                  'eventos': recorded, 'pendientes': node.pending_events,
+                                  'version': node.version}, time.perf_counter()))
+
+
+def offline_boot(node_id, url, snapshot_path, results):
+    """Arranca un nodo con el central caído: solo cuenta con su instantánea local"""
+    recognizer = FacialRecognition(None, load_faces=False)
+    node = DoorNode(recognizer, url, node_id, snapshot_path, timeout=1.0, token=TOKEN)
+    loaded = node.load_local_snapshot()
+    online = node.step()
+    results.put((loaded, online, node.version, len(recognizer.gallery)))
+
+
+def wait_versions(results, nodes, version, started, timeout=30.0):
+    """Espera a que todos los nodos alcancen ``version``; devuelve latencias en ms"""
+    latencies = {}
+    deadline = time.time() + timeout
+    while len(latencies) < len(nodes) and time.time() < deadline:
+        try:
+            kind, node_id, value, at = results.get(timeout=0.5)
+        except Exception:
+            continue
+        if kind == 'version' and value >= version and node_id not in latencies:
+            latencies[node_id] = (at - started) * 1000
+    missing = set(nodes) - set(latencies)
+    if missing:
+        raise SystemExit(f"❌ Nodos sin converger a la versión {version}: {sorted(missing)}")
+    return list(latencies.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación de N puertas con galería central")
+    parser.add_argument('--nodos', type=int, default=4)
+    parser.add_argument('--identidades', type=int, default=20000)
+    parser.add_argument('--altas', type=int, default=20, help="Altas con el central en línea")
+    parser.add_argument('--altas-sin-conexion', type=int, default=10)
+    parser.add_argument('--intervalo', type=float, default=0.2, help="Intervalo de sincronización de los nodos")
+    parser.add_argument('--segundos-sin-conexion', type=float, default=3.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='simulacion_puertas_')
+    central_recognizer = FacialRecognition(None, load_faces=False)
+    service = central_recognizer.gallery_service
+    vectors = synthetic_identities(args.identidades, seed=0)
+    service.bulk_load([(f"u{i}", f"u{i}/0.jpg", vector) for i, vector in enumerate(vectors)])
+
+    central = CentralGalleryServer(central_recognizer, port=0, token=TOKEN)
+    central.start()
+    url = f"http://localhost:{central.port}"
+
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    results = context.Queue()
+    node_ids = [f"puerta-{i + 1}" for i in range(args.nodos)]
+    processes = [context.Process(target=node_worker,
+                                 args=(node_id, url, os.path.join(workdir, f"{node_id}.fgs"),
+                                       args.intervalo, stop, results))
+                 for node_id in node_ids]
+    try:
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        bootstrap = wait_versions(results, node_ids, service.version, started, timeout=120.0)
+
+        # Altas con el central en línea: cada una debe llegar a todos los nodos como delta
+        extra = synthetic_identities(args.altas + args.altas_sin_conexion, seed=7)
+        propagation = []
+        for i in range(args.altas):
+            published = time.perf_counter()
+            service.enroll(f"nuevo{i}", extra[i], f"nuevo{i}/0.jpg")
+            propagation += wait_versions(results, node_ids, service.version, published)
+
+        # Central caído: los nodos siguen identificando con su réplica
+        central.shutdown()
+        for i in range(args.altas, args.altas + args.altas_sin_conexion):
+            service.enroll(f"nuevo{i}", extra[i], f"nuevo{i}/0.jpg")
+        service.remove("u0")
+        time.sleep(args.segundos_sin_conexion)
+
+        reconnected = time.perf_counter()
+        central.start()
+        catch_up = wait_versions(results, node_ids, service.version, reconnected)
+
+        stop.set()
+        summaries = {}
+        while len(summaries) < len(node_ids):
+            kind, node_id, value, _ = results.get(timeout=60)
+            if kind == 'fin':
+                summaries[node_id] = value
+        for process in processes:
+            process.join()
+        received = len(central.events)
+
+        # Arranque sin conexión desde la instantánea local de un nodo
+        central.shutdown()
+        boot_results = context.Queue()
+        boot = context.Process(target=offline_boot,
+                               args=(node_ids[0], url, os.path.join(workdir, f"{node_ids[0]}.fgs"),
+                                     boot_results))
+        boot.start()
+        loaded, online, boot_version, boot_users = boot_results.get(timeout=60)
+        boot.join()
+    finally:
+        stop.set()
+        central.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sent = sum(summary['eventos'] for summary in summaries.values())
+    pending = sum(summary['pendientes'] for summary in summaries.values())
+    print(f"\n📦 Galería central: {args.identidades} identidades, versión final {service.version}")
+    print(f"🚀 Arranque de {args.nodos} nodos (instantánea completa): "
+          f"máx {max(bootstrap):.0f} ms")
+    print(f"🔄 Propagación de {args.altas} altas (delta): p50 {np.percentile(propagation, 50):.0f} ms, "
+          f"p99 {np.percentile(propagation, 99):.0f} ms (intervalo {args.intervalo}s)")
+    print(f"🔌 Reconexión tras {args.segundos_sin_conexion}s sin central: "
+          f"puesta al día en máx {max(catch_up):.0f} ms")
+    print(f"{'NODO':<12} {'IDENTIF.':>9} {'SIN CONEX.':>11} {'EVENTOS':>8} {'PEND.':>6} {'VERSIÓN':>8}")
+    for node_id, summary in sorted(summaries.items()):
+        print(f"{node_id:<12} {summary['identificaciones']:>9} {summary['sin_conexion']:>11} "
+              f"{summary['eventos']:>8} {summary['pendientes']:>6} {summary['version']:>8}")
+    print(f"📨 Eventos: {sent} generados, {received} recibidos por el central, {pending} pendientes")
+    print(f"💾 Arranque sin conexión: instantánea local {'cargada' if loaded else 'ausente'}, "
+          f"versión {boot_version}, {boot_users} usuarios, central {'en línea' if online else 'caído'}")
+
+    errors = []
+    if received != sent:
+        errors.append("se perdieron o duplicaron eventos")
+    if any(summary['version'] != service.version for summary in summaries.values()):
+        errors.append("algún nodo terminó con otra versión")
+    if not loaded or boot_version != service.version or online:
+        errors.append("el arranque sin conexión no recuperó la última réplica")
+    if not all(summary['sin_conexion'] for summary in summaries.values()):
+        errors.append("algún nodo dejó de identificar sin conexión")
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        raise SystemExit(1)
+    print("✅ Todos los nodos convergieron sin perder eventos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+# Suite de rendimiento de los caminos críticos: extracción, reconocimiento, carga de galería, base de datos y panel web
+# Uso: python -m benchmarks.suite --salida resultados.json [--comparar base.json] [--mysql] [--panel http://localhost:8000]
+#      Sin --mysql la base de datos se mide sobre SQLite en un archivo temporal (mismas consultas que database.py).
+#      Con --mysql se escriben accesos en la base configurada: usar una base de pruebas.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime
+import cv2
+import numpy as np
+import config
+from benchmarks.datos import synthetic_face, synthetic_identities
+from clases.datos_sinteticos import access_batches
+
+SECTIONS = ('extraccion', 'reconocimiento', 'carga_galeria', 'base_datos', 'web')
+
+# Esquema mínimo equivalente al de database.py para la variante SQLite
+SQLITE_SCHEMA = """
+    CREATE TABLE usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre VARCHAR(100) NOT NULL UNIQUE,
+        password_hash VARCHAR(255) NOT NULL,
+        fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
+        activo BOOLEAN DEFAULT 1,
+        ultimo_acceso DATETIME,
+        rol VARCHAR(10) DEFAULT 'user'
+    );
+    CREATE TABLE accesos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INT NULL REFERENCES usuarios(id) ON DELETE SET NULL,
+        nombre_usuario VARCHAR(100) NOT NULL,
+        tipo_acceso VARCHAR(10) NOT NULL,
+        fecha_acceso DATETIME DEFAULT CURRENT_TIMESTAMP,
+        similitud FLOAT,
+        imagen_path VARCHAR(255),
+        confianza FLOAT
+    );
+"""
+
+
+def latency_stats(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'media_ms': round(float(samples.mean()), 4)
+    }
+
+
+def quiet():
+    """Silencia los mensajes de progreso de las clases medidas"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def new_recognizer():
+    from clases.reconocimiento_fac import FacialRecognition
+    with quiet():
+        return FacialRecognition(None, load_faces=False)
+
+
+def bench_extraction(args):
+    """Rendimiento de ``extract_advanced_features`` sobre rostros sintéticos"""
+    recognizer = new_recognizer()
+    images = [synthetic_face(i, 0) for i in range(args.rostros)]
+    for image in images[:5]:
+        recognizer.extract_advanced_features(image)
+
+    timings = []
+    detected = 0
+    started = time.perf_counter()
+    for _ in range(args.repeticiones):
+        for image in images:
+            t = time.perf_counter()
+            features = recognizer.extract_advanced_features(image)
+            timings.append((time.perf_counter() - t) * 1000)
+            detected += features is not None
+    elapsed = time.perf_counter() - started
+    return dict(latency_stats(timings),
+                imagenes_por_s=round(len(timings) / elapsed, 2),
+                deteccion=round(detected / len(timings), 4),
+                resolucion=list(images[0].shape[:2]))
+
+
+def bench_recognition(args):
+    """Latencia de ``recognize_face`` (extracción + 1:N) según el tamaño de la galería"""
+    recognizer = new_recognizer()
+    probes, enrolled = [], []
+    for identity in range(args.rostros):
+        features = recognizer.extract_advanced_features(synthetic_face(identity, 0))
+        if features is not None:
+            enrolled.append((f"rostro_{identity}", f"rostro_{identity}.jpg", features))
+            probes.append(synthetic_face(identity, 1))
+    if not enrolled:
+        return {'omitido': "El detector no encontró rostro en ninguna cara sintética"}
+
+    results = {}
+    for size in args.tamanos:
+        filler = synthetic_identities(max(0, size - len(enrolled)), dim=len(enrolled[0][2]), seed=args.semilla)
+        items = enrolled + [(f"u{i}", f"u{i}.jpg", vector) for i, vector in enumerate(filler)]
+        recognizer.gallery_service.bulk_load(items)
+
+        timings, matching = [], []
+        correct = 0
+        with quiet():
+            for _ in range(args.repeticiones):
+                for i, probe in enumerate(probes):
+                    t = time.perf_counter()
+                    name, _ = recognizer.recognize_face(probe)
+                    timings.append((time.perf_counter() - t) * 1000)
+                    correct += name == enrolled[i][0]
+            gallery = recognizer.gallery
+            for _, _, features in enrolled:
+                t = time.perf_counter()
+                gallery.identify(features)
+                matching.append((time.perf_counter() - t) * 1000)
+
+        results[str(size)] = dict(latency_stats(timings),
+                                  comparacion_p50_ms=latency_stats(matching)['p50_ms'],
+                                  acierto_rank1=round(correct / len(timings), 4))
+    return results
+
+
+def bench_gallery_load(args):
+    """Carga de la galería desde imágenes en disco y desde una instantánea"""
+    recognizer = new_recognizer()
+    folder = tempfile.mkdtemp(prefix='bench_galeria_')
+    try:
+        images = 0
+        for identity in range(args.rostros):
+            user_dir = os.path.join(folder, f"rostro_{identity}")
+            os.makedirs(user_dir)
+            for sample in range(2):
+                cv2.imwrite(os.path.join(user_dir, f"{sample}.jpg"), synthetic_face(identity, sample))
+                images += 1
+
+        recognizer.known_faces_dir = folder
+        with quiet():
+            started = time.perf_counter()
+            recognizer.load_known_faces()
+            from_images = time.perf_counter() - started
+
+        largest = max(args.tamanos)
+        vectors = synthetic_identities(largest, seed=args.semilla)
+        recognizer.gallery_service.bulk_load([(f"u{i}", f"u{i}.jpg", v) for i, v in enumerate(vectors)])
+        snapshot_path = os.path.join(folder, 'galeria.fgs')
+        with quiet():
+            recognizer.export_gallery(snapshot_path)
+            replica = new_recognizer()
+            started = time.perf_counter()
+            replica.load_gallery_snapshot(snapshot_path)
+            from_snapshot = time.perf_counter() - started
+
+        return {
+            'imagenes': images,
+            'desde_imagenes_s': round(from_images, 4),
+            'imagenes_por_s': round(images / from_images, 2),
+            'instantanea_plantillas': largest,
+            'desde_instantanea_s': round(from_snapshot, 4)
+        }
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_database_sqlite(args):
+    """log_access e historial sobre SQLite con el mismo patrón de conexión por llamada"""
+    folder = tempfile.mkdtemp(prefix='bench_bd_')
+    path = os.path.join(folder, 'accesos.db')
+    try:
+        conn = sqlite3.connect(path)
+        conn.executescript(SQLITE_SCHEMA)
+        conn.executemany("INSERT INTO usuarios (nombre, password_hash) VALUES (?, 'x')",
+                         [(f"usuario_{i}",) for i in range(args.usuarios)])
+        users = conn.execute("SELECT id, nombre FROM usuarios ORDER BY id").fetchall()
+        for rows in access_batches(users, args.accesos, seed=args.semilla, end=date(2024, 12, 31)):
+            conn.executemany(
+                "INSERT INTO accesos (usuario_id, nombre_usuario, tipo_acceso, fecha_acceso, similitud, imagen_path) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+        def log_access(user_id, name, similarity):
+            conn = sqlite3.connect(path)
+            try:
+                conn.execute("""
+                    INSERT INTO accesos (usuario_id, nombre_usuario, tipo_acceso, similitud, imagen_path, fecha_acceso)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (user_id, name, 'PERMITIDO', similarity, None, datetime.now().isoformat(' ')))
+                conn.execute("UPDATE usuarios SET ultimo_acceso = ? WHERE id = ?", (datetime.now().isoformat(' '), user_id))
+                conn.commit()
+            finally:
+                conn.close()
+
+        def history(limit):
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute("""
+                    SELECT a.*, u.nombre as nombre_completo
+                    FROM accesos a
+                    LEFT JOIN usuarios u ON a.usuario_id = u.id
+                    ORDER BY a.fecha_acceso DESC
+                    LIMIT ?
+                """, (limit,)).fetchall()
+            finally:
+                conn.close()
+
+        def user_history(name):
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute("""
+                    SELECT tipo_acceso, fecha_acceso, similitud
+                    FROM accesos
+                    WHERE nombre_usuario = ?
+                    ORDER BY fecha_acceso DESC
+                """, (name,)).fetchall()
+            finally:
+                conn.close()
+
+        return measure_database('sqlite', users, log_access, history, user_history, args)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_database_mysql(args):
+    """log_access e historial con ``DatabaseManager`` contra la base MySQL configurada"""
+    from clases.database import DatabaseManager
+
+    db = DatabaseManager()
+    if not db.test_connection() or not db.create_tables():
+        return {'omitido': "No se pudo conectar a MySQL"}
+    with quiet():
+        users = [(user['id'], user['nombre']) for user in db.get_all_users()]
+    if not users:
+        return {'omitido': "No hay usuarios: genere datos con 'herramientas.py generar-datos'"}
+    return measure_database(
+        'mysql', users,
+        lambda user_id, name, similarity: db.log_access(user_id, name, 'PERMITIDO', similarity, None),
+        db.get_access_history, db.get_user_access_history, args)
+
+
+def measure_database(backend, users, log_access, history, user_history, args):
+    rng = np.random.default_rng(args.semilla)
+    picks = [users[i] for i in rng.integers(0, len(users), args.consultas)]
+    inserts, recent, personal = [], [], []
+    for user_id, name in picks:
+        t = time.perf_counter()
+        log_access(user_id, name, 0.9)
+        inserts.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        history(20)
+        recent.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        user_history(name)
+        personal.append((time.perf_counter() - t) * 1000)
+    return {
+        'motor': backend,
+        'accesos_previos': args.accesos if backend == 'sqlite' else None,
+        'log_access': latency_stats(inserts),
+        'historial_reciente': latency_stats(recent),
+        'historial_usuario': latency_stats(personal)
+    }
+
+
+def bench_web(args):
+    """Latencia y rendimiento de ``/data`` y de la exportación con clientes concurrentes"""
+    try:
+        urllib.request.urlopen(args.panel + '/data', timeout=5).read()
+    except (urllib.error.URLError, OSError) as e:
+        return {'omitido': f"Panel no disponible en {args.panel}: {e}"}
+
+    results = {}
+    for endpoint in ('/data', '/exportar-accesos'):
+        per_level = {}
+        for clients in args.clientes:
+            timings, errors = [], []
+            lock = threading.Lock()
+
+            def client():
+                for _ in range(args.peticiones):
+                    t = time.perf_counter()
+                    try:
+                        urllib.request.urlopen(args.panel + endpoint, timeout=60).read()
+                    except (urllib.error.URLError, OSError) as e:
+                        with lock:
+                            errors.append(str(e))
+                        continue
+                    with lock:
+                        timings.append((time.perf_counter() - t) * 1000)
+
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            level = {'peticiones_por_s': round(len(timings) / elapsed, 2), 'errores': len(errors)}
+            if timings:
+                level.update(latency_stats(timings))
+            per_level[str(clients)] = level
+        results[endpoint] = per_level
+    return results
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1} para comparar ejecuciones"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """Imprime las métricas que empeoran más de ``tolerance``; devuelve cuántas son"""
+    now, before = flatten(current), flatten(baseline)
+    regressions = 0
+    print(f"\n{'MÉTRICA':<58} {'BASE':>10} {'ACTUAL':>10} {'CAMBIO':>8}")
+    print("-" * 90)
+    for key in sorted(set(now) & set(before)):
+        # Tiempos: menos es mejor; rendimientos (por_s): más es mejor; el resto no se juzga
+        if key.endswith('por_s'):
+            worse = now[key] < before[key] * (1 - tolerance)
+        elif key.endswith('_ms') or key.endswith('_s'):
+            worse = now[key] > before[key] * (1 + tolerance)
+        else:
+            continue
+        change = (now[key] - before[key]) / before[key] if before[key] else 0.0
+        regressions += worse
+        print(f"{key:<58} {before[key]:>10.3f} {now[key]:>10.3f} {change:>+7.1%}{'  ⚠️' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de rendimiento del sistema de reconocimiento facial")
+    parser.add_argument('--salida', required=True, help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', help="Resultados anteriores para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.10, help="Empeoramiento admitido (0.10 = 10%%)")
+    parser.add_argument('--secciones', nargs='+', default=list(SECTIONS), choices=SECTIONS)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--rostros', type=int, default=100, help="Rostros sintéticos para extracción y consultas")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="Tamaños de galería para el reconocimiento")
+    parser.add_argument('--mysql', action='store_true', help="Medir la base MySQL configurada en vez de SQLite")
+    parser.add_argument('--usuarios', type=int, default=1000, help="Usuarios de la base SQLite")
+    parser.add_argument('--accesos', type=int, default=200000, help="Accesos previos de la base SQLite")
+    parser.add_argument('--consultas', type=int, default=200, help="Inserciones y consultas medidas")
+    parser.add_argument('--panel', default=f"http://localhost:{config.SYSTEM_CONFIG['web_server_port']}")
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--peticiones', type=int, default=10, help="Peticiones por cliente")
+    args = parser.parse_args()
+
+    # Se mide el camino completo: sin caché de resultados ni perfilado
+    config.SYSTEM_CONFIG.update(result_cache=False, profiling=False)
+    cv2.setNumThreads(1)
+
+    runners = {
+        'extraccion': bench_extraction,
+        'reconocimiento': bench_recognition,
+        'carga_galeria': bench_gallery_load,
+        'base_datos': bench_database_mysql if args.mysql else bench_database_sqlite,
+        'web': bench_web
+    }
+    results = {}
+    for section in args.secciones:
+        print(f"⏱️  {section}...")
+        started = time.perf_counter()
+        results[section] = runners[section](args)
+        print(f"   {json.dumps(results[section], ensure_ascii=False)} ({time.perf_counter() - started:.1f}s)")
+
+    report = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'cpu': os.cpu_count(),
+            'plataforma': platform.platform()
+        },
+        'configuracion': {key: config.SYSTEM_CONFIG[key] for key in
+                          ('feature_type', 'face_detector', 'gallery_storage', 'template_scoring', 'quality_gate')},
+        'parametros': vars(args),
+        'resultados': results
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['resultados'], args.tolerancia)
+        print(f"\n{'⚠️ ' if regressions else '✅'} {regressions} métricas empeoran más de un {args.tolerancia:.0%}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import cv2
 import numpy as np
 import os
 import config
+from clases.perfilado import attempt
 
 class AuthSystem:
     def __init__(self, database_manager, facial_recognition, email_sender):
@@ -107,42 +108,18 @@ class AuthSystem:
         print("Mire a la cámara y presione ESPACIO para capturar")
         print("Presione Q para cancelar el registro facial")
         
-        frame = self.face_recognition.capture_face()
+        frame, box = self.face_recognition.capture_face_with_box()
         if frame is None:
             print("❌ No se pudo capturar el rostro")
             return False
         
-        # Guardar la imagen en la carpeta de usuarios autorizados
-        faces_dir = config.SYSTEM_CONFIG['known_faces_dir']
-        if not os.path.exists(faces_dir):
-            os.makedirs(faces_dir)
-        
-        # Generar nombre de archivo
-        filename = f"{self.current_user}.jpg"
-        filepath = os.path.join(faces_dir, filename)
-        
-        # Guardar imagen
-        success = cv2.imwrite(filepath, frame)
-        
-        if not success:
-            print("❌ Error guardando la imagen del rostro")
-            return False
-        
-        # Actualizar known_faces
-        features = self.face_recognition.extract_advanced_features(frame)
-        if features is not None:
-            self.face_recognition.known_faces[self.current_user] = {
-                'path': filepath,
-                'features': features
-            }
-            print(f"✅ Rostro registrado exitosamente para {self.current_user}")
-            return True
+        # Detección, extracción, guardado y alta en la galería en un solo paso
+        success, message = self.face_recognition.enroll_capture(self.current_user, frame, box)
+        if success:
+            print(f"✅ {message}")
         else:
-            print("❌ No se pudieron extraer características del rostro")
-            # Eliminar la imagen si no se pudieron extraer características
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return False
+            print(f"❌ {message}")
+        return success
     
     def user_login(self):
         """Login para usuarios normales"""
@@ -181,14 +158,20 @@ class AuthSystem:
         print("\n📷 Login por Reconocimiento Facial")
         print("Mire a la cámara para identificarse...")
         
-        frame = self.face_recognition.capture_face()
+        frame, box = self.face_recognition.capture_face_with_box()
         if frame is None:
             return False
         
-        # Reconocer usuario
-        best_match, similarity = self.face_recognition.recognize_face(frame)
+        # El intento perfilado empieza con el frame capturado: la espera ante la cámara no cuenta
+        with attempt('login_facial'):
+            return self._facial_login(frame, box)
+
+    def _facial_login(self, frame, box):
+        """Identifica el frame capturado e inicia la sesión del usuario reconocido"""
+        # Reconocer usuario reutilizando la detección de la captura
+        best_match, similarity = self.face_recognition.recognize_face(frame, box)
         
-        if similarity > config.SYSTEM_CONFIG['similarity_threshold']:
+        if similarity > self.face_recognition.threshold_for(best_match):
             print(f"✅ ¡Bienvenido {best_match}!")
             
             # Verificar que el usuario existe en la base de datos
@@ -341,17 +324,51 @@ class AuthSystem:
             print(f"{user['id']:<4} {user['nombre']:<20} {user['rol']:<10} {fecha_reg:<12} {estado:<8}")
         
         print("\n1. 🔄 Activar/Desactivar usuario")
-        print("2. 🔙 Volver")
+        print("2. 🗑️ Eliminar usuario")
+        print("3. 🔙 Volver")
         
         choice = input("Seleccione opción: ").strip()
         
         if choice == "1":
             self.toggle_user_status(users)
         elif choice == "2":
+            self.delete_user(users)
+        elif choice == "3":
             return
         else:
             print("❌ Opción no válida")
 
+    def delete_user(self, users):
+        """Elimina un usuario y retira sus plantillas de todas las galerías"""
+        try:
+            user_id = int(input("Ingrese el ID del usuario: ").strip())
+        except ValueError:
+            print("❌ Por favor ingrese un ID válido")
+            return
+        
+        user = next((u for u in users if u['id'] == user_id), None)
+        if not user:
+            print("❌ ID de usuario no válido")
+            return
+        if user['rol'] == 'admin':
+            print("❌ No se puede eliminar a un administrador")
+            return
+        
+        if input(f"¿Eliminar a {user['nombre']}? (s/n): ").strip().lower() != 's':
+            print("❌ Operación cancelada")
+            return
+        
+        try:
+            paths = self.face_recognition.remove_user(user['nombre'])
+        except RuntimeError as e:
+            # Nodo de puerta: la galería es una réplica del servidor central
+            print(f"❌ {e}")
+            return
+        print(f"✅ Usuario {user['nombre']} eliminado ({len(paths)} plantillas retiradas)")
+        if paths:
+            print(f"⚠️  Sus imágenes siguen en '{self.face_recognition.known_faces_dir}': "
+                  f"retírelas para que no se vuelva a cargar al reiniciar")
+
     def toggle_user_status(self, users):
         """Activa o desactiva un usuario"""
         try:
@@ -399,29 +416,16 @@ class AuthSystem:
         print(f"\n📷 Registrando rostro para: {self.current_user}")
         print("Mire a la cámara y presione ESPACIO para capturar")
         
-        frame = self.face_recognition.capture_face()
+        frame, box = self.face_recognition.capture_face_with_box()
         if frame is None:
             return
         
-        # Guardar la imagen en la carpeta de usuarios autorizados
-        faces_dir = config.SYSTEM_CONFIG['known_faces_dir']
-        if not os.path.exists(faces_dir):
-            os.makedirs(faces_dir)
-        
-        # Generar nombre de archivo
-        filename = f"{self.current_user}.jpg"
-        filepath = os.path.join(faces_dir, filename)
-        
-        # Guardar imagen
-        cv2.imwrite(filepath, frame)
-        
-        # Actualizar known_faces
-        self.face_recognition.known_faces[self.current_user] = {
-            'path': filepath,
-            'features': self.face_recognition.extract_advanced_features(frame)
-        }
-        
-        print(f"✅ Rostro registrado exitosamente para {self.current_user}")
+        # Detección, extracción, guardado y alta en la galería en un solo paso
+        success, message = self.face_recognition.enroll_capture(self.current_user, frame, box)
+        if success:
+            print(f"✅ {message}")
+        else:
+            print(f"❌ {message}")
 
     def verify_access(self):
         """Verifica el acceso del usuario actual y envía email"""
@@ -432,14 +436,20 @@ class AuthSystem:
         print(f"\n🔐 Verificando acceso para: {self.current_user}")
         print("Mire a la cámara para verificar su identidad...")
         
-        frame = self.face_recognition.capture_face()
+        frame, box = self.face_recognition.capture_face_with_box()
         if frame is None:
             return
         
-        # Verificar si coincide con el usuario actual
-        best_match, similarity = self.face_recognition.recognize_face(frame)
+        # El intento perfilado empieza con el frame capturado: la espera ante la cámara no cuenta
+        with attempt('verificacion'):
+            self._verify_access(frame, box)
+
+    def _verify_access(self, frame, box):
+        """Verifica el frame capturado contra el usuario actual y envía el aviso"""
+        # Verificación 1:1 contra las plantillas del usuario actual (sin recorrer la galería)
+        similarity = self.face_recognition.verify_face(frame, self.current_user, box)
         
-        if best_match == self.current_user and similarity > config.SYSTEM_CONFIG['similarity_threshold']:
+        if similarity > self.face_recognition.threshold_for(self.current_user):
             print(f"✅ ¡Acceso verificado! Coincidencia: {similarity:.3f}")
             
             # Enviar email de verificación exitosa
@@ -457,13 +467,13 @@ class AuthSystem:
                 print("❌ Error enviando email")
                 
         else:
-            print(f"❌ Verificación fallida. Usuario detectado: {best_match}, Similitud: {similarity:.3f}")
+            print(f"❌ Verificación fallida para {self.current_user}. Similitud: {similarity:.3f}")
             
             # También enviar email para acceso denegado
             print("📧 Enviando notificación por email...")
             email_success = self.email_sender.send_detailed_email(
                 frame, 
-                f"Intento de acceso como {best_match}", 
+                f"Intento de acceso como {self.current_user}", 
                 "DENEGADO", 
                 similarity
             )
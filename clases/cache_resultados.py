@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+import config
+
+
+def face_hash(gray, box):
+    """Hash perceptual (dHash de 64 bits) del recorte normalizado del rostro.
+
+    Se reduce a 9x8 y cada bit indica si un píxel es más claro que su vecino
+    de la izquierda: pequeños cambios de ruido o iluminación entre frames
+    consecutivos dejan el hash igual o a pocos bits de distancia.
+    """
+    x, y, w, h = box
+    # Primero INTER_LINEAR a 4x el tamaño final y luego INTER_AREA con factor
+    # entero: mismo promediado que INTER_AREA directo a una fracción del coste
+    small = cv2.resize(gray[y:y+h, x:x+w], (36, 32), interpolation=cv2.INTER_LINEAR)
+    small = cv2.resize(small, (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), 'big')
+
+
+class ResultCache:
+    """Caché de corta duración de resultados de identificación por rostro y cámara.
+
+    La clave es (espacio, hash del rostro); el espacio agrupa lo que hace
+    comparables dos resultados (cámara y parámetros de la búsqueda). Una
+    consulta acierta si hay una entrada vigente del mismo espacio a
+    ``max_distance`` bits o menos. Las entradas caducan a los ``ttl`` segundos,
+    la más antigua sale al superar ``max_entries`` y todo se descarta cuando
+    cambia la versión de la galería.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_distance=None):
+        self.ttl = config.SYSTEM_CONFIG['result_cache_ttl'] if ttl is None else ttl
+        self.max_entries = max_entries or config.SYSTEM_CONFIG['result_cache_size']
+        self.max_distance = (config.SYSTEM_CONFIG['result_cache_max_distance']
+                             if max_distance is None else max_distance)
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        """Vacía la caché si la galería publicó una versión nueva"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, space, key, version):
+        """Resultado guardado para un rostro igual o casi igual; None si no hay"""
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            entry_key = (space, key)
+            entry = self._entries.get(entry_key)
+            if entry is None and self.max_distance:
+                for (entry_space, entry_hash), candidate in self._entries.items():
+                    if (entry_space == space and candidate[0] >= now
+                            and (entry_hash ^ key).bit_count() <= self.max_distance):
+                        entry_key, entry = (entry_space, entry_hash), candidate
+                        break
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[entry_key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, space, key, version, result):
+        """Guarda el resultado calculado con la galería de la versión ``version``"""
+        with self._lock:
+            # Un resultado calculado con una galería ya sustituida no se guarda
+            if version != self._version:
+                return
+            self._entries[(space, key)] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end((space, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Descarta todas las entradas"""
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        """Aciertos, fallos y tasa de aciertos desde el último reinicio"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'aciertos': self.hits,
+                'fallos': self.misses,
+                'tasa_aciertos': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entradas': len(self._entries),
+                'invalidaciones': self.invalidations
+            }
+
+    def reset_metrics(self):
+        """Reinicia los contadores de aciertos y fallos"""
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
@@ -0,0 +1,76 @@
+import cv2
+import config
+
+# Códigos de motivo (los mismos que devuelve el servicio de reconocimiento en 'estado')
+QUALITY_OK = 'ok'
+QUALITY_REASONS = {
+    'sin_rostro': "No se detectó rostro",
+    'rostro_pequeno': "Rostro demasiado pequeño: acérquese a la cámara",
+    'rostro_en_borde': "Rostro cortado por el borde de la imagen",
+    'subexpuesto': "Imagen demasiado oscura",
+    'sobreexpuesto': "Imagen demasiado iluminada",
+    'desenfocado': "Rostro desenfocado o movido",
+}
+
+# Lado del recorte sobre el que se mide la nitidez: el coste no depende del tamaño
+# del rostro y la varianza del Laplaciano es comparable entre rostros
+SHARPNESS_SIZE = 64
+
+
+class QualityGate:
+    """Filtro barato de calidad que se aplica antes de extraer y comparar.
+
+    Las comprobaciones van de menor a mayor coste (tamaño y borde solo miran el
+    recuadro; brillo y nitidez miran un recorte reducido) y se corta en la
+    primera que falla. Trabaja sobre el gris sin ecualizar: la ecualización
+    oculta la exposición real y amplifica el ruido que mide el Laplaciano.
+    """
+
+    def __init__(self, min_face=None, min_sharpness=None, brightness_range=None, edge_margin=None):
+        self.min_face = min_face or config.SYSTEM_CONFIG['quality_min_face']
+        self.min_sharpness = config.SYSTEM_CONFIG['quality_min_sharpness'] if min_sharpness is None else min_sharpness
+        self.brightness_range = brightness_range or config.SYSTEM_CONFIG['quality_brightness_range']
+        self.edge_margin = config.SYSTEM_CONFIG['quality_edge_margin'] if edge_margin is None else edge_margin
+
+    def assess(self, gray, box):
+        """Evalúa un rostro: (código de motivo, puntuación de calidad; 0 si se rechaza)"""
+        x, y, w, h = box
+        if min(w, h) < self.min_face:
+            return 'rostro_pequeno', 0.0
+
+        height, width = gray.shape[:2]
+        margin = self.edge_margin
+        if x < margin or y < margin or x + w > width - margin or y + h > height - margin:
+            return 'rostro_en_borde', 0.0
+
+        # INTER_LINEAR: INTER_AREA con factores no enteros cuesta más que el descriptor
+        roi = cv2.resize(gray[y:y+h, x:x+w], (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_LINEAR)
+        brightness = cv2.mean(roi)[0]
+        low, high = self.brightness_range
+        if brightness < low:
+            return 'subexpuesto', 0.0
+        if brightness > high:
+            return 'sobreexpuesto', 0.0
+
+        sharpness = float(cv2.meanStdDev(cv2.Laplacian(roi, cv2.CV_16S))[1][0, 0] ** 2)
+        if sharpness < self.min_sharpness:
+            return 'desenfocado', 0.0
+
+        # Entre los rostros aceptables se prefieren los nítidos y, hasta el doble del
+        # mínimo, los grandes; la exposición penaliza al alejarse del centro del rango
+        size_factor = min(1.0, min(w, h) / (2.0 * self.min_face))
+        exposure_factor = 1.0 - abs(brightness - (low + high) / 2) / ((high - low) / 2)
+        return QUALITY_OK, sharpness * size_factor * (0.5 + 0.5 * exposure_factor)
+
+
+def largest_face(faces):
+    """Recuadro de mayor área de una lista de detecciones (None si está vacía)"""
+    if len(faces) == 0:
+        return None
+    return tuple(max(faces, key=lambda f: f[2] * f[3]))
+
+
+def frame_gray(image):
+    """Gris sin ecualizar de un frame BGR (o el propio frame si ya es gris)"""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
@@ -1,11 +1,15 @@
 import mysql.connector
 from mysql.connector import Error
 from datetime import datetime
+import numpy as np
 import config
+from clases.perfilado import stage
 
 class DatabaseManager:
     def __init__(self):
         self.db_config = config.DB_CONFIG
+        # Callbacks con la firma de log_access (p. ej. el envío de accesos al servidor central)
+        self.access_listeners = []
     
     def test_connection(self):
         """Verifica que la base de datos esté disponible"""
@@ -19,6 +23,7 @@ class DatabaseManager:
             print(f"❌ Error conectando a MySQL: {e}")
         return False
     
+    @stage('conexion_bd')
     def get_connection(self):
         """Obtiene una nueva conexión a la base de datos"""
         try:
@@ -120,10 +125,85 @@ class DatabaseManager:
                     similitud FLOAT,
                     imagen_path VARCHAR(255),
                     confianza FLOAT,
+                    evento_id VARCHAR(64) NULL,
+                    UNIQUE KEY uq_accesos_evento (evento_id),
                     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
                 )
             """)
             
+            # Id del evento enviado por un nodo de puerta: un lote reenviado no se duplica
+            cursor.execute("""
+                SELECT COLUMN_NAME 
+                FROM INFORMATION_SCHEMA.COLUMNS 
+                WHERE TABLE_NAME = 'accesos' AND TABLE_SCHEMA = %s AND COLUMN_NAME = 'evento_id'
+            """, (self.db_config['database'],))
+            if not cursor.fetchall():
+                cursor.execute("ALTER TABLE accesos ADD COLUMN evento_id VARCHAR(64) NULL, "
+                               "ADD UNIQUE KEY uq_accesos_evento (evento_id)")
+                print("✅ Columna evento_id agregada")
+            
+            # Plantillas faciales: fuente de verdad de la galería compartida entre equipos.
+            # Las bajas se marcan como eliminadas para que la sincronización incremental las vea;
+            # al borrar un usuario sus plantillas quedan como bajas (usuario_id NULL), no se borran
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS plantillas (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    usuario_id INT NULL,
+                    ruta VARCHAR(255) NOT NULL UNIQUE,
+                    tipo_caracteristicas VARCHAR(32) NOT NULL,
+                    dimension INT NOT NULL,
+                    plantilla BLOB NOT NULL,
+                    eliminada BOOLEAN DEFAULT FALSE,
+                    fecha_creacion DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6),
+                    fecha_actualizacion DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6)
+                        ON UPDATE CURRENT_TIMESTAMP(6),
+                    INDEX idx_plantillas_actualizacion (tipo_caracteristicas, fecha_actualizacion),
+                    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
+                )
+            """)
+            
+            # Tablas creadas con ON DELETE CASCADE: el borrado en cascada ocultaba las bajas
+            cursor.execute("""
+                SELECT CONSTRAINT_NAME
+                FROM INFORMATION_SCHEMA.REFERENTIAL_CONSTRAINTS
+                WHERE CONSTRAINT_SCHEMA = %s AND TABLE_NAME = 'plantillas'
+                    AND REFERENCED_TABLE_NAME = 'usuarios' AND DELETE_RULE = 'CASCADE'
+            """, (self.db_config['database'],))
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE plantillas DROP FOREIGN KEY `{constraint}`")
+                cursor.execute("ALTER TABLE plantillas MODIFY usuario_id INT NULL, "
+                               "ADD FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL")
+                print("✅ Plantillas conservadas como bajas al borrar usuarios")
+            
+            # Umbral de similitud por usuario y estadísticos de sus similitudes genuinas
+            # (recuento, media y suma de cuadrados de desviaciones) para recalcularlo por incrementos
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS umbrales_usuario (
+                    usuario_id INT PRIMARY KEY,
+                    umbral FLOAT NULL,
+                    muestras INT NOT NULL DEFAULT 0,
+                    media FLOAT NOT NULL DEFAULT 0,
+                    m2 FLOAT NOT NULL DEFAULT 0,
+                    umbral_impostor FLOAT NULL,
+                    ultimo_acceso_id INT NOT NULL DEFAULT 0,
+                    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Último acceso leído por la calibración, aunque su usuario ya no exista
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS calibracion_umbrales (
+                    id TINYINT PRIMARY KEY,
+                    ultimo_acceso_id INT NOT NULL DEFAULT 0
+                )
+            """)
+            # Instalaciones anteriores guardaban el avance solo en cada fila de umbrales_usuario
+            cursor.execute("""
+                INSERT IGNORE INTO calibracion_umbrales (id, ultimo_acceso_id)
+                SELECT 1, COALESCE(MAX(ultimo_acceso_id), 0) FROM umbrales_usuario
+            """)
+            
             conn.commit()
             print("✅ Tablas creadas/verificadas exitosamente")
             return True
@@ -164,6 +244,41 @@ class DatabaseManager:
             if conn and conn.is_connected():
                 conn.close()
     
+    def bulk_register_users(self, users):
+        """Registra varios usuarios con una sola inserción de varias filas.
+        
+        ``users`` es una lista de (nombre, contraseña). Los nombres que ya existen
+        se conservan sin cambios, así que la operación se puede repetir.
+        Devuelve el número de usuarios creados o None si hubo un error.
+        """
+        if not users:
+            return 0
+        
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            values = []
+            for username, password in users:
+                values.extend((username, password))
+            placeholders = ", ".join(["(%s, %s, 'user')"] * len(users))
+            cursor.execute(
+                f"INSERT IGNORE INTO usuarios (nombre, password_hash, rol) VALUES {placeholders}",
+                values
+            )
+            
+            conn.commit()
+            return cursor.rowcount
+            
+        except Error as e:
+            print(f"❌ Error registrando usuarios en bloque: {e}")
+            return None
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
     def verify_user_credentials(self, username, password):
         """Verifica las credenciales de un usuario"""
         conn = self.get_connection()
@@ -216,6 +331,28 @@ class DatabaseManager:
             if conn and conn.is_connected():
                 conn.close()
     
+    def get_user_ids(self, usernames, chunk_size=1000):
+        """Obtiene {nombre: id} de varios usuarios; None si hubo un error"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            ids = {}
+            for start in range(0, len(usernames), chunk_size):
+                chunk = usernames[start:start + chunk_size]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"SELECT nombre, id FROM usuarios WHERE nombre IN ({placeholders})", chunk)
+                ids.update(cursor.fetchall())
+            return ids
+        except Error as e:
+            print(f"❌ Error obteniendo IDs de usuario: {e}")
+            return None
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
     def sync_user(self, username):
         """Sincroniza usuario con la base de datos (para compatibilidad con versiones anteriores)"""
         conn = self.get_connection()
@@ -260,8 +397,270 @@ class DatabaseManager:
             if conn and conn.is_connected():
                 conn.close()
     
+    def save_templates(self, templates, feature_type):
+        """Guarda o sustituye plantillas (nombre, ruta, características) en bloque.
+        
+        Los usuarios deben existir. Una ruta ya guardada se actualiza (y se
+        reactiva si estaba eliminada). Devuelve True si se guardaron.
+        """
+        if not templates:
+            return True
+        
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            values = []
+            for username, path, features in templates:
+                blob = np.asarray(features, dtype=np.float32).tobytes()
+                values.append((path, feature_type, len(blob) // 4, blob, username))
+            
+            cursor.executemany("""
+                INSERT INTO plantillas (usuario_id, ruta, tipo_caracteristicas, dimension, plantilla)
+                SELECT id, %s, %s, %s, %s FROM usuarios WHERE nombre = %s
+                ON DUPLICATE KEY UPDATE
+                    usuario_id = VALUES(usuario_id),
+                    tipo_caracteristicas = VALUES(tipo_caracteristicas),
+                    dimension = VALUES(dimension),
+                    plantilla = VALUES(plantilla),
+                    eliminada = FALSE
+            """, values)
+            
+            conn.commit()
+            return True
+            
+        except Error as e:
+            print(f"❌ Error guardando plantillas: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def delete_templates(self, paths):
+        """Marca plantillas como eliminadas (la sincronización incremental propaga la baja)"""
+        if not paths:
+            return True
+        
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            placeholders = ", ".join(["%s"] * len(paths))
+            cursor.execute(
+                f"UPDATE plantillas SET eliminada = TRUE WHERE ruta IN ({placeholders}) AND eliminada = FALSE",
+                list(paths)
+            )
+            conn.commit()
+            return True
+            
+        except Error as e:
+            print(f"❌ Error eliminando plantillas: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def delete_user(self, username):
+        """Borra un usuario dejando sus plantillas como bajas para la sincronización incremental"""
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            # Primero las bajas: al borrar el usuario las filas se conservan con usuario_id NULL
+            cursor.execute("""
+                UPDATE plantillas p
+                JOIN usuarios u ON p.usuario_id = u.id
+                SET p.eliminada = TRUE
+                WHERE u.nombre = %s AND p.eliminada = FALSE
+            """, (username,))
+            cursor.execute("DELETE FROM usuarios WHERE nombre = %s", (username,))
+            conn.commit()
+            return cursor.rowcount > 0
+            
+        except Error as e:
+            print(f"❌ Error eliminando usuario: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def iter_templates(self, feature_type, since=None, batch_size=5000):
+        """Recorre las plantillas de un tipo con una sola consulta en streaming.
+        
+        Genera bloques de filas (nombre, ruta, dimensión, plantilla, eliminada,
+        fecha_actualizacion). Sin ``since`` solo devuelve las vigentes; con
+        ``since`` devuelve también las eliminadas después de esa fecha (con
+        nombre None si el usuario ya no existe). Un fallo de conexión o de la
+        consulta se propaga: una lectura incompleta no debe tomarse por una
+        galería vacía.
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise ConnectionError("No se pudo conectar a la base de datos para leer las plantillas")
+            
+        try:
+            # Cursor sin buffer: las filas llegan del servidor a medida que se consumen
+            cursor = conn.cursor(buffered=False)
+            if since is None:
+                cursor.execute("""
+                    SELECT u.nombre, p.ruta, p.dimension, p.plantilla, p.eliminada, p.fecha_actualizacion
+                    FROM plantillas p
+                    JOIN usuarios u ON p.usuario_id = u.id
+                    WHERE p.tipo_caracteristicas = %s AND p.eliminada = FALSE
+                    ORDER BY p.id
+                """, (feature_type,))
+            else:
+                cursor.execute("""
+                    SELECT u.nombre, p.ruta, p.dimension, p.plantilla, p.eliminada, p.fecha_actualizacion
+                    FROM plantillas p
+                    LEFT JOIN usuarios u ON p.usuario_id = u.id
+                    WHERE p.tipo_caracteristicas = %s AND p.fecha_actualizacion >= %s
+                    ORDER BY p.fecha_actualizacion
+                """, (feature_type, since))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+            
+        except Error as e:
+            print(f"❌ Error leyendo plantillas: {e}")
+            raise
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def iter_genuine_scores(self, since_id=0, batch_size=5000):
+        """Recorre en streaming las similitudes de accesos permitidos posteriores a ``since_id``.
+        
+        Genera bloques de filas (id, usuario_id, similitud) en orden de id.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return
+            
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute("""
+                SELECT id, usuario_id, similitud
+                FROM accesos
+                WHERE id > %s AND tipo_acceso = 'PERMITIDO'
+                    AND usuario_id IS NOT NULL AND similitud > 0
+                ORDER BY id
+            """, (since_id,))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+            
+        except Error as e:
+            print(f"❌ Error leyendo similitudes de accesos: {e}")
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def get_user_thresholds(self):
+        """Umbrales y estadísticos guardados de cada usuario (con su nombre)"""
+        conn = self.get_connection()
+        if not conn:
+            return []
+            
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT t.usuario_id, u.nombre, t.umbral, t.muestras, t.media, t.m2,
+                       t.umbral_impostor, t.ultimo_acceso_id
+                FROM umbrales_usuario t
+                JOIN usuarios u ON t.usuario_id = u.id
+            """)
+            return cursor.fetchall()
+        except Error as e:
+            print(f"❌ Error obteniendo umbrales de usuario: {e}")
+            return []
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def get_calibration_cursor(self):
+        """Id del último acceso procesado por la calibración de umbrales (None si falla la lectura)"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ultimo_acceso_id FROM calibracion_umbrales WHERE id = 1")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except Error as e:
+            print(f"❌ Error obteniendo el avance de la calibración: {e}")
+            return None
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def save_user_thresholds(self, rows, last_access_id=None):
+        """Guarda o actualiza los umbrales de usuario (diccionarios como los de ``get_user_thresholds``).
+        
+        Con ``last_access_id`` también se guarda, en la misma transacción, el
+        avance de la calibración.
+        """
+        if not rows and last_access_id is None:
+            return True
+        
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            if last_access_id is not None:
+                cursor.execute("""
+                    INSERT INTO calibracion_umbrales (id, ultimo_acceso_id) VALUES (1, %s)
+                    ON DUPLICATE KEY UPDATE ultimo_acceso_id = VALUES(ultimo_acceso_id)
+                """, (last_access_id,))
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO umbrales_usuario
+                    (usuario_id, umbral, muestras, media, m2, umbral_impostor, ultimo_acceso_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        umbral = VALUES(umbral),
+                        muestras = VALUES(muestras),
+                        media = VALUES(media),
+                        m2 = VALUES(m2),
+                        umbral_impostor = VALUES(umbral_impostor),
+                        ultimo_acceso_id = VALUES(ultimo_acceso_id)
+                """, [(row['usuario_id'], row['umbral'], row['muestras'], row['media'], row['m2'],
+                       row['umbral_impostor'], row['ultimo_acceso_id']) for row in rows])
+            
+            conn.commit()
+            return True
+            
+        except Error as e:
+            print(f"❌ Error guardando umbrales de usuario: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    @stage('registro_acceso')
     def log_access(self, usuario_id, nombre_usuario, tipo_acceso, similitud, imagen_path):
         """Registra acceso en la base de datos"""
+        for callback in self.access_listeners:
+            callback(usuario_id, nombre_usuario, tipo_acceso, similitud, imagen_path)
+        
         conn = self.get_connection()
         if not conn:
             return False
@@ -298,6 +697,111 @@ class DatabaseManager:
             if conn and conn.is_connected():
                 conn.close()
     
+    def log_accesses(self, events):
+        """Registra un lote de accesos (diccionarios enviados por los nodos) en una inserción.
+        
+        Los eventos cuyo ``id`` ya está registrado se ignoran: los nodos reenvían
+        un lote cuando no reciben la confirmación.
+        """
+        if not events:
+            return True
+        
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            values = []
+            for event in events:
+                values.extend((event['nombre_usuario'], event['nombre_usuario'], event['tipo_acceso'],
+                               float(event['similitud']), event.get('imagen_path'),
+                               datetime.fromisoformat(event['fecha_acceso']), event.get('id')))
+            # El id se resuelve por nombre: los nodos no comparten la base de datos
+            placeholders = ", ".join(
+                ["((SELECT id FROM usuarios WHERE nombre = %s), %s, %s, %s, %s, %s, %s)"] * len(events))
+            cursor.execute(f"""
+                INSERT INTO accesos 
+                (usuario_id, nombre_usuario, tipo_acceso, similitud, imagen_path, fecha_acceso, evento_id)
+                VALUES {placeholders}
+                ON DUPLICATE KEY UPDATE evento_id = evento_id
+            """, values)
+            
+            conn.commit()
+            return True
+            
+        except Error as e:
+            print(f"❌ Error registrando lote de accesos: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def bulk_log_accesses(self, batches):
+        """Inserta bloques de accesos ya formados con un INSERT de varias filas por bloque.
+        
+        Cada bloque es una lista de (usuario_id, nombre_usuario, tipo_acceso,
+        fecha_acceso, similitud, imagen_path) y se confirma por separado. Pensado
+        para cargas masivas: no avisa a ``access_listeners`` ni actualiza
+        ``ultimo_acceso``. Devuelve las filas insertadas o None si hubo un error.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            # Los ids vienen de la propia tabla de usuarios: no hace falta comprobarlos fila a fila
+            cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+            inserted = 0
+            placeholders = {}
+            for batch in batches:
+                if not batch:
+                    continue
+                if len(batch) not in placeholders:
+                    placeholders[len(batch)] = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch))
+                cursor.execute(f"""
+                    INSERT INTO accesos 
+                    (usuario_id, nombre_usuario, tipo_acceso, fecha_acceso, similitud, imagen_path)
+                    VALUES {placeholders[len(batch)]}
+                """, [value for row in batch for value in row])
+                conn.commit()
+                inserted += len(batch)
+            return inserted
+            
+        except Error as e:
+            print(f"❌ Error insertando accesos en bloque: {e}")
+            return None
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
+    def set_last_accesses(self, last_access):
+        """Actualiza ``ultimo_acceso`` desde {usuario_id: fecha} sin retroceder fechas más recientes"""
+        if not last_access:
+            return True
+        
+        conn = self.get_connection()
+        if not conn:
+            return False
+            
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE usuarios SET ultimo_acceso = %s
+                WHERE id = %s AND (ultimo_acceso IS NULL OR ultimo_acceso < %s)
+            """, [(moment, user_id, moment) for user_id, moment in last_access.items()])
+            
+            conn.commit()
+            return True
+            
+        except Error as e:
+            print(f"❌ Error actualizando últimos accesos: {e}")
+            return False
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+    
     def get_access_history(self, limit=10):
         """Obtiene historial de accesos"""
         conn = self.get_connection()
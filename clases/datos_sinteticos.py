@@ -0,0 +1,266 @@
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+import cv2
+import numpy as np
+import config
+from clases.descriptores import get_descriptor
+
+# Peso relativo de cada hora del día en los accesos: entrada, comida y salida
+HOUR_WEIGHTS = np.array([
+    0.2, 0.1, 0.1, 0.1, 0.1, 0.3, 1.0, 4.0, 9.0, 7.0, 3.0, 2.5,
+    3.0, 5.0, 5.5, 3.0, 2.5, 6.0, 7.0, 3.5, 1.5, 1.0, 0.6, 0.3
+])
+HOUR_WEIGHTS = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+# Lunes a domingo
+WEEKDAY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 0.9, 0.3, 0.15])
+# Parte de los accesos denegados que son de personas sin registrar ('Desconocido');
+# el resto son verificaciones fallidas de un usuario registrado
+UNKNOWN_SHARE = 0.6
+
+
+def synthetic_face(identity, sample=0, size=320):
+    """Imagen BGR de un rostro dibujado que el detector Haar encuentra en la mayoría de los casos.
+
+    La forma (óvalo, ojos, cejas, nariz, boca y colores) depende solo de
+    ``identity``; ``sample`` añade desplazamiento, iluminación y ruido propios
+    de cada captura, de modo que dos muestras de la misma identidad se parecen.
+    """
+    shape = np.random.default_rng([identity, 0])
+    capture = np.random.default_rng([identity, sample + 1])
+
+    image = np.empty((size, size, 3), dtype=np.float32)
+    image[:] = shape.integers(60, 200, 3)
+    face_w = int(size * shape.uniform(0.26, 0.32))
+    face_h = int(face_w * shape.uniform(1.25, 1.4))
+    cx = size // 2 + int(capture.integers(-8, 9))
+    cy = size // 2 + int(capture.integers(-8, 9))
+    skin = np.array([shape.uniform(90, 180), shape.uniform(120, 200), shape.uniform(160, 235)])
+    hair = shape.uniform(15, 70, 3)
+
+    cv2.ellipse(image, (cx, cy), (face_w, face_h), 0, 0, 360, skin.tolist(), -1)
+    cv2.ellipse(image, (cx, cy - int(face_h * 0.55)), (int(face_w * 1.05), int(face_h * 0.5)),
+                0, 180, 360, hair.tolist(), -1)
+    eye_y = cy - int(face_h * shape.uniform(0.1, 0.2))
+    eye_x = int(face_w * shape.uniform(0.36, 0.46))
+    eye_r = max(3, int(face_w * shape.uniform(0.13, 0.17)))
+    for side in (-1, 1):
+        x = cx + side * eye_x
+        cv2.ellipse(image, (x, eye_y), (eye_r + 4, eye_r // 2 + 3), 0, 0, 360, (skin * 0.55).tolist(), -1)
+        cv2.circle(image, (x, eye_y), eye_r // 2, (25, 25, 25), -1)
+        cv2.line(image, (x - eye_r, eye_y - eye_r - 4), (x + eye_r, eye_y - eye_r - int(shape.integers(2, 9))),
+                 hair.tolist(), max(2, eye_r // 3))
+    cv2.line(image, (cx, eye_y + eye_r), (cx, cy + int(face_h * shape.uniform(0.15, 0.25))),
+             (skin * 0.7).tolist(), max(2, face_w // 12))
+    mouth_w = int(face_w * shape.uniform(0.35, 0.5))
+    cv2.ellipse(image, (cx, cy + int(face_h * 0.45)), (mouth_w, max(3, face_w // 12)),
+                0, 0, 360, (60, 60, shape.uniform(110, 170)), -1)
+
+    image = cv2.GaussianBlur(image, (0, 0), size / 160)
+    image *= capture.uniform(0.85, 1.15)
+    image += capture.normal(0, 4, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def synthetic_templates(identity, count, dim, seed=0, noise=0.25):
+    """Plantillas normalizadas con forma de histograma de una identidad.
+
+    Todas parten del mismo vector base de la identidad más un ruido propio de
+    cada captura, así que se parecen entre sí y no a las de otras identidades.
+    """
+    base = np.random.default_rng([seed, 2, identity]).gamma(2.0, 1.0, dim)
+    captures = np.random.default_rng([seed, 3, identity]).gamma(2.0, 1.0, (count, dim))
+    templates = (base / np.linalg.norm(base) + noise * captures / np.linalg.norm(captures, axis=1, keepdims=True))
+    return (templates / np.linalg.norm(templates, axis=1, keepdims=True)).astype(np.float32)
+
+
+def access_batches(users, count, seed=0, days=365, end=None, allowed_ratio=0.85,
+                   threshold=None, batch_size=10000):
+    """Genera ``count`` accesos sintéticos en orden cronológico, por bloques.
+
+    ``users`` es una lista de (id, nombre). Cada bloque es una lista de filas
+    (usuario_id, nombre_usuario, tipo_acceso, fecha_acceso, similitud, imagen_path)
+    con el formato que deja ``EmailSender``. Las distribuciones imitan una puerta real:
+    - días laborables más concurridos y horas punta de entrada, comida y salida;
+    - unos pocos usuarios acumulan muchos accesos (actividad log-normal);
+    - similitud de los permitidos en torno a la media de cada usuario y por
+      encima del umbral; la de los denegados, por debajo.
+    Cada día usa su propio generador aleatorio a partir de la semilla, así que
+    el resultado no depende de ``batch_size``.
+    """
+    threshold = config.SYSTEM_CONFIG['similarity_threshold'] if threshold is None else threshold
+    end = end or date.today()
+    first_day = end - timedelta(days=days - 1)
+
+    setup = np.random.default_rng([seed, 1])
+    activity = setup.lognormal(0.0, 1.0, len(users))
+    activity /= activity.sum()
+    genuine_mean = np.clip(setup.normal(0.82, 0.04, len(users)), threshold + 0.05, 0.97)
+    day_weights = np.array([WEEKDAY_WEIGHTS[(first_day + timedelta(days=d)).weekday()] for d in range(days)])
+    per_day = setup.multinomial(count, day_weights / day_weights.sum())
+
+    ids = [user_id for user_id, _ in users]
+    names = [name for _, name in users]
+    batch = []
+    for day, rows in enumerate(per_day.tolist()):
+        if not rows:
+            continue
+        rng = np.random.default_rng([seed, 4, day])
+        seconds = np.sort(rng.choice(24, rows, p=HOUR_WEIGHTS) * 3600 + rng.integers(0, 3600, rows))
+        owners = rng.choice(len(users), rows, p=activity)
+        kind = rng.random(rows)
+        allowed = kind < allowed_ratio
+        unknown = kind >= allowed_ratio + (1 - allowed_ratio) * (1 - UNKNOWN_SHARE)
+
+        # Permitidos: normal por usuario reflejada sobre el umbral; verificaciones
+        # fallidas: justo por debajo; desconocidos: la cola de similitudes de impostor
+        genuine = genuine_mean[owners] + rng.normal(0.0, 0.05, rows)
+        genuine = np.where(genuine < threshold, 2 * threshold - genuine, genuine)
+        failed = threshold - np.abs(rng.normal(0.0, 0.06, rows))
+        impostor = np.minimum(rng.beta(5.0, 7.0, rows), threshold - 0.001)
+        similarity = np.where(allowed, np.minimum(genuine, 0.999), np.where(unknown, impostor, failed))
+        similarity = np.maximum(similarity, 0.0).round(4)
+
+        day_start = datetime.combine(first_day + timedelta(days=day), datetime.min.time())
+        for owner, is_allowed, is_unknown, second, value in zip(
+                owners.tolist(), allowed.tolist(), unknown.tolist(), seconds.tolist(), similarity.tolist()):
+            moment = day_start + timedelta(seconds=second)
+            if is_allowed:
+                user_id, name = ids[owner], names[owner]
+            elif is_unknown:
+                user_id, name = None, "Desconocido"
+            else:
+                user_id, name = None, f"Intento de acceso como {names[owner]}"
+            batch.append((user_id, name, 'PERMITIDO' if is_allowed else 'DENEGADO', moment, value,
+                          f"access_{moment:%Y%m%d_%H%M%S}.jpg"))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(batches, depth=2):
+    """Genera los bloques en un hilo aparte mientras se inserta el anterior"""
+    pending = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        for batch in batches:
+            pending.put(batch)
+        pending.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        batch = pending.get()
+        if batch is done:
+            return
+        yield batch
+
+
+class SyntheticDataGenerator:
+    """Carga usuarios, accesos y rostros sintéticos para pruebas de escala.
+
+    Todo se deriva de ``seed`` (y de ``end`` para las fechas), así que dos
+    ejecuciones con los mismos parámetros generan los mismos datos. Los
+    usuarios y los accesos se insertan con INSERT de varias filas por bloques.
+    """
+
+    def __init__(self, db, seed=0, batch_size=10000, days=365, end=None, allowed_ratio=0.85, prefix='sintetico'):
+        self.db = db
+        self.seed = seed
+        self.batch_size = batch_size
+        self.days = days
+        self.end = end or date.today()
+        self.allowed_ratio = allowed_ratio
+        self.prefix = prefix
+
+    def user_names(self, count):
+        return [f"{self.prefix}_{i:06d}" for i in range(count)]
+
+    def load_users(self, count):
+        """Crea (si no existen) los usuarios y devuelve la lista de (id, nombre)"""
+        names = self.user_names(count)
+        rng = np.random.default_rng([self.seed, 0])
+        passwords = [rng.bytes(8).hex() for _ in range(count)]
+        created = 0
+        for start in range(0, count, self.batch_size):
+            end = start + self.batch_size
+            inserted = self.db.bulk_register_users(list(zip(names[start:end], passwords[start:end])))
+            if inserted is None:
+                return None
+            created += inserted
+        print(f"👥 {created} usuarios creados ({count - created} ya existían)")
+
+        ids = self.db.get_user_ids(names)
+        if ids is None:
+            return None
+        return [(ids[name], name) for name in names if name in ids]
+
+    def load_accesses(self, users, count):
+        """Inserta ``count`` accesos; devuelve las filas insertadas o None si hubo un error"""
+        started = time.time()
+        batches = access_batches(users, count, seed=self.seed, days=self.days, end=self.end,
+                                 allowed_ratio=self.allowed_ratio, batch_size=self.batch_size)
+        last_access = {}
+
+        def progress(batches):
+            done = 0
+            for number, batch in enumerate(batches, 1):
+                # Los bloques llegan en orden cronológico: el último visto es el más reciente
+                for user_id, _, _, moment, _, _ in batch:
+                    if user_id is not None:
+                        last_access[user_id] = moment
+                done += len(batch)
+                if number % 100 == 0 or done == count:
+                    rate = done / max(time.time() - started, 1e-9)
+                    print(f"🗄️  {done}/{count} accesos ({rate:,.0f} filas/s)")
+                yield batch
+
+        inserted = self.db.bulk_log_accesses(progress(prefetch(batches)))
+        if inserted is None:
+            return None
+        if last_access and not self.db.set_last_accesses(last_access):
+            return None
+        print(f"✅ {inserted} accesos en {time.time() - started:.1f}s")
+        return inserted
+
+    def load_templates(self, users, per_user, feature_type=None):
+        """Guarda ``per_user`` plantillas sintéticas por usuario en la tabla de plantillas"""
+        feature_type = feature_type or config.SYSTEM_CONFIG['feature_type']
+        dim = get_descriptor(feature_type)[0]
+        pending = []
+        saved = 0
+        for index, (_, name) in enumerate(users):
+            for sample, features in enumerate(synthetic_templates(index, per_user, dim, seed=self.seed)):
+                pending.append((name, f"{self.prefix}/{name}/{sample}.jpg", features))
+            if len(pending) >= self.batch_size:
+                if not self.db.save_templates(pending, feature_type):
+                    return None
+                saved += len(pending)
+                pending = []
+                print(f"🧬 {saved} plantillas guardadas")
+        if pending and not self.db.save_templates(pending, feature_type):
+            return None
+        saved += len(pending)
+        print(f"✅ {saved} plantillas ({feature_type}, dimensión {dim})")
+        return saved
+
+    def write_images(self, users, per_user, directory=None):
+        """Escribe ``<directorio>/<usuario>/<n>.jpg`` con rostros dibujados por usuario"""
+        directory = directory or config.SYSTEM_CONFIG['known_faces_dir']
+        written = 0
+        for index, (_, name) in enumerate(users):
+            user_dir = os.path.join(directory, name)
+            os.makedirs(user_dir, exist_ok=True)
+            # La semilla va en los bits altos: cada semilla dibuja otras caras
+            identity = (self.seed << 32) + index
+            for sample in range(per_user):
+                cv2.imwrite(os.path.join(user_dir, f"{sample}.jpg"), synthetic_face(identity, sample))
+                written += 1
+            if (index + 1) % 1000 == 0:
+                print(f"🖼️  {written} imágenes escritas")
+        print(f"✅ {written} imágenes en {directory}")
+        return written
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+# LBP uniforme (8 vecinos, radio 1) sobre una rejilla de celdas
+LBP_FACE_SIZE = 128         # el recorte se escala a 128x128: 126x126 códigos tras quitar el borde
+LBP_GRID = 7                # 7x7 celdas de 18x18 píxeles
+LBP_NEIGHBORS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+
+def _uniform_table():
+    """Etiqueta de cada código LBP: 0..57 para los 58 patrones uniformes, 58 para el resto"""
+    table = np.full(256, 58, dtype=np.int32)
+    label = 0
+    for code in range(256):
+        bits = [(code >> i) & 1 for i in range(8)]
+        transitions = sum(bits[i] != bits[(i + 1) % 8] for i in range(8))
+        if transitions <= 2:
+            table[code] = label
+            label += 1
+    return table
+
+
+LBP_UNIFORM = _uniform_table()
+LBP_BINS = 59
+LBP_DIM = LBP_GRID * LBP_GRID * LBP_BINS
+LBP_WEIGHTS = [np.uint8(1 << bit) for bit in range(8)]
+
+# Matriz 256x59 que suma los histogramas de códigos crudos por etiqueta uniforme
+LBP_UNIFORM_MATRIX = np.zeros((256, LBP_BINS), dtype=np.float32)
+LBP_UNIFORM_MATRIX[np.arange(256), LBP_UNIFORM] = 1
+
+# Desplazamiento de la celda de cada código para contar todas las celdas con un solo bincount
+_codes_size = LBP_FACE_SIZE - 2
+_cell_size = _codes_size // LBP_GRID
+_cell_of = np.arange(_codes_size) // _cell_size
+LBP_CELL_OFFSETS = ((_cell_of[:, None] * LBP_GRID + _cell_of[None, :]) * 256).astype(np.int32)
+
+
+def hist256(face_roi):
+    """Histograma global de 256 niveles del recorte (normalizado)"""
+    face_roi = cv2.resize(face_roi, (200, 200))
+    hist = cv2.calcHist([face_roi], [0], None, [256], [0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def lbp_codes(image):
+    """Código LBP (0..255) de cada píxel interior, calculado con desplazamientos del array"""
+    center = image[1:-1, 1:-1]
+    height, width = center.shape
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    mask = np.empty(center.shape, dtype=np.uint8)
+    for weight, (dy, dx) in zip(LBP_WEIGHTS, LBP_NEIGHBORS):
+        np.greater_equal(image[1 + dy:1 + dy + height, 1 + dx:1 + dx + width], center, out=mask.view(bool))
+        codes += mask * weight
+    return codes
+
+
+def lbp_grid(face_roi):
+    """Histogramas LBP uniformes por celda de una rejilla, concatenados.
+
+    Cada celda conserva de qué zona de la cara sale su textura (ojos, nariz,
+    boca), información que el histograma global pierde. Se aplica la raíz
+    cuadrada a cada histograma para que la similitud coseno equivalga a la
+    distancia de Hellinger, más robusta con histogramas.
+    """
+    face_roi = cv2.resize(face_roi, (LBP_FACE_SIZE, LBP_FACE_SIZE))
+    codes = lbp_codes(face_roi)
+    hist = np.bincount((LBP_CELL_OFFSETS + codes).ravel(), minlength=LBP_GRID * LBP_GRID * 256)
+    hist = hist.reshape(LBP_GRID * LBP_GRID, 256).astype(np.float32) @ LBP_UNIFORM_MATRIX
+    return np.sqrt(hist.ravel() / (_cell_size * _cell_size))
+
+
+# tipo -> (dimensión, extractor sobre el recorte en escala de grises ecualizada).
+# Los tipos están versionados: un cambio en un extractor se publica con otro nombre
+# porque las plantillas solo son comparables con las del mismo tipo
+DESCRIPTORS = {
+    'hist256_v1': (256, hist256),
+    'lbp_u2_7x7_v1': (LBP_DIM, lbp_grid),
+}
+
+
+def get_descriptor(feature_type):
+    """Dimensión y extractor de un tipo de características"""
+    if feature_type not in DESCRIPTORS:
+        raise ValueError(f"Tipo de características no soportado: {feature_type} "
+                         f"(disponibles: {', '.join(DESCRIPTORS)})")
+    return DESCRIPTORS[feature_type]
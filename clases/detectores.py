@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import urllib.request
+import cv2
+import config
+
+DETECTOR_BACKENDS = ('haar', 'lbp', 'yunet')
+
+# Origen de los modelos que no vienen con OpenCV: backend -> (clave de ruta en config, URL)
+MODEL_SOURCES = {
+    'lbp': ('lbp_cascade_path',
+            'https://raw.githubusercontent.com/opencv/opencv/4.x/data/lbpcascades/'
+            'lbpcascade_frontalface_improved.xml'),
+    'yunet': ('yunet_model_path',
+              'https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/'
+              'face_detection_yunet_2023mar.onnx'),
+}
+
+
+class CascadeDetector:
+    """Detector de rostros con un clasificador en cascada de OpenCV (Haar o LBP)"""
+
+    def __init__(self, model_path, scale_factor=1.3, min_neighbors=5):
+        self.model_path = model_path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No se encontró el modelo del detector: {model_path}")
+        self.cascade = cv2.CascadeClassifier(model_path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"No se pudo cargar el modelo del detector: {model_path}")
+
+    def detect(self, image, gray=None):
+        """Recuadros (x, y, w, h) de los rostros; usa ``gray`` si ya se calculó"""
+        if gray is None:
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+        return [tuple(int(value) for value in face) for face in faces]
+
+
+class YuNetDetector:
+    """Detector de rostros con la red YuNet de ``cv2.FaceDetectorYN`` (CPU).
+
+    El modelo ONNX se carga desde un archivo local. La red trabaja sobre la
+    imagen en color y se reajusta al tamaño de cada frame.
+    """
+
+    def __init__(self, model_path, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No se encontró el modelo del detector: {model_path}")
+        self.model_path = model_path
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320),
+                                                  score_threshold, nms_threshold, top_k)
+        self._input_size = None
+        # setInputSize y detect modifican el estado de la red
+        self._lock = threading.Lock()
+
+    def detect(self, image, gray=None):
+        """Recuadros (x, y, w, h) de los rostros ordenados por confianza"""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        with self._lock:
+            if self._input_size != (width, height):
+                self.detector.setInputSize((width, height))
+                self._input_size = (width, height)
+            _, faces = self.detector.detect(image)
+        if faces is None:
+            return []
+
+        boxes = []
+        for face in faces:
+            # La red puede devolver recuadros que salen parcialmente de la imagen
+            x, y = max(0, int(face[0])), max(0, int(face[1]))
+            w = min(width, int(face[0] + face[2])) - x
+            h = min(height, int(face[1] + face[3])) - y
+            if w > 0 and h > 0:
+                boxes.append((x, y, w, h))
+        return boxes
+
+
+def create_detector(backend=None):
+    """Crea el detector configurado (``face_detector``): 'haar', 'lbp' o 'yunet'"""
+    backend = backend or config.SYSTEM_CONFIG['face_detector']
+    if backend == 'haar':
+        return CascadeDetector(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if backend == 'lbp':
+        # Con LBP se usa un factor de escala más fino: la cascada es más rápida pero menos sensible
+        return CascadeDetector(config.SYSTEM_CONFIG['lbp_cascade_path'], scale_factor=1.1, min_neighbors=4)
+    if backend == 'yunet':
+        return YuNetDetector(config.SYSTEM_CONFIG['yunet_model_path'],
+                             score_threshold=config.SYSTEM_CONFIG['yunet_score_threshold'])
+    raise ValueError(f"Detector no soportado: {backend} (disponibles: {', '.join(DETECTOR_BACKENDS)})")
+
+
+def download_model(backend, force=False, timeout=60):
+    """Descarga el modelo de ``backend`` a la ruta configurada y comprueba que carga.
+
+    El archivo se descarga a un temporal y solo reemplaza al definitivo si el
+    detector se crea con él. Devuelve la ruta del modelo.
+    """
+    key, url = MODEL_SOURCES[backend]
+    path = config.SYSTEM_CONFIG[key]
+    if os.path.exists(path) and not force:
+        create_detector(backend)
+        return path
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f, urllib.request.urlopen(url, timeout=timeout) as response:
+            while True:
+                chunk = response.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+        # Un archivo truncado o una página de error no carga como detector
+        try:
+            if backend == 'lbp':
+                CascadeDetector(tmp_path)
+            else:
+                YuNetDetector(tmp_path)
+        except (FileNotFoundError, SystemError, cv2.error) as e:
+            raise ValueError(f"El modelo descargado de {url} no es válido: {e}") from e
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
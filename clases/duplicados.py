@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import config
+
+CSV_FIELDS = ['usuario_a', 'usuario_b', 'similitud', 'pares_plantillas']
+DUPLICATE_POLICIES = ('warn', 'block', 'off')
+MAX_ENROLLMENT_ALERTS = 500     # alertas de alta que se conservan en el informe
+
+_report_lock = threading.Lock()
+
+
+def similar_identities(gallery, features, name=None, threshold=None, limit=5):
+    """Identidades distintas de ``name`` cuya similitud con ``features`` alcanza el umbral.
+
+    Usa la búsqueda exacta de la galería (una multiplicación sobre todas las
+    plantillas); devuelve hasta ``limit`` pares (nombre, similitud) de mayor a menor.
+    """
+    threshold = config.SYSTEM_CONFIG['duplicate_threshold'] if threshold is None else threshold
+    matches = gallery.identify(features, k=limit + 1, min_similarity=threshold, exact=True)
+    return [(other, similarity) for other, similarity in matches if other != name][:limit]
+
+
+def _write_report(report, report_path):
+    """Escribe el informe JSON de forma atómica (el panel puede estar leyéndolo)"""
+    directory = os.path.dirname(os.path.abspath(report_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, report_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_report(report_path):
+    """Informe guardado o None si no existe o está dañado"""
+    try:
+        with open(report_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def record_enrollment_alert(name, other, similarity, blocked, report_path=None):
+    """Anota en el informe de duplicados una alta parecida a otro usuario.
+
+    Quien se registra solo recibe un aviso genérico; el usuario con el que
+    coincide y la similitud quedan para el administrador, que los ve en el
+    panel junto a los pares de ``buscar-duplicados``.
+    """
+    report_path = report_path or config.SYSTEM_CONFIG['duplicate_report_path']
+    alert = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'usuario': name,
+        'coincide_con': other,
+        'similitud': round(float(similarity), 4),
+        'rechazada': blocked
+    }
+    with _report_lock:
+        report = _read_report(report_path) or {}
+        alerts = report.get('alertas_registro', []) + [alert]
+        report['alertas_registro'] = alerts[-MAX_ENROLLMENT_ALERTS:]
+        _write_report(report, report_path)
+
+
+def duplicate_pairs(gallery, threshold, tile=4096):
+    """Pares de identidades con alguna pareja de plantillas por encima del umbral.
+
+    La matriz de similitudes plantilla contra plantilla se recorre por bloques
+    ``tile`` x ``tile`` del triángulo superior, así que la memoria depende del
+    bloque y no del tamaño de la galería. Devuelve {(a, b): (similitud máxima,
+    pares de plantillas)} con los índices de ``gallery.names()`` y a < b.
+    """
+    owners = gallery.row_owners()
+    total = len(owners)
+    pairs = {}
+    for start in range(0, total, tile):
+        rows = gallery.matrix_block(start, start + tile)
+        row_owners = owners[start:start + tile]
+        for column in range(start, total, tile):
+            columns = rows if column == start else gallery.matrix_block(column, column + tile)
+            scores = rows @ columns.T
+            column_owners = owners[column:column + tile]
+            hits = (scores >= threshold) & (row_owners[:, None] != column_owners[None, :])
+            if column == start:
+                # Bloque diagonal: solo los pares (i, j) con i < j
+                hits &= np.triu(np.ones(hits.shape, dtype=bool), k=1)
+            i, j = np.nonzero(hits)
+            if not len(i):
+                continue
+
+            # Agrupar por pareja de identidades antes de pasar a Python
+            a = np.minimum(row_owners[i], column_owners[j]).astype(np.int64)
+            b = np.maximum(row_owners[i], column_owners[j]).astype(np.int64)
+            keys, inverse, counts = np.unique(a * total + b, return_inverse=True, return_counts=True)
+            best = np.full(len(keys), -np.inf, dtype=np.float32)
+            np.maximum.at(best, inverse, scores[i, j])
+            for key, score, count in zip(keys.tolist(), best.tolist(), counts.tolist()):
+                pair = divmod(key, total)
+                previous_score, previous_count = pairs.get(pair, (-np.inf, 0))
+                pairs[pair] = (max(previous_score, score), previous_count + count)
+    return pairs
+
+
+class DuplicateDetector:
+    """Busca en toda la galería identidades que parecen la misma persona.
+
+    Compara todas las plantillas entre sí por bloques y escribe un informe JSON
+    (el que sirve el panel de administración en ``/duplicados``) y un CSV con
+    los pares de usuarios sospechosos ordenados por similitud.
+    """
+
+    def __init__(self, facial_recognition, threshold=None, tile=4096):
+        self.face_recognition = facial_recognition
+        self.threshold = config.SYSTEM_CONFIG['duplicate_threshold'] if threshold is None else threshold
+        self.tile = tile
+
+    def find(self):
+        """Lista de pares sospechosos ordenada de mayor a menor similitud"""
+        gallery = self.face_recognition.gallery
+        names = gallery.names()
+        pairs = duplicate_pairs(gallery, self.threshold, self.tile)
+        found = [{
+            'usuario_a': names[a],
+            'usuario_b': names[b],
+            'similitud': round(score, 4),
+            'pares_plantillas': count
+        } for (a, b), (score, count) in pairs.items()]
+        found.sort(key=lambda pair: -pair['similitud'])
+        return found
+
+    def run(self, report_path=None):
+        """Escribe ``<informe>`` (JSON) y el CSV con el mismo nombre; devuelve el informe"""
+        report_path = report_path or config.SYSTEM_CONFIG['duplicate_report_path']
+        gallery = self.face_recognition.gallery
+        if len(gallery) < 2:
+            print("❌ Se necesitan al menos dos usuarios en la galería")
+            return None
+
+        started = time.time()
+        print(f"🚀 Comparando {gallery.template_count} plantillas de {len(gallery)} usuarios "
+              f"(umbral {self.threshold})")
+        pairs = self.find()
+        report = {
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'umbral': self.threshold,
+            'tipo_caracteristicas': gallery.feature_type,
+            'usuarios': len(gallery),
+            'plantillas': gallery.template_count,
+            'segundos': round(time.time() - started, 2),
+            'pares': pairs
+        }
+
+        with _report_lock:
+            # Las alertas de las altas se conservan entre informes
+            previous = _read_report(report_path) or {}
+            report['alertas_registro'] = previous.get('alertas_registro', [])
+            _write_report(report, report_path)
+        # ``informe.v2/duplicados`` no tiene extensión; ``x.csv`` no debe pisar el JSON
+        csv_path = os.path.splitext(report_path)[0] + '.csv'
+        if csv_path == report_path:
+            csv_path = report_path + '.csv'
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(pairs)
+
+        print(f"👥 {len(pairs)} pares de usuarios sospechosos ({report['segundos']}s)")
+        for pair in pairs[:10]:
+            print(f"   {pair['usuario_a']} ↔ {pair['usuario_b']}: {pair['similitud']:.3f}")
+        print(f"💾 Informe en {report_path} y {csv_path}")
+        return report
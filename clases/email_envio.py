@@ -1,18 +1,19 @@
 import smtplib
 import os
-import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from datetime import datetime
 import cv2
 import config
+from clases.perfilado import span, stage
 
 class EmailSender:
     def __init__(self, database_manager):
         self.db = database_manager
         self.email_config = config.EMAIL_CONFIG
     
+    @stage('correo')
     def send_detailed_email(self, frame, username, access_type, similarity):
         """Envía correo con detalles completos - VERSIÓN CORREGIDA"""
         try:
@@ -30,10 +31,12 @@ class EmailSender:
             # Guardar imagen temporalmente
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             image_path = f"access_{timestamp}.jpg"
-            cv2.imwrite(image_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            with span('imagen_correo'):
+                cv2.imwrite(image_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
             
             # Obtener historial reciente
-            history = self.db.get_access_history(5)
+            with span('historial_correo'):
+                history = self.db.get_access_history(5)
             
             # Crear contenido HTML
             html_content = self._create_email_content(username, access_type, similarity, history)
@@ -58,8 +61,7 @@ class EmailSender:
                     
                 self.db.log_access(user_id, username, access_type, similarity_db, image_path)
             
-            # Limpiar archivo temporal
-            time.sleep(1)
+            # Limpiar archivo temporal (ya está cerrado: el adjunto se leyó completo)
             if os.path.exists(image_path):
                 os.remove(image_path)
             
@@ -164,6 +166,7 @@ class EmailSender:
         </html>
         """
     
+    @stage('smtp')
     def _send_email(self, msg):
         """Envía el email a través del servidor SMTP"""
         try:
@@ -0,0 +1,197 @@
+import csv
+import json
+import os
+import re
+import time
+from multiprocessing import Pool, cpu_count
+import cv2
+import numpy as np
+import config
+from clases.reconocimiento_fac import FacialRecognition
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+NUMBERED_NAME = re.compile(r'^(.*)\.\d+$')
+
+# Las puntuaciones (similitud coseno en [-1, 1]) se acumulan en histogramas de
+# resolución fija: la memoria no depende del número de pares
+SCORE_BINS = 4000
+BIN_WIDTH = 2.0 / SCORE_BINS
+
+CSV_FIELDS = ['umbral', 'far', 'frr', 'tar']
+FAR_TARGETS = (1e-2, 1e-3, 1e-4)
+
+# Estado de cada proceso de trabajo (se inicializa una sola vez por proceso)
+_worker = {}
+
+
+def _init_worker():
+    """Prepara el extractor configurado en el proceso de trabajo"""
+    cv2.setNumThreads(1)
+    _worker['recognizer'] = FacialRecognition(None, load_faces=False)
+
+
+def _extract(item):
+    """Características de una imagen etiquetada: (etiqueta, ruta, características o None)"""
+    label, path = item
+    return label, path, _worker['recognizer'].extract_advanced_features(cv2.imread(path))
+
+
+def collect_labeled_images(folder):
+    """(etiqueta, ruta) de las imágenes: ``<persona>/*.jpg`` o ``<persona>.N.jpg``"""
+    items = []
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if os.path.abspath(root) != os.path.abspath(folder):
+                label = os.path.basename(root)
+            else:
+                stem = os.path.splitext(filename)[0]
+                match = NUMBERED_NAME.match(stem)
+                label = match.group(1) if match else stem
+            items.append((label, os.path.join(root, filename)))
+    return items
+
+
+def score_histograms(features, owners, tile=2048):
+    """Histogramas de puntuaciones genuinas e impostoras de todos los pares.
+
+    La matriz de similitudes se recorre por bloques ``tile`` x ``tile`` del
+    triángulo superior: cada bloque es una multiplicación de matrices y sus
+    puntuaciones se cuentan con un solo ``bincount``.
+    """
+    counts = np.zeros(2 * SCORE_BINS, dtype=np.int64)
+    total = len(features)
+    for start in range(0, total, tile):
+        rows = features[start:start + tile]
+        row_owners = owners[start:start + tile]
+        for column in range(start, total, tile):
+            scores = rows @ features[column:column + tile].T
+            bins = np.clip(((scores + 1.0) / BIN_WIDTH).astype(np.int64), 0, SCORE_BINS - 1)
+            bins += (row_owners[:, None] == owners[None, column:column + tile]) * SCORE_BINS
+            if column == start:
+                # Bloque diagonal: solo los pares (i, j) con i < j
+                bins = bins[np.triu_indices(len(rows), k=1)]
+            counts += np.bincount(bins.ravel(), minlength=2 * SCORE_BINS)
+    return counts[SCORE_BINS:], counts[:SCORE_BINS]
+
+
+def roc_points(genuine, impostor):
+    """Umbral y tasas FAR/FRR en cada borde de los histogramas (puntos ROC y DET).
+
+    Un par se acepta si su puntuación supera el umbral: FAR es la fracción de
+    impostores aceptados y FRR la de genuinos rechazados.
+    """
+    thresholds = -1.0 + BIN_WIDTH * np.arange(SCORE_BINS + 1)
+    accepted_impostors = np.concatenate([np.cumsum(impostor[::-1])[::-1], [0]])
+    rejected_genuine = np.concatenate([[0], np.cumsum(genuine)])
+    far = accepted_impostors / max(1, impostor.sum())
+    frr = rejected_genuine / max(1, genuine.sum())
+    return thresholds, far, frr
+
+
+def summarize(genuine, impostor, current_threshold):
+    """EER, umbrales recomendados y tasas del umbral configurado"""
+    thresholds, far, frr = roc_points(genuine, impostor)
+    eer_index = int(np.argmin(np.abs(far - frr)))
+
+    def at(index):
+        return {'umbral': round(float(thresholds[index]), 4), 'far': float(far[index]), 'frr': float(frr[index])}
+
+    recommended = {'eer': at(eer_index)}
+    for target in FAR_TARGETS:
+        # El umbral más bajo (menos rechazos) que cumple el FAR objetivo
+        candidates = np.flatnonzero(far <= target)
+        if len(candidates):
+            recommended[f'far_{target:g}'] = at(int(candidates[0]))
+
+    current = int(np.clip(np.searchsorted(thresholds, current_threshold), 0, SCORE_BINS))
+    return {
+        'pares_genuinos': int(genuine.sum()),
+        'pares_impostores': int(impostor.sum()),
+        'eer': round(float((far[eer_index] + frr[eer_index]) / 2), 6),
+        'umbrales_recomendados': recommended,
+        'umbral_actual': at(current)
+    }
+
+
+class ThresholdEvaluator:
+    """Evaluación offline de FAR/FRR para calibrar ``similarity_threshold``.
+
+    Extrae las características de un directorio etiquetado con varios procesos
+    y compara todas las imágenes entre sí por bloques, de modo que la memoria
+    queda acotada aunque haya decenas de miles de imágenes.
+    """
+
+    def __init__(self, workers=None, tile=2048):
+        self.workers = workers or cpu_count()
+        self.tile = tile
+
+    def extract(self, items):
+        """Extrae en paralelo; devuelve (etiquetas, matriz normalizada, rutas sin rostro)"""
+        labels, vectors, missing = [], [], []
+        with Pool(self.workers, initializer=_init_worker) as pool:
+            for label, path, features in pool.imap(_extract, items, chunksize=16):
+                if features is None:
+                    missing.append(path)
+                    continue
+                labels.append(label)
+                vectors.append(np.asarray(features, dtype=np.float32).ravel())
+
+        if not vectors:
+            return [], np.zeros((0, 0), dtype=np.float32), missing
+        matrix = np.stack(vectors)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return labels, matrix, missing
+
+    def run(self, folder, output_prefix):
+        """Escribe ``<prefijo>.csv`` (puntos ROC/DET) y ``<prefijo>.json`` (resumen)"""
+        items = collect_labeled_images(folder)
+        if not items:
+            print(f"❌ No hay imágenes en {folder}")
+            return None
+
+        started = time.time()
+        print(f"🚀 Extrayendo {len(items)} imágenes con {self.workers} procesos")
+        labels, matrix, missing = self.extract(items)
+        extracted = time.time()
+        if len(labels) < 2:
+            print("❌ Se necesitan al menos dos rostros detectados")
+            return None
+
+        _, owners = np.unique(labels, return_inverse=True)
+        genuine, impostor = score_histograms(matrix, owners, self.tile)
+        compared = time.time()
+
+        summary = summarize(genuine, impostor, config.SYSTEM_CONFIG['similarity_threshold'])
+        summary.update({
+            'tipo_caracteristicas': config.SYSTEM_CONFIG['feature_type'],
+            'detector': config.SYSTEM_CONFIG['face_detector'],
+            'imagenes': len(items),
+            'rostros': len(labels),
+            'personas': int(owners.max()) + 1,
+            'sin_rostro': len(missing),
+            'segundos_extraccion': round(extracted - started, 2),
+            'segundos_comparacion': round(compared - extracted, 2)
+        })
+
+        thresholds, far, frr = roc_points(genuine, impostor)
+        with open(f"{output_prefix}.csv", 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for threshold, far_value, frr_value in zip(thresholds, far, frr):
+                writer.writerow([f"{threshold:.4f}", f"{far_value:.6g}", f"{frr_value:.6g}",
+                                 f"{1 - frr_value:.6g}"])
+        with open(f"{output_prefix}.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        eer_threshold = summary['umbrales_recomendados']['eer']['umbral']
+        print(f"📊 {summary['pares_genuinos']} pares genuinos, {summary['pares_impostores']} impostores "
+              f"({summary['segundos_comparacion']}s)")
+        print(f"⚖️  EER {summary['eer']:.4f} con umbral {eer_threshold}")
+        for key, point in summary['umbrales_recomendados'].items():
+            print(f"   {key:<10} umbral {point['umbral']:.4f}  FAR {point['far']:.2e}  FRR {point['frr']:.4f}")
+        current = summary['umbral_actual']
+        print(f"   actual     umbral {current['umbral']:.4f}  FAR {current['far']:.2e}  FRR {current['frr']:.4f}")
+        print(f"💾 Resultados en {output_prefix}.csv y {output_prefix}.json")
+        return summary
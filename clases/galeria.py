@@ -0,0 +1,572 @@
+import copy
+import sys
+import numpy as np
+from clases.indice_ann import IVFIndex
+
+FEATURE_DIM = 256
+FEATURE_TYPE = 'hist256_v1'
+
+# Tipos de almacenamiento admitidos para las plantillas
+STORAGE_DTYPES = {'float32': np.float32, 'float16': np.float16, 'uint8': np.uint8}
+
+# Filas por bloque al calcular similitudes sobre almacenamiento cuantizado
+SCORE_BLOCK = 65536
+
+
+class FaceGallery:
+    """Galería vectorizada de rostros conocidos con varias plantillas por usuario.
+
+    Las plantillas se guardan como filas normalizadas de una sola matriz; cada fila
+    apunta a su identidad en ``_owners``. La búsqueda 1:N calcula todas las
+    similitudes en una multiplicación y las agrega por identidad.
+
+    ``storage`` permite guardar la matriz en float16 o en uint8 con una escala
+    por fila (pensado para características no negativas como los histogramas).
+    NumPy no multiplica en float16 sin convertir cada vez a float32, así que
+    float16 es solo la forma guardada (instantáneas, memoria compartida,
+    fragmentos): ``prepare`` crea una vista float32 para puntuar y la memoria
+    del proceso que compara no baja. uint8 sí ahorra memoria en ese proceso,
+    a cambio de convertir por bloques en cada búsqueda (unas 2 veces más lenta).
+    """
+
+    def __init__(self, dim=FEATURE_DIM, max_templates=5, replacement='diverse',
+                 scoring='max', top_m=2, storage='float32', feature_type=FEATURE_TYPE):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Almacenamiento no soportado: {storage}")
+        self.dim = dim
+        self.feature_type = feature_type    # extractor que generó las plantillas (ver descriptores)
+        self.storage = storage
+        self.max_templates = max(1, max_templates)
+        self.replacement = replacement      # 'diverse' o 'fifo'
+        self.scoring = scoring              # 'max' o 'mean_top'
+        self.top_m = max(1, top_m)
+
+        self._names = []        # identidad -> nombre
+        self._index = {}        # nombre -> identidad
+        self._rows = []         # identidad -> filas de sus plantillas (en orden de alta)
+        # Identidades cuya lista de filas es propia de esta galería (None = todas); las
+        # demás se comparten con la galería de la que se copió y se copian al modificarlas
+        self._owned_rows = None
+
+        self._matrix = np.zeros((16, dim), dtype=STORAGE_DTYPES[storage])
+        self._scales = np.ones(16, dtype=np.float32)
+        self._owners = np.zeros(16, dtype=np.int32)
+        self._paths = []        # fila -> ruta de la imagen
+        self._size = 0
+        # Filas escritas en los arrays cuando se comparten con copias ([n] compartido;
+        # None = arrays propios). Una copia puede añadir filas tras las de su origen
+        # sin copiar la matriz: el origen nunca lee más allá de su ``_size``
+        self._tail = None
+
+        # Índice aproximado opcional (ver enable_ann)
+        self._ann = None
+        self._ann_params = None
+
+        # Filas agrupadas por identidad para la búsqueda por lotes (se invalida al modificar)
+        self._grouping = None
+        # Copia float32 de una matriz float16 para puntuar (se invalida al modificar)
+        self._float32_view = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def template_count(self):
+        """Número total de plantillas en la galería"""
+        return self._size
+
+    def names(self):
+        """Nombres registrados en la galería"""
+        return list(self._names)
+
+    def templates_of(self, name):
+        """Rutas de las plantillas de un usuario"""
+        identity = self._index.get(name)
+        if identity is None:
+            return []
+        return self._paths_of_identity(identity)
+
+    def paths(self):
+        """Ruta de la imagen de cada fila (en el orden de ``arrays()``)"""
+        return list(self._paths[:self._size])
+
+    def templates(self, paths):
+        """Plantillas de las rutas indicadas como (nombre, ruta, vector float32)"""
+        wanted = set(paths)
+        rows = [row for row, path in enumerate(self._paths[:self._size]) if path in wanted]
+        if not rows:
+            return []
+        vectors = self._decode(np.asarray(rows))
+        return [(self._names[self._owners[row]], self._paths[row], vector)
+                for row, vector in zip(rows, vectors)]
+
+    def _paths_of_identity(self, identity):
+        return [self._paths[row] for row in self._rows[identity]]
+
+    @staticmethod
+    def _normalize(features):
+        """Convierte a float32 y normaliza a norma unitaria (None si no es válido)"""
+        if features is None:
+            return None
+        vector = np.asarray(features, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _encode(self, vector):
+        """Convierte un vector normalizado al almacenamiento configurado: (fila, escala)"""
+        if self.storage == 'uint8':
+            peak = float(vector.max())
+            scale = peak / 255.0 if peak > 0 else 1.0
+            return np.clip(np.rint(vector / scale), 0, 255).astype(np.uint8), scale
+        return vector.astype(self._matrix.dtype), 1.0
+
+    def _decode(self, rows):
+        """Devuelve las filas indicadas como float32"""
+        decoded = self._matrix[rows].astype(np.float32)
+        if self.storage == 'uint8':
+            decoded *= self._scales[rows][..., None]
+        return decoded
+
+    def _float_matrix(self):
+        """Matriz float32 sobre la que puntuar directamente (None: convertir por bloques)"""
+        if self.storage == 'float32':
+            return self._matrix
+        return self._float32_view
+
+    def _row_scores(self, query, rows=None):
+        """Similitud por fila (todas o las indicadas) acotando la memoria temporal"""
+        matrix = self._float_matrix()
+        if matrix is not None:
+            matrix = matrix[:self._size] if rows is None else matrix[rows]
+            return np.maximum(matrix @ query, 0.0)
+
+        # float16/uint8 se convierten por bloques para no duplicar la galería en memoria
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK):
+            block = slice(start, min(start + SCORE_BLOCK, count))
+            block_rows = block if rows is None else rows[block]
+            scores[block] = self._matrix[block_rows].astype(np.float32) @ query
+        if self.storage == 'uint8':
+            scores *= self._scales[:self._size] if rows is None else self._scales[rows]
+        return np.maximum(scores, 0.0)
+
+    def _own_arrays(self, append=False):
+        """Copia los arrays si otra galería puede leer las filas que se van a escribir.
+
+        Con ``append`` solo se escribe la fila ``_size``: basta con que ninguna
+        otra copia haya escrito ya en ella. Los arrays de solo lectura (memoria
+        compartida, instantáneas mapeadas) se copian siempre.
+        """
+        shared = self._tail is not None and (not append or self._tail[0] != self._size)
+        readonly = not (self._matrix.flags.writeable and self._scales.flags.writeable
+                        and self._owners.flags.writeable)
+        if shared or readonly:
+            self._matrix = np.array(self._matrix)
+            self._scales = np.array(self._scales)
+            self._owners = np.array(self._owners)
+            self._tail = None
+
+    def _append_row(self, identity, vector, path):
+        """Agrega una fila con crecimiento geométrico (O(1) amortizado)"""
+        self._grouping = None
+        self._float32_view = None
+        if self._size == len(self._matrix):
+            capacity = len(self._matrix) * 2
+            matrix = np.zeros((capacity, self.dim), dtype=self._matrix.dtype)
+            matrix[:self._size] = self._matrix[:self._size]
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            owners = np.zeros(capacity, dtype=np.int32)
+            owners[:self._size] = self._owners[:self._size]
+            self._matrix, self._scales, self._owners = matrix, scales, owners
+            self._tail = None
+        else:
+            self._own_arrays(append=True)
+
+        row = self._size
+        self._matrix[row], self._scales[row] = self._encode(vector)
+        self._owners[row] = identity
+        self._paths.append(path)
+        self._own_rows(identity).append(row)
+        self._size += 1
+        if self._tail is not None:
+            self._tail[0] = self._size
+
+        if self._ann is not None:
+            self._ann.add(row, vector)
+
+    def _own_rows(self, identity):
+        """Lista de filas de una identidad lista para modificar (copiada si es compartida)"""
+        rows = self._rows[identity]
+        if self._owned_rows is not None and identity not in self._owned_rows:
+            rows = list(rows)
+            self._rows[identity] = rows
+            self._owned_rows.add(identity)
+        return rows
+
+    def _drop_row(self, row):
+        """Elimina una fila moviendo la última a su posición"""
+        self._grouping = None
+        self._float32_view = None
+        identity = self._owners[row]
+        self._own_rows(identity).remove(row)
+        if self._ann is not None:
+            self._ann.remove(row)
+
+        last = self._size - 1
+        if row != last:
+            if self._ann is not None:
+                self._ann.move(last, row)
+            self._own_arrays()
+            moved_identity = self._owners[last]
+            self._matrix[row] = self._matrix[last]
+            self._scales[row] = self._scales[last]
+            self._owners[row] = moved_identity
+            self._paths[row] = self._paths[last]
+            moved_rows = self._own_rows(moved_identity)
+            moved_rows[moved_rows.index(last)] = row
+        self._paths.pop()
+        self._size -= 1
+
+    def _choose_eviction(self, rows, vector):
+        """Elige qué plantilla descartar (None = descartar la nueva)"""
+        if self.replacement == 'fifo':
+            return rows[0]
+
+        # 'diverse': se descarta la plantilla más redundante, es decir la de mayor
+        # similitud media con el resto, para conservar el conjunto más variado
+        candidates = np.vstack([self._decode(rows), vector])
+        gram = candidates @ candidates.T
+        redundancy = (gram.sum(axis=1) - 1.0) / (len(candidates) - 1)
+        victim = int(np.argmax(redundancy))
+        return None if victim == len(rows) else rows[victim]
+
+    def add(self, name, features, path=None):
+        """Agrega una plantilla a un usuario respetando el máximo configurado.
+
+        Devuelve (agregada, ruta_descartada). ``agregada`` es False si el vector
+        no es válido o la política de reemplazo rechaza la plantilla nueva; en
+        ese caso no sale ninguna otra y la ruta descartada es None. Si entra,
+        la ruta descartada es la de la plantilla que dejó sitio (o None).
+        """
+        vector = self._normalize(features)
+        if vector is None:
+            return False, None
+
+        identity = self._index.get(name)
+        if identity is None:
+            identity = len(self._names)
+            self._index[name] = identity
+            self._names.append(name)
+            self._rows.append([])
+            if self._owned_rows is not None:
+                self._owned_rows.add(identity)
+
+        rows = self._rows[identity]
+        evicted_path = None
+        if len(rows) >= self.max_templates:
+            victim = self._choose_eviction(rows, vector)
+            if victim is None:
+                return False, None
+            evicted_path = self._paths[victim]
+            self._drop_row(victim)
+
+        self._append_row(identity, vector, path)
+        return True, evicted_path
+
+    def remove(self, name):
+        """Elimina un usuario y todas sus plantillas; devuelve las rutas eliminadas"""
+        identity = self._index.get(name)
+        if identity is None:
+            return []
+
+        paths = self._paths_of_identity(identity)
+        for row in sorted(self._rows[identity], reverse=True):
+            self._drop_row(row)
+        self._drop_identity(identity)
+        return paths
+
+    def remove_template(self, path):
+        """Elimina la plantilla asociada a una ruta (y el usuario si se queda sin plantillas)"""
+        if path is None:
+            # Las plantillas sin ruta no se pueden identificar por ella
+            return False
+        try:
+            row = self._paths.index(path)
+        except ValueError:
+            return False
+
+        identity = self._owners[row]
+        self._drop_row(row)
+        if not self._rows[identity]:
+            self._drop_identity(identity)
+        return True
+
+    def _drop_identity(self, identity):
+        """Elimina una identidad sin plantillas moviendo la última a su posición"""
+        self._grouping = None
+        del self._index[self._names[identity]]
+        last = len(self._names) - 1
+        if identity != last:
+            moved_name = self._names[last]
+            self._names[identity] = moved_name
+            self._rows[identity] = self._rows[last]
+            self._index[moved_name] = identity
+            self._own_arrays()
+            self._owners[self._rows[identity]] = identity
+            if self._owned_rows is not None:
+                # La propiedad de la lista se mueve con ella
+                if last in self._owned_rows:
+                    self._owned_rows.add(identity)
+                else:
+                    self._owned_rows.discard(identity)
+        if self._owned_rows is not None:
+            self._owned_rows.discard(last)
+        self._names.pop()
+        self._rows.pop()
+
+    def copy(self):
+        """Copia independiente para aplicar cambios sin tocar la galería en uso"""
+        clone = copy.copy(self)
+        clone._names = list(self._names)
+        clone._index = dict(self._index)
+        # Las listas de filas se comparten y cada una se copia solo si la copia la modifica
+        clone._rows = list(self._rows)
+        clone._owned_rows = set()
+        # Los arrays también: las altas escriben tras las filas del origen y solo
+        # modificar una fila existente obliga a copiarlos (ver _own_arrays)
+        if self._tail is None:
+            self._tail = [self._size]
+        clone._tail = self._tail
+        clone._paths = list(self._paths)
+        # El índice comparte centroides y particiones: solo se copian las que cambien
+        clone._ann = self._ann.copy() if self._ann is not None else None
+        return clone
+
+    def arrays(self):
+        """Estado compacto de la galería: (nombres, plantillas, escalas, propietarios)"""
+        size = self._size
+        return list(self._names), self._matrix[:size], self._scales[:size], self._owners[:size]
+
+    @classmethod
+    def from_arrays(cls, names, matrix, scales, owners, paths=None, **params):
+        """Construye una galería sobre arrays existentes sin copiarlos.
+
+        Se usa para adjuntar instantáneas en memoria compartida o archivos
+        mapeados; si los arrays son de solo lectura, la galería también lo es
+        hasta que una alta la obligue a crecer (y por tanto a copiar).
+        """
+        gallery = cls(dim=matrix.shape[1], **params)
+        gallery._names = list(names)
+        gallery._index = {name: i for i, name in enumerate(gallery._names)}
+        gallery._matrix = matrix
+        gallery._scales = scales
+        gallery._owners = owners
+        gallery._size = len(matrix)
+        gallery._paths = list(paths) if paths is not None else [None] * len(matrix)
+
+        # Filas de cada identidad agrupando por propietario en una sola ordenación
+        order = np.argsort(owners, kind='stable').tolist()
+        ends = np.cumsum(np.bincount(owners, minlength=len(gallery._names))).tolist()
+        gallery._rows = [order[start:end] for start, end in zip([0] + ends[:-1], ends)]
+        return gallery
+
+    def matrix(self):
+        """Devuelve (nombres por fila, matriz normalizada en float32)"""
+        owners = self._owners[:self._size]
+        if self.storage == 'float32':
+            return [self._names[i] for i in owners], self._matrix[:self._size]
+        return [self._names[i] for i in owners], self._decode(slice(0, self._size))
+
+    def row_owners(self):
+        """Identidad de cada fila como índice en ``names()``"""
+        return self._owners[:self._size].copy()
+
+    def matrix_block(self, start, stop):
+        """Filas [start, stop) normalizadas en float32 sin decodificar el resto de la galería"""
+        return self._decode(slice(start, min(stop, self._size)))
+
+    def memory_usage(self):
+        """Bytes ocupados por cada parte de la galería (solo la porción en uso)"""
+        size = self._size
+        usage = {
+            'plantillas': self._matrix[:size].nbytes,
+            'escalas': self._scales[:size].nbytes if self.storage == 'uint8' else 0,
+            'vista_float32': self._float32_view.nbytes if self._float32_view is not None else 0,
+            'propietarios': self._owners[:size].nbytes,
+            'nombres': sys.getsizeof(self._names) + sum(sys.getsizeof(n) for n in self._names),
+            'indice_nombres': sys.getsizeof(self._index),
+            'filas_por_usuario': sys.getsizeof(self._rows) + sum(sys.getsizeof(r) for r in self._rows),
+            'rutas': sys.getsizeof(self._paths) + sum(sys.getsizeof(p) for p in self._paths if p),
+        }
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def _aggregate(self, scores, owners, count):
+        """Agrega las similitudes por identidad ('max' o media de las m mejores)"""
+        if self.scoring == 'mean_top' and self.top_m > 1:
+            # Ordenar por identidad y, dentro de cada una, por similitud descendente
+            order = np.lexsort((-scores, owners))
+            sorted_owners = owners[order]
+            starts = np.searchsorted(sorted_owners, np.arange(count))
+            rank = np.arange(len(order)) - starts[sorted_owners]
+            keep = rank < self.top_m
+            totals = np.bincount(sorted_owners[keep], weights=scores[order][keep], minlength=count)
+            counts = np.bincount(sorted_owners[keep], minlength=count)
+            return (totals / np.maximum(counts, 1)).astype(np.float32)
+
+        aggregated = np.zeros(count, dtype=np.float32)
+        np.maximum.at(aggregated, owners, scores)
+        return aggregated
+
+    def enable_ann(self, nlist=256, nprobe=8, min_templates=20000):
+        """Activa el índice IVF cuando la galería supera ``min_templates`` plantillas.
+
+        ``nprobe`` es el número de particiones consultadas: más particiones dan
+        más recall y más latencia. La verificación 1:1 siempre es exacta.
+        """
+        self._ann_params = {'nlist': nlist, 'nprobe': nprobe, 'min_templates': min_templates}
+        self._ann = None
+
+    def prepare(self):
+        """Deja listos el índice aproximado y la agrupación por identidad antes de publicar.
+
+        Es el único punto que los modifica: las búsquedas solo los leen, así que
+        una galería ya publicada puede consultarse desde varios hilos. Una galería
+        usada sin publicar debe llamarlo tras sus altas para usar el índice IVF.
+        """
+        self._refresh_ann()
+        self._grouping = self._compute_grouping()
+        if self.storage == 'float16':
+            self._float32_view = self._matrix[:self._size].astype(np.float32)
+
+    def _refresh_ann(self):
+        """Entrena o re-entrena el índice cuando corresponde"""
+        params = self._ann_params
+        if params is None or self._size < params['min_templates']:
+            self._ann = None
+            return
+        # Re-entrenar si la galería creció mucho desde el último entrenamiento
+        if self._ann is None or self._size > 4 * self._ann.trained_size:
+            self._ann = IVFIndex(nlist=params['nlist'], nprobe=params['nprobe'])
+            self._ann.train(self._matrix[:self._size])
+
+    def _identity_scores(self, query, exact=False):
+        """Devuelve (identidades, similitudes agregadas); identidades None = todas"""
+        if self._ann is None or exact:
+            row_scores = self._row_scores(query)
+            return None, self._aggregate(row_scores, self._owners[:self._size], len(self._names))
+
+        rows = self._ann.candidates(query)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        row_scores = self._row_scores(query, rows)
+        identities, local_owners = np.unique(self._owners[rows], return_inverse=True)
+        return identities, self._aggregate(row_scores, local_owners, len(identities))
+
+    def scores(self, features):
+        """Similitud agregada (exacta) de un vector contra cada identidad de la galería"""
+        query = self._normalize(features)
+        if query is None or self._size == 0:
+            return None
+        return self._identity_scores(query, exact=True)[1]
+
+    def identify(self, features, k=1, min_similarity=None, exact=False):
+        """Búsqueda 1:N: devuelve hasta k pares (nombre, similitud) ordenados de mayor a menor"""
+        query = self._normalize(features)
+        if query is None or self._size == 0:
+            return []
+
+        identities, scores = self._identity_scores(query, exact=exact)
+        return self._top_k(identities, scores, k, min_similarity)
+
+    def _top_k(self, identities, scores, k, min_similarity):
+        """Los k mejores (nombre, similitud) de unas similitudes agregadas por identidad"""
+        if identities is None:
+            identities = np.arange(len(scores))
+
+        if min_similarity is not None:
+            # Salida temprana: solo se ordenan los candidatos sobre el umbral
+            keep = np.flatnonzero(scores >= min_similarity)
+            identities, scores = identities[keep], scores[keep]
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        return [(self._names[identities[i]], float(scores[i])) for i in top]
+
+    def _batch_row_scores(self, queries):
+        """Similitud de cada fila contra varias consultas: matriz (filas, consultas)"""
+        matrix = self._float_matrix()
+        if matrix is not None:
+            return np.maximum(matrix[:self._size] @ queries.T, 0.0)
+
+        scores = np.empty((self._size, len(queries)), dtype=np.float32)
+        for start in range(0, self._size, SCORE_BLOCK):
+            block = slice(start, min(start + SCORE_BLOCK, self._size))
+            scores[block] = self._matrix[block].astype(np.float32) @ queries.T
+        if self.storage == 'uint8':
+            scores *= self._scales[:self._size][:, None]
+        return np.maximum(scores, 0.0)
+
+    def _compute_grouping(self):
+        """(orden de filas por identidad, inicio de cada identidad) para reduceat"""
+        owners = self._owners[:self._size]
+        order = np.argsort(owners, kind='stable')
+        starts = np.searchsorted(owners[order], np.arange(len(self._names)))
+        return order, starts
+
+    def _group_rows(self):
+        """Agrupación preparada por ``prepare``; sin ella se calcula sin guardarla"""
+        return self._grouping if self._grouping is not None else self._compute_grouping()
+
+    def identify_batch(self, queries, k=1, min_similarity=None):
+        """Búsqueda 1:N exacta de varias consultas con multiplicaciones matriz-matriz.
+
+        Devuelve una lista de resultados como los de ``identify`` (vacía para las
+        consultas sin vector válido). Las consultas se procesan en bloques para
+        que la matriz temporal de similitudes no supere ~64 MB.
+        """
+        results = [[] for _ in queries]
+        normalized = [self._normalize(query) for query in queries]
+        valid = [i for i, vector in enumerate(normalized) if vector is not None]
+        if not valid or self._size == 0:
+            return results
+
+        count = len(self._names)
+        step = max(1, min(len(valid), (1 << 24) // self._size))
+        for start in range(0, len(valid), step):
+            chunk = valid[start:start + step]
+            row_scores = self._batch_row_scores(np.stack([normalized[i] for i in chunk]))
+            if self.scoring == 'mean_top' and self.top_m > 1:
+                owners = self._owners[:self._size]
+                aggregated = [self._aggregate(row_scores[:, j], owners, count) for j in range(len(chunk))]
+            else:
+                order, starts = self._group_rows()
+                aggregated = np.maximum.reduceat(row_scores[order], starts, axis=0).T
+            for j, i in enumerate(chunk):
+                results[i] = self._top_k(None, aggregated[j], k, min_similarity)
+        return results
+
+    def verify(self, features, name):
+        """Comparación 1:1 contra las plantillas de un usuario concreto"""
+        identity = self._index.get(name)
+        query = self._normalize(features)
+        if identity is None or query is None:
+            return 0.0
+
+        rows = np.asarray(self._rows[identity])
+        row_scores = self._row_scores(query, rows)
+        return float(self._aggregate(row_scores, np.zeros(len(rows), dtype=np.int32), 1)[0])
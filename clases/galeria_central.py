@@ -0,0 +1,444 @@
+import hmac
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+import config
+from clases.instantanea_galeria import write_snapshot_file
+
+SNAPSHOT_TYPE = 'application/octet-stream'
+# Cabecera con el secreto compartido entre el servidor central y los nodos
+TOKEN_HEADER = 'X-Token-Nodo'
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+class CentralGalleryServer:
+    """Servicio HTTP central de la galería para varias puertas.
+
+    Los nodos consultan ``/galeria/version``, descargan una instantánea completa
+    (``/galeria/instantanea``) o solo los cambios desde su versión
+    (``/galeria/delta?desde=N&epoca=E``) y envían sus accesos en lotes a
+    ``/eventos``. Las altas se hacen en el servidor central y los nodos las
+    reciben en la siguiente sincronización. Cada evento lleva un ``id`` propio:
+    un lote reenviado tras un fallo o un reinicio del nodo no se registra dos veces.
+
+    Las instantáneas contienen todas las plantillas biométricas: el servidor
+    escucha por defecto solo en la máquina local y cada petición debe llevar el
+    secreto compartido en la cabecera ``X-Token-Nodo``. Sin secreto solo se
+    permite escuchar en una dirección local.
+    """
+
+    def __init__(self, facial_recognition, database_manager=None, port=None, host=None, token=None):
+        self.face_recognition = facial_recognition
+        self.db = database_manager
+        self.port = config.SYSTEM_CONFIG['central_gallery_port'] if port is None else port
+        self.host = config.SYSTEM_CONFIG['central_gallery_host'] if host is None else host
+        self.token = config.SYSTEM_CONFIG['central_gallery_token'] if token is None else token
+        self.server = None
+        self.events = []            # sin base de datos los eventos se guardan en memoria
+        self._event_ids = set()
+        self._events_lock = threading.Lock()
+        self._cache_dir = None
+        self._cache = {}            # (versión, desde) -> archivo de instantánea ya generado
+        self._stale = []            # archivos retirados que aún no se pudieron borrar
+        self._cache_lock = threading.Lock()
+
+    def authorized(self, headers):
+        """Comprueba el secreto del nodo (sin secreto configurado no se exige)"""
+        if not self.token:
+            return True
+        return hmac.compare_digest((headers.get(TOKEN_HEADER) or '').encode('utf-8'),
+                                   self.token.encode('utf-8'))
+
+    def open_snapshot(self, since=None, epoch=None):
+        """Abre el archivo con la instantánea completa o el delta desde ``since``.
+
+        Devuelve None si el delta no es posible (otra época o sin historial).
+        Los archivos se generan una vez por versión y se comparten entre nodos;
+        se abren con el candado tomado para que una publicación posterior no
+        los retire antes de enviarlos.
+        """
+        with self._cache_lock:
+            path = self._snapshot_path(since, epoch)
+            return None if path is None else open(path, 'rb')
+
+    def _retire(self, path):
+        """Borra un archivo retirado; si aún está abierto (Windows) se reintenta después"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            self._stale.append(path)
+
+    def _snapshot_path(self, since, epoch):
+        """Ruta del archivo de la versión vigente (llamar con ``_cache_lock`` tomado)"""
+        service = self.face_recognition.gallery_service
+        gallery, version = service.snapshot(), service.version
+        if since is not None:
+            if epoch != service.epoch:
+                return None
+            changes = service.changes_since(since)
+            if changes is None:
+                return None
+
+        key = (version, since)
+        if key not in self._cache:
+            # Solo se conservan los archivos de la versión vigente
+            stale, self._stale = self._stale, []
+            for old_path in stale:
+                self._retire(old_path)
+            for old_key, old_path in list(self._cache.items()):
+                if old_key[0] != version:
+                    self._retire(old_path)
+                    del self._cache[old_key]
+
+            path = os.path.join(self._cache_dir, f"v{version}_{since}.fgs")
+            if since is None:
+                write_snapshot_file(path, gallery, version, service.epoch,
+                                    self.face_recognition.user_ids())
+            else:
+                changed, removed = changes
+                write_snapshot_file(path, gallery, version, service.epoch,
+                                    self.face_recognition.user_ids(), changed=changed,
+                                    removed=removed, base_version=since)
+            self._cache[key] = path
+        return self._cache[key]
+
+    def store_events(self, events):
+        """Registra un lote de accesos recibido de un nodo, ignorando los ya recibidos"""
+        if self.db:
+            return self.db.log_accesses(events)
+        with self._events_lock:
+            for event in events:
+                if event.get('id') not in self._event_ids:
+                    self._event_ids.add(event.get('id'))
+                    self.events.append(event)
+        return True
+
+    def start(self):
+        """Inicia el servidor en un hilo en segundo plano"""
+        if not self.token and self.host not in LOCAL_HOSTS:
+            print(f"❌ La galería central no escucha en '{self.host}' sin 'central_gallery_token'")
+            return False
+        central = self
+        self._cache_dir = tempfile.mkdtemp(prefix='galeria_central_')
+        self._cache = {}
+
+        class CentralHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                """Silencia los logs del servidor para evitar spam"""
+                return
+
+            def send_json(self, status, payload):
+                content = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def send_snapshot(self, f):
+                # Ya abierto: aunque se publique otra versión el contenido sigue disponible
+                with f:
+                    self.send_response(200)
+                    self.send_header('Content-type', SNAPSHOT_TYPE)
+                    self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                    self.end_headers()
+                    shutil.copyfileobj(f, self.wfile)
+
+            def check_token(self):
+                if central.authorized(self.headers):
+                    return True
+                self.send_json(401, {'error': "Nodo no autorizado"})
+                return False
+
+            def do_GET(self):
+                try:
+                    if not self.check_token():
+                        return
+                    parsed = urlparse(self.path)
+                    service = central.face_recognition.gallery_service
+                    if parsed.path == '/galeria/version':
+                        self.send_json(200, {'epoca': service.epoch, 'version': service.version})
+                    elif parsed.path == '/galeria/instantanea':
+                        self.send_snapshot(central.open_snapshot())
+                    elif parsed.path == '/galeria/delta':
+                        params = parse_qs(parsed.query)
+                        f = central.open_snapshot(since=int(params['desde'][0]),
+                                                  epoch=int(params['epoca'][0]))
+                        if f is None:
+                            self.send_json(409, {'error': "Se requiere una instantánea completa"})
+                        else:
+                            self.send_snapshot(f)
+                    else:
+                        self.send_error(404, "Endpoint no encontrado")
+                except FileNotFoundError:
+                    # Otra publicación retiró el archivo: el nodo reintenta en la siguiente ronda
+                    self.send_response(503)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                except Exception as e:
+                    print(f"❌ Error en GET {self.path}: {e}")
+                    self.send_error(500, f"Error interno: {str(e)}")
+
+            def do_POST(self):
+                try:
+                    if not self.check_token():
+                        return
+                    if self.path == '/eventos':
+                        length = int(self.headers.get('Content-Length', 0))
+                        events = json.loads(self.rfile.read(length).decode('utf-8'))
+                        if central.store_events(events):
+                            self.send_json(200, {'recibidos': len(events)})
+                        else:
+                            self.send_json(503, {'error': "No se pudieron registrar los eventos"})
+                    else:
+                        self.send_error(404, "Endpoint no encontrado")
+                except Exception as e:
+                    print(f"❌ Error en POST {self.path}: {e}")
+                    self.send_error(500, f"Error interno: {str(e)}")
+
+        http.server.ThreadingHTTPServer.allow_reuse_address = True
+        http.server.ThreadingHTTPServer.daemon_threads = True
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), CentralHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"🛰️  Galería central en http://{self.host}:{self.port}"
+              f"{'' if self.token else ' (sin secreto de nodo: solo acceso local)'}")
+        return True
+
+    def shutdown(self):
+        """Detiene el servidor y borra las instantáneas generadas"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self._cache_dir:
+            shutil.rmtree(self._cache_dir, ignore_errors=True)
+            self._cache_dir = None
+
+
+class DoorNode:
+    """Nodo de puerta que replica la galería central y le envía sus accesos.
+
+    Arranca desde su última instantánea local, de modo que sigue reconociendo
+    aunque el servidor central no esté disponible. Al reconectar descarga solo
+    los cambios desde su versión y envía los accesos acumulados en lotes.
+
+    La réplica es de solo lectura: las altas se hacen en el central. Los accesos
+    pendientes se anotan en ``events_path`` (una línea JSON por evento) y
+    sobreviven a un reinicio; el central descarta los que ya recibió por su id.
+    """
+
+    def __init__(self, facial_recognition, central_url, node_id, snapshot_path,
+                 sync_interval=5.0, event_batch=100, max_pending_events=100000, timeout=10.0,
+                 events_path=None, token=None):
+        self.face_recognition = facial_recognition
+        facial_recognition.gallery_service.read_only = True
+        self.central_url = central_url.rstrip('/')
+        self.node_id = node_id
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.event_batch = event_batch
+        self.max_pending_events = max_pending_events
+        self.timeout = timeout
+        self.events_path = events_path
+        self.token = config.SYSTEM_CONFIG['central_gallery_token'] if token is None else token
+        self.online = False
+        self.saved_version = None
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self.load_pending_events()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self.face_recognition.gallery_service.version
+
+    def _request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        request = urllib.request.Request(self.central_url + path, data=data, headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _download(self, path):
+        """Descarga una instantánea a un archivo temporal junto a la local"""
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        with self._request(path) as response:
+            with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+                shutil.copyfileobj(response, f)
+                return f.name
+
+    def load_local_snapshot(self):
+        """Arranque sin conexión desde la última instantánea guardada"""
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            self.face_recognition.load_gallery_snapshot(self.snapshot_path)
+            self.saved_version = self.version
+            return True
+        return False
+
+    def save_local_snapshot(self):
+        """Guarda la réplica para poder arrancar sin conexión"""
+        if self.snapshot_path and self.saved_version != self.version:
+            self.face_recognition.export_gallery(self.snapshot_path)
+            self.saved_version = self.version
+
+    def sync(self):
+        """Trae los cambios de la galería central; devuelve True si la réplica cambió"""
+        service = self.face_recognition.gallery_service
+        with self._request('/galeria/version') as response:
+            remote = json.loads(response.read().decode('utf-8'))
+        if remote['epoca'] == service.epoch and remote['version'] == service.version:
+            return False
+
+        if remote['epoca'] == service.epoch and service.version > 0:
+            try:
+                path = self._download(f"/galeria/delta?desde={service.version}&epoca={service.epoch}")
+                try:
+                    self.face_recognition.load_gallery_snapshot(path)
+                finally:
+                    os.remove(path)
+                return True
+            except urllib.error.HTTPError as e:
+                if e.code != 409:
+                    raise
+
+        # Primera sincronización, otra época o sin historial: instantánea completa
+        path = self._download('/galeria/instantanea')
+        if self.snapshot_path:
+            os.replace(path, self.snapshot_path)
+            path = self.snapshot_path
+        self.face_recognition.load_gallery_snapshot(path)
+        if self.snapshot_path:
+            self.saved_version = self.version
+        else:
+            os.remove(path)
+        return True
+
+    def load_pending_events(self):
+        """Recupera los accesos que quedaron sin enviar; ignora una última línea incompleta"""
+        if not self.events_path or not os.path.exists(self.events_path):
+            return 0
+        with open(self.events_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    continue
+        if self._pending:
+            print(f"📥 {len(self._pending)} accesos pendientes de enviar al central")
+        return len(self._pending)
+
+    def _rewrite_pending(self):
+        """Reescribe la cola en disco de forma atómica (llamar con el candado tomado)"""
+        if not self.events_path:
+            return
+        partial = f"{self.events_path}.tmp"
+        with open(partial, 'w', encoding='utf-8') as f:
+            for event in self._pending:
+                f.write(json.dumps(event) + '\n')
+        os.replace(partial, self.events_path)
+
+    def record_access(self, usuario_id, nombre_usuario, tipo_acceso, similitud, imagen_path):
+        """Encola un acceso para enviarlo al servidor central (misma firma que ``log_access``)"""
+        event = {
+            'id': uuid.uuid4().hex,
+            'nodo': self.node_id,
+            'usuario_id': usuario_id,
+            'nombre_usuario': nombre_usuario,
+            'tipo_acceso': tipo_acceso,
+            'similitud': float(similitud),
+            'imagen_path': imagen_path,
+            'fecha_acceso': datetime.now().isoformat()
+        }
+        with self._pending_lock:
+            self._pending.append(event)
+            if len(self._pending) > self.max_pending_events:
+                dropped = len(self._pending) - self.max_pending_events
+                del self._pending[:dropped]
+                print(f"⚠️  Cola de accesos llena: {dropped} eventos antiguos descartados")
+                self._rewrite_pending()
+            elif self.events_path:
+                with open(self.events_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(event) + '\n')
+
+    def flush_events(self):
+        """Envía los accesos pendientes en lotes; devuelve cuántos se enviaron"""
+        sent = 0
+        try:
+            while True:
+                with self._pending_lock:
+                    batch = self._pending[:self.event_batch]
+                if not batch:
+                    return sent
+                with self._request('/eventos', batch):
+                    pass
+                # Se retiran solo tras la confirmación: un fallo deja el lote para el siguiente intento
+                with self._pending_lock:
+                    del self._pending[:len(batch)]
+                sent += len(batch)
+        finally:
+            # La cola en disco se reescribe una vez por ronda; si el nodo cae antes,
+            # los lotes ya confirmados se reenvían y el central los descarta por su id
+            if sent:
+                with self._pending_lock:
+                    self._rewrite_pending()
+
+    @property
+    def pending_events(self):
+        return len(self._pending)
+
+    def step(self):
+        """Una ronda de sincronización y envío; devuelve False si el central no responde"""
+        try:
+            changed = self.sync()
+            self.flush_events()
+            if changed and self.snapshot_path and self.saved_version != self.version:
+                self.save_local_snapshot()
+            if not self.online:
+                print(f"🟢 Nodo {self.node_id} conectado (versión {self.version})")
+            self.online = True
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            if self.online:
+                print(f"🔴 Nodo {self.node_id} sin conexión con el central: {e}")
+            self.online = False
+        return self.online
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"❌ Error sincronizando nodo {self.node_id}: {e}")
+            self._stop.wait(self.sync_interval)
+
+    def start(self):
+        """Carga la instantánea local y sincroniza en segundo plano"""
+        self.load_local_snapshot()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene la sincronización, intenta enviar lo pendiente y guarda la réplica"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        try:
+            self.flush_events()
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            print(f"⚠️  {self.pending_events} accesos sin enviar al central")
+        self.save_local_snapshot()
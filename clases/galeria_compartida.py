@@ -0,0 +1,200 @@
+import struct
+import time
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from clases.galeria import FaceGallery, STORAGE_DTYPES
+
+# Formato de la instantánea: cabecera fija + bloques alineados a 64 bytes
+MAGIC = b'FGAL'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sIQIQQBBHQ16s')   # magic, formato, generación, dim, filas, identidades,
+                                            # almacenamiento, puntuación, top_m, bytes de nombres,
+                                            # tipo de características
+ALIGN = 64
+
+STORAGE_CODES = {name: i for i, name in enumerate(STORAGE_DTYPES)}
+SCORING_CODES = {'max': 0, 'mean_top': 1}
+
+# Segmento de control: contador de generación de 8 bytes alineado
+CONTROL = struct.Struct('<Q')
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def snapshot_layout(gallery):
+    """Calcula los desplazamientos de cada bloque y el tamaño total de la instantánea"""
+    names, matrix, scales, owners = gallery.arrays()
+    names_blob = '\n'.join(names).encode('utf-8')
+
+    layout = {}
+    offset = _align(HEADER.size)
+    for key, nbytes in (('matrix', matrix.nbytes), ('scales', scales.nbytes),
+                        ('owners', owners.nbytes), ('names', len(names_blob))):
+        layout[key] = offset
+        offset = _align(offset + nbytes)
+    return layout, offset, names_blob
+
+
+def write_snapshot(buffer, gallery, generation, layout, names_blob):
+    """Escribe la galería en un buffer (memoria compartida o archivo mapeado)"""
+    names, matrix, scales, owners = gallery.arrays()
+    HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, generation, gallery.dim, len(matrix),
+                     len(names), STORAGE_CODES[gallery.storage], SCORING_CODES[gallery.scoring],
+                     gallery.top_m, len(names_blob), gallery.feature_type.encode('ascii'))
+
+    for key, array in (('matrix', matrix), ('scales', scales), ('owners', owners)):
+        target = np.ndarray(array.shape, dtype=array.dtype, buffer=buffer, offset=layout[key])
+        target[...] = array
+    buffer[layout['names']:layout['names'] + len(names_blob)] = names_blob
+
+
+def read_snapshot(buffer):
+    """Adjunta una instantánea sin copiar las plantillas; devuelve (generación, galería)"""
+    (magic, version, generation, dim, rows, identities, storage_code, scoring_code,
+     top_m, names_bytes, feature_type) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Instantánea de galería no válida")
+
+    storage = list(STORAGE_DTYPES)[storage_code]
+    scoring = {code: name for name, code in SCORING_CODES.items()}[scoring_code]
+    dtype = STORAGE_DTYPES[storage]
+
+    offset = _align(HEADER.size)
+    matrix = np.ndarray((rows, dim), dtype=dtype, buffer=buffer, offset=offset)
+    offset = _align(offset + matrix.nbytes)
+    scales = np.ndarray(rows, dtype=np.float32, buffer=buffer, offset=offset)
+    offset = _align(offset + scales.nbytes)
+    owners = np.ndarray(rows, dtype=np.int32, buffer=buffer, offset=offset)
+    offset = _align(offset + owners.nbytes)
+    names_blob = bytes(buffer[offset:offset + names_bytes])
+    names = names_blob.decode('utf-8').split('\n') if identities else []
+
+    for array in (matrix, scales, owners):
+        array.flags.writeable = False
+
+    gallery = FaceGallery.from_arrays(names, matrix, scales, owners, storage=storage, scoring=scoring,
+                                      top_m=top_m, feature_type=feature_type.rstrip(b'\0').decode('ascii'))
+    return generation, gallery
+
+
+def _attach(name):
+    """Adjunta un segmento existente sin que el resource_tracker lo borre al salir"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 no tiene track=False: se evita el registro en lugar de
+        # des-registrar, porque con fork el tracker es compartido con el escritor
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedGalleryPublisher:
+    """Publica instantáneas de solo lectura de la galería en memoria compartida.
+
+    Cada publicación crea un segmento nuevo ``<prefijo>_g<generación>`` y después
+    actualiza el contador del segmento de control, de modo que los lectores ven
+    la instantánea anterior completa o la nueva completa, nunca una mezcla.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.generation = 0
+        self._segment = None
+        try:
+            self._control = shared_memory.SharedMemory(name=f"{prefix}_ctl", create=True,
+                                                       size=CONTROL.size)
+        except FileExistsError:
+            self._control = shared_memory.SharedMemory(name=f"{prefix}_ctl")
+            self.generation = CONTROL.unpack_from(self._control.buf, 0)[0]
+
+    def segment_name(self, generation):
+        return f"{self.prefix}_g{generation}"
+
+    def publish(self, gallery):
+        """Publica la galería como nueva generación y retira la anterior"""
+        generation = self.generation + 1
+        layout, size, names_blob = snapshot_layout(gallery)
+        segment = shared_memory.SharedMemory(name=self.segment_name(generation),
+                                             create=True, size=max(size, 1))
+        write_snapshot(segment.buf, gallery, generation, layout, names_blob)
+
+        # Cambio atómico de generación: una escritura alineada de 8 bytes
+        CONTROL.pack_into(self._control.buf, 0, generation)
+
+        # Los lectores ya adjuntos conservan su mapeo; borrar el nombre es seguro
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+        self._segment = segment
+        self.generation = generation
+        return generation
+
+    def close(self):
+        """Libera todos los segmentos publicados"""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+        self._control.close()
+        self._control.unlink()
+
+
+class SharedGalleryReader:
+    """Adjunta la última instantánea publicada sin copiarla (uno por proceso de trabajo)"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.generation = 0
+        self.gallery = None
+        self._segment = None
+        self._retired = []      # segmentos anteriores con vistas aún en uso
+        self._control = _attach(f"{prefix}_ctl")
+
+    def current_generation(self):
+        return CONTROL.unpack_from(self._control.buf, 0)[0]
+
+    def refresh(self, retries=5):
+        """Cambia a la última generación si hay una nueva; devuelve la galería vigente"""
+        for _ in range(retries):
+            generation = self.current_generation()
+            if generation == self.generation or generation == 0:
+                return self.gallery
+            try:
+                segment = _attach(f"{self.prefix}_g{generation}")
+            except FileNotFoundError:
+                # El escritor publicó otra generación mientras leíamos el contador
+                time.sleep(0.001)
+                continue
+
+            _, gallery = read_snapshot(segment.buf)
+            if self._segment is not None:
+                self._retired.append(self._segment)
+            self._segment, self.gallery, self.generation = segment, gallery, generation
+            self._release_retired()
+            return self.gallery
+        return self.gallery
+
+    def _release_retired(self):
+        """Cierra los segmentos anteriores cuyas vistas ya no usa nadie"""
+        pending = []
+        for segment in self._retired:
+            try:
+                segment.close()
+            except BufferError:
+                # Una identificación en curso aún usa la instantánea anterior
+                pending.append(segment)
+        self._retired = pending
+
+    def close(self):
+        self.gallery = None
+        if self._segment is not None:
+            self._retired.append(self._segment)
+            self._segment = None
+        self._release_retired()
+        self._control.close()
@@ -0,0 +1,180 @@
+import heapq
+import multiprocessing
+import threading
+import zlib
+import numpy as np
+from clases.galeria import FaceGallery, FEATURE_DIM, FEATURE_TYPE
+
+# Los fragmentos replican la galería del servicio: la política de reemplazo ya se
+# aplicó allí, así que dentro de un fragmento no se descarta ninguna plantilla
+SHARD_MAX_TEMPLATES = 1 << 30
+
+
+def shard_of(name, shards):
+    """Fragmento dueño de un usuario (estable entre ejecuciones y procesos)"""
+    return zlib.crc32(name.encode('utf-8')) % shards
+
+
+def _shard_worker(connection, params):
+    """Proceso dueño de un fragmento: aplica cambios y responde búsquedas por lotes"""
+    params = dict(params, max_templates=SHARD_MAX_TEMPLATES)
+    gallery = FaceGallery(**params)
+    load_params = {key: value for key, value in params.items() if key != 'dim'}
+    while True:
+        message = connection.recv()
+        op = message[0]
+        if op == 'load':
+            _, names, matrix, scales, owners, paths = message
+            gallery = FaceGallery.from_arrays(names, matrix, scales, owners, paths=paths, **load_params)
+            gallery.prepare()
+            connection.send(len(gallery))
+        elif op == 'apply':
+            _, upserts, removals = message
+            for path in removals:
+                gallery.remove_template(path)
+            for name, path, features in upserts:
+                gallery.remove_template(path)
+                gallery.add(name, features, path)
+            gallery.prepare()
+            connection.send(len(gallery))
+        elif op == 'identify':
+            _, queries, k, min_similarity = message
+            connection.send(gallery.identify_batch(queries, k=k, min_similarity=min_similarity))
+        elif op == 'stats':
+            connection.send({'usuarios': len(gallery), 'plantillas': gallery.template_count})
+        else:
+            connection.send(None)
+            break
+    connection.close()
+
+
+class ShardedGallery:
+    """Galería repartida entre K procesos para búsquedas 1:N muy grandes.
+
+    Cada usuario pertenece a un fragmento según un hash estable de su nombre.
+    Una identificación se envía a todos los fragmentos, cada uno devuelve su
+    top-k local y aquí se mezclan para obtener el top-k global. Con ``attach``
+    los fragmentos siguen al servicio de galería: cada publicación se reenvía
+    solo al fragmento dueño de las plantillas que cambiaron.
+    """
+
+    def __init__(self, shards, storage='float32', scoring='max', top_m=2,
+                 dim=FEATURE_DIM, feature_type=FEATURE_TYPE):
+        self.shards = max(1, shards)
+        self.params = {'storage': storage, 'scoring': scoring, 'top_m': top_m,
+                       'dim': dim, 'feature_type': feature_type}
+        self.version = None
+        self.epoch = None
+        self._service = None
+        self._path_shard = {}       # ruta -> fragmento que tiene la plantilla
+        self._lock = threading.Lock()
+
+        # 'spawn': los procesos no heredan por fork la galería ni los hilos del proceso principal
+        context = multiprocessing.get_context('spawn')
+        self._connections = []
+        self._processes = []
+        for _ in range(self.shards):
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(child, self.params), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _call(self, messages):
+        """Envía un mensaje por fragmento ({fragmento: mensaje}) y espera todas las respuestas"""
+        with self._lock:
+            for shard, message in messages.items():
+                self._connections[shard].send(message)
+            return {shard: self._connections[shard].recv() for shard in messages}
+
+    def load(self, gallery):
+        """Reparte una galería completa entre los fragmentos"""
+        names, matrix, scales, owners = gallery.arrays()
+        paths = gallery.paths()
+        identity_shard = np.array([shard_of(name, self.shards) for name in names], dtype=np.int64)
+        row_shard = identity_shard[owners] if len(owners) else np.zeros(0, dtype=np.int64)
+
+        messages = {}
+        self._path_shard = {}
+        for shard in range(self.shards):
+            identities = np.flatnonzero(identity_shard == shard)
+            rows = np.flatnonzero(row_shard == shard)
+            local = np.full(len(names), -1, dtype=np.int32)
+            local[identities] = np.arange(len(identities), dtype=np.int32)
+            shard_paths = [paths[row] for row in rows]
+            messages[shard] = ('load', [names[i] for i in identities], np.ascontiguousarray(matrix[rows]),
+                               scales[rows].copy(), local[owners[rows]], shard_paths)
+            self._path_shard.update((path, shard) for path in shard_paths if path is not None)
+        self._call(messages)
+
+    def apply(self, upserts, removals):
+        """Envía altas (nombre, ruta, características) y bajas solo a los fragmentos dueños"""
+        batches = {}
+        for path in removals:
+            shard = self._path_shard.pop(path, None)
+            if shard is not None:
+                batches.setdefault(shard, ([], []))[1].append(path)
+        for name, path, features in upserts:
+            shard = shard_of(name, self.shards)
+            previous = self._path_shard.get(path)
+            if previous is not None and previous != shard:
+                # La ruta cambió de usuario y de fragmento
+                batches.setdefault(previous, ([], []))[1].append(path)
+            if path is not None:
+                self._path_shard[path] = shard
+            batches.setdefault(shard, ([], []))[0].append((name, path, features))
+        if batches:
+            self._call({shard: ('apply', ups, rems) for shard, (ups, rems) in batches.items()})
+
+    def attach(self, service):
+        """Mantiene los fragmentos sincronizados con un ``GalleryService``"""
+        self._service = service
+        self._sync(service.snapshot(), service.version, full=True)
+        service.subscribe(self._on_publish)
+
+    def _on_publish(self, gallery, version):
+        self._sync(gallery, version)
+
+    def _sync(self, gallery, version, full=False):
+        service = self._service
+        changes = None
+        if not full and service.epoch == self.epoch and self.version is not None:
+            changes = service.changes_since(self.version)
+        if changes is None:
+            self.load(gallery)
+        else:
+            changed, removed = changes
+            self.apply(gallery.templates(changed), removed)
+        self.version, self.epoch = version, service.epoch
+
+    def identify_batch(self, queries, k=1, min_similarity=None):
+        """Difunde las consultas a todos los fragmentos y mezcla sus top-k locales"""
+        queries = np.asarray(queries, dtype=np.float32)
+        replies = self._call({shard: ('identify', queries, k, min_similarity)
+                              for shard in range(self.shards)})
+        return [heapq.nlargest(k, (match for shard in range(self.shards) for match in replies[shard][i]),
+                               key=lambda match: match[1])
+                for i in range(len(queries))]
+
+    def identify(self, features, k=1, min_similarity=None):
+        """Búsqueda 1:N de una consulta (mismo formato que ``FaceGallery.identify``)"""
+        if features is None:
+            return []
+        return self.identify_batch([np.asarray(features, dtype=np.float32).ravel()], k, min_similarity)[0]
+
+    def stats(self):
+        """Usuarios y plantillas de cada fragmento"""
+        replies = self._call({shard: ('stats',) for shard in range(self.shards)})
+        return [replies[shard] for shard in range(self.shards)]
+
+    def close(self):
+        """Detiene los procesos de los fragmentos"""
+        try:
+            self._call({shard: ('close',) for shard in range(self.shards)})
+        except (OSError, EOFError):
+            pass
+        for process in self._processes:
+            process.join(timeout=5)
+        for connection in self._connections:
+            connection.close()
@@ -0,0 +1,255 @@
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+import cv2
+import config
+from clases.reconocimiento_fac import FacialRecognition
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+CSV_FIELDS = ['archivo', 'frame', 'mejor_coincidencia', 'similitud', 'top_k']
+
+# Estado de cada proceso de trabajo (se inicializa una sola vez por proceso)
+_worker = {}
+
+
+def _init_worker(gallery, top_k, shared_prefix=None):
+    """Prepara el extractor y la galería en el proceso de trabajo.
+
+    Con ``shared_prefix`` el proceso se adjunta a la galería publicada en
+    memoria compartida en lugar de recibir su propia copia.
+    """
+    # Un hilo de OpenCV por proceso para que el escalado sea por núcleos y no por hilos
+    cv2.setNumThreads(1)
+    _worker['recognizer'] = FacialRecognition(None, load_faces=False)
+    if shared_prefix:
+        from clases.galeria_compartida import SharedGalleryReader
+        _worker['reader'] = SharedGalleryReader(shared_prefix)
+        gallery = _worker['reader'].refresh()
+    _worker['gallery'] = gallery
+    _worker['top_k'] = top_k
+
+
+def _match(image):
+    """Extrae características y las compara contra toda la galería en una multiplicación"""
+    features = _worker['recognizer'].extract_advanced_features(image)
+    if features is None:
+        return "Desconocido", 0.0, []
+
+    top = [(name, round(similarity, 4))
+           for name, similarity in _worker['gallery'].identify(features, k=_worker['top_k'])]
+    if not top:
+        return "Desconocido", 0.0, []
+    return top[0][0], top[0][1], top
+
+
+def _process_task(task):
+    """Procesa un bloque de imágenes o un rango de frames de un video"""
+    kind = task[0]
+    rows = []
+
+    if kind == 'imagenes':
+        for path in task[1]:
+            image = cv2.imread(path)
+            if image is None:
+                rows.append((path, '', "Error lectura", 0.0, []))
+                continue
+            rows.append((path, '') + _match(image))
+    else:
+        _, path, start, end, step, skip = task
+        cap = cv2.VideoCapture(path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while index < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if (index - start) % step == 0 and index not in skip:
+                rows.append((path, index) + _match(frame))
+            index += 1
+        cap.release()
+
+    return rows
+
+
+class BatchIdentifier:
+    """Re-ejecuta la identificación sobre imágenes y videos almacenados usando varios procesos"""
+
+    def __init__(self, facial_recognition, workers=None, top_k=3, output_format='csv',
+                 frame_step=1, images_per_task=16, frames_per_task=240):
+        self.face_recognition = facial_recognition
+        self.workers = workers or cpu_count()
+        self.top_k = top_k
+        self.output_format = output_format
+        self.frame_step = max(1, frame_step)
+        self.images_per_task = images_per_task
+        self.frames_per_task = frames_per_task
+
+    def shared_gallery(self):
+        """(prefijo, usuarios) de la galería publicada en memoria compartida; None si no hay.
+
+        Solo se usa si es del mismo tipo de características que la local.
+        """
+        prefix = config.SYSTEM_CONFIG['shared_gallery_name']
+        if not prefix:
+            return None
+        from clases.galeria_compartida import SharedGalleryReader
+        try:
+            reader = SharedGalleryReader(prefix)
+        except FileNotFoundError:
+            return None
+        try:
+            gallery = reader.refresh()
+            if gallery is None or gallery.feature_type != self.face_recognition.feature_type:
+                return None
+            return prefix, len(gallery)
+        finally:
+            gallery = None
+            reader.close()
+
+    def collect_inputs(self, paths):
+        """Expande carpetas y separa imágenes de videos"""
+        images, videos = [], []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for filename in sorted(files):
+                        full_path = os.path.join(root, filename)
+                        if filename.lower().endswith(IMAGE_EXTENSIONS):
+                            images.append(full_path)
+                        elif filename.lower().endswith(VIDEO_EXTENSIONS):
+                            videos.append(full_path)
+            elif path.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(path)
+            elif path.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append(path)
+            else:
+                print(f"⚠️  Entrada ignorada: {path}")
+        return images, videos
+
+    def load_processed(self, output_path):
+        """Lee la salida existente para reanudar; descarta una última línea incompleta"""
+        done = set()
+        if not os.path.exists(output_path):
+            return done
+
+        with open(output_path, 'rb+') as f:
+            content = f.read()
+            last_newline = content.rfind(b'\n')
+            if last_newline + 1 != len(content):
+                f.truncate(last_newline + 1)
+                content = content[:last_newline + 1]
+
+        lines = content.decode('utf-8').splitlines()
+        if self.output_format == 'csv':
+            for row in csv.DictReader(lines):
+                done.add((row['archivo'], row['frame']))
+        else:
+            for line in lines:
+                if line.strip():
+                    row = json.loads(line)
+                    done.add((row['archivo'], '' if row['frame'] is None else str(row['frame'])))
+        return done
+
+    def build_tasks(self, images, videos, done):
+        """Genera las tareas pendientes y el total de elementos a procesar"""
+        tasks = []
+        total = 0
+
+        pending = [path for path in images if (path, '') not in done]
+        for i in range(0, len(pending), self.images_per_task):
+            tasks.append(('imagenes', pending[i:i + self.images_per_task]))
+        total += len(pending)
+
+        for path in videos:
+            cap = cv2.VideoCapture(path)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            if frame_count <= 0:
+                print(f"⚠️  No se pudo leer el video: {path}")
+                continue
+
+            for start in range(0, frame_count, self.frames_per_task):
+                end = min(start + self.frames_per_task, frame_count)
+                # Primer frame del bloque en la rejilla global (0, paso, 2*paso...): el
+                # muestreo no se reinicia en cada bloque aunque el tamaño no sea múltiplo
+                first = start + (-start) % self.frame_step
+                skip = {i for i in range(first, end, self.frame_step) if (path, str(i)) in done}
+                wanted = len(range(first, end, self.frame_step))
+                if wanted == 0 or len(skip) == wanted:
+                    continue
+                tasks.append(('video', path, first, end, self.frame_step, skip))
+                total += wanted - len(skip)
+
+        return tasks, total
+
+    def _write_rows(self, f, writer, rows):
+        """Escribe las filas de un bloque completo y fuerza el volcado a disco"""
+        for path, frame, best_match, similarity, top in rows:
+            if self.output_format == 'csv':
+                writer.writerow([path, frame, best_match, f"{similarity:.4f}",
+                                 ';'.join(f"{name}:{score:.4f}" for name, score in top)])
+            else:
+                f.write(json.dumps({
+                    'archivo': path,
+                    'frame': None if frame == '' else frame,
+                    'mejor_coincidencia': best_match,
+                    'similitud': similarity,
+                    'top_k': [{'nombre': name, 'similitud': score} for name, score in top]
+                }, ensure_ascii=False) + '\n')
+        f.flush()
+
+    def run(self, inputs, output_path):
+        """Procesa todas las entradas y escribe los resultados en streaming"""
+        images, videos = self.collect_inputs(inputs)
+        done = self.load_processed(output_path)
+        tasks, total = self.build_tasks(images, videos, done)
+
+        if done:
+            print(f"🔄 Reanudando: {len(done)} elementos ya procesados")
+        if not tasks:
+            print("✅ No hay elementos pendientes")
+            return 0
+
+        # Con una galería publicada en memoria compartida los procesos se adjuntan
+        # a ella; si no, cada uno recibe su copia serializada
+        shared = self.shared_gallery()
+        if shared:
+            initargs = (None, self.top_k, shared[0])
+            users = shared[1]
+        else:
+            gallery = self.face_recognition.gallery
+            initargs = (gallery, self.top_k)
+            users = len(gallery)
+        print(f"🚀 Procesando {total} elementos con {self.workers} procesos "
+              f"contra {users} rostros conocidos{' (memoria compartida)' if shared else ''}")
+
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        processed = 0
+        started = time.time()
+        last_report = 0.0
+
+        with open(output_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f) if self.output_format == 'csv' else None
+            if writer and new_file:
+                writer.writerow(CSV_FIELDS)
+
+            with Pool(self.workers, initializer=_init_worker, initargs=initargs) as pool:
+                for rows in pool.imap_unordered(_process_task, tasks):
+                    self._write_rows(f, writer, rows)
+                    processed += len(rows)
+
+                    elapsed = time.time() - started
+                    if elapsed - last_report >= 1.0 or processed >= total:
+                        last_report = elapsed
+                        rate = processed / elapsed if elapsed > 0 else 0.0
+                        sys.stderr.write(f"\r📊 {processed}/{total} ({rate:.1f}/s)")
+                        sys.stderr.flush()
+
+        sys.stderr.write("\n")
+        print(f"✅ {processed} elementos procesados en {time.time() - started:.1f}s -> {output_path}")
+        return processed
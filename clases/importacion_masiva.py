@@ -0,0 +1,281 @@
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+import zipfile
+from multiprocessing import Pool, cpu_count
+import cv2
+import numpy as np
+from clases.reconocimiento_fac import FacialRecognition, IMAGE_EXTENSIONS
+
+REPORT_FIELDS = ['archivo', 'usuario', 'estado', 'detalle']
+
+# Estados finales: una imagen con alguno de ellos no se vuelve a procesar
+STATES = ('importada', 'existente', 'descartada', 'sin_rostro', 'error_lectura', 'nombre_invalido')
+
+# ``ana.jpg`` o ``ana.2.jpg`` en la raíz; cualquier nombre dentro de ``ana/``
+NUMBERED_NAME = re.compile(r'^(.+)\.(\d+)$')
+# Separadores de ruta y caracteres de control: el usuario se usa como carpeta
+INVALID_NAME_CHARS = re.compile(r'[\\/\x00-\x1f\x7f]')
+
+# Estado de cada proceso de trabajo (se inicializa una sola vez por proceso)
+_worker = {}
+
+
+def _init_worker(faces_dir):
+    """Prepara el extractor en el proceso de trabajo"""
+    cv2.setNumThreads(1)
+    _worker['recognizer'] = FacialRecognition(None, load_faces=False)
+    _worker['faces_dir'] = faces_dir
+    _worker['archives'] = {}
+
+
+def _read_source(archive, member):
+    """Lee los bytes de una imagen suelta o de un miembro del zip"""
+    if archive is None:
+        with open(member, 'rb') as f:
+            return f.read()
+    if archive not in _worker['archives']:
+        _worker['archives'][archive] = zipfile.ZipFile(archive)
+    return _worker['archives'][archive].read(member)
+
+
+def _extract(item):
+    """Extrae características de una imagen y la copia a la carpeta del usuario.
+
+    El nombre de destino se deriva del contenido, así que repetir la importación
+    reutiliza el mismo archivo en lugar de duplicarlo.
+    """
+    source, username, archive, member = item
+    try:
+        data = _read_source(archive, member)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        return source, username, 'error_lectura', str(e), None, None
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return source, username, 'error_lectura', "Formato de imagen no válido", None, None
+
+    features = _worker['recognizer'].extract_advanced_features(image)
+    if features is None:
+        return source, username, 'sin_rostro', "No se detectó un rostro", None, None
+
+    digest = hashlib.sha1(data).hexdigest()[:16]
+    extension = os.path.splitext(member)[1].lower()
+    user_dir = os.path.join(_worker['faces_dir'], username)
+    destination = os.path.join(user_dir, f"import_{digest}{extension}")
+    if not os.path.exists(destination):
+        os.makedirs(user_dir, exist_ok=True)
+        # Escritura atómica: nunca queda en la galería una imagen a medio copiar
+        partial = f"{destination}.{os.getpid()}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, destination)
+    return source, username, 'ok', '', destination, features
+
+
+class BulkImporter:
+    """Alta masiva de usuarios y rostros desde una carpeta o un zip.
+
+    Extrae las características en varios procesos, crea los usuarios con una
+    inserción de varias filas por bloque y registra el resultado de cada imagen
+    en un informe CSV. El informe permite reanudar una importación interrumpida
+    y los nombres de destino derivados del contenido la hacen repetible.
+    """
+
+    def __init__(self, facial_recognition, database_manager=None, workers=None, chunk_size=500):
+        self.face_recognition = facial_recognition
+        self.db = database_manager
+        self.workers = workers or cpu_count()
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def split_path(relative_path):
+        """Componentes de una ruta relativa con cualquier separador"""
+        return [part for part in re.split(r'[\\/]', relative_path) if part and part != '.']
+
+    @staticmethod
+    def is_valid_username(name):
+        """El usuario da nombre a su carpeta: sin separadores, ``..`` ni caracteres de control"""
+        return bool(name.strip()) and '..' not in name and not INVALID_NAME_CHARS.search(name)
+
+    @classmethod
+    def username_for(cls, parts):
+        """Usuario de una imagen según su ruta relativa a la raíz (ya sin carpeta común).
+
+        Solo las carpetas inmediatas de la raíz son carpetas de usuario (``ana/*.jpg``
+        o ``ana/sub/*.jpg``); en la raíz el usuario es el nombre del archivo sin
+        ``.N``. Devuelve None si el nombre no es válido.
+        """
+        if len(parts) > 1:
+            name = parts[0]
+        else:
+            stem = os.path.splitext(parts[0])[0]
+            match = NUMBERED_NAME.match(stem)
+            name = match.group(1) if match else stem
+        return name if cls.is_valid_username(name) else None
+
+    def collect_sources(self, source):
+        """Lista (id, usuario o None si no es válido, zip, miembro) de una carpeta o zip"""
+        found = []
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, filename)
+                        found.append((path, os.path.relpath(path, source), None, path))
+        elif zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for member in archive.namelist():
+                    if member.lower().endswith(IMAGE_EXTENSIONS) and not member.startswith('__MACOSX'):
+                        found.append((f"{source}:{member}", member, source, member))
+        else:
+            raise ValueError(f"'{source}' no es una carpeta ni un archivo zip")
+
+        paths = [self.split_path(relative) for _, relative, _, _ in found]
+        # Una sola carpeta que envuelve todo (``lote/ana.jpg``, ``lote/luis/1.jpg``) no es un usuario
+        if paths and all(len(parts) > 1 for parts in paths) and len({parts[0] for parts in paths}) == 1:
+            paths = [parts[1:] for parts in paths]
+        items = [(item_id, self.username_for(parts), archive, member)
+                 for (item_id, _, archive, member), parts in zip(found, paths)]
+        return sorted(items, key=lambda item: item[0])
+
+    @staticmethod
+    def load_credentials(csv_path):
+        """Lee un CSV con columnas ``usuario`` y ``password``"""
+        credentials = {}
+        if not csv_path:
+            return credentials
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                username = (row.get('usuario') or '').strip()
+                if username:
+                    credentials[username] = (row.get('password') or '').strip()
+        return credentials
+
+    @staticmethod
+    def load_report(report_path):
+        """Imágenes ya resueltas en una ejecución anterior; descarta una línea incompleta"""
+        done = set()
+        if not os.path.exists(report_path):
+            return done
+
+        with open(report_path, 'rb+') as f:
+            content = f.read()
+            last_newline = content.rfind(b'\n')
+            if last_newline + 1 != len(content):
+                f.truncate(last_newline + 1)
+                content = content[:last_newline + 1]
+
+        for row in csv.DictReader(content.decode('utf-8').splitlines()):
+            if row['estado'] in STATES:
+                done.add(row['archivo'])
+        return done
+
+    def _commit_chunk(self, extracted, credentials, writer, f):
+        """Crea los usuarios del bloque, actualiza la galería y anota el informe"""
+        known = self.face_recognition.file_signatures
+        rows = []
+        upserts = []
+        for source, username, state, detail, destination, features in extracted:
+            if state != 'ok':
+                rows.append([source, username, state, detail])
+            elif destination in known:
+                rows.append([source, username, 'existente', destination])
+            else:
+                upserts.append((username, destination, features))
+                rows.append([source, username, None, destination])
+
+        # También los usuarios ya presentes en disco: una importación interrumpida
+        # pudo copiar sus imágenes sin llegar a crearlos
+        users = sorted({username for _, username, state, _, _, _ in extracted if state == 'ok'})
+        if users and self.db:
+            created = self.db.bulk_register_users(
+                [(name, credentials.get(name) or 'temp_password') for name in users])
+            if created is None:
+                # Sin usuarios en la base de datos no se toca la galería: se reintenta al reanudar
+                for name, destination, _ in upserts:
+                    if destination not in known and os.path.exists(destination):
+                        os.remove(destination)
+                raise RuntimeError("No se pudieron registrar los usuarios en la base de datos")
+
+        outcome = {}
+        if upserts:
+            for _, path, added, _ in self.face_recognition.apply_gallery_changes(upserts, []):
+                outcome[path] = 'importada' if added else 'descartada'
+                if not added and os.path.exists(path):
+                    # Copia propia de la importación que la galería no aceptó
+                    os.remove(path)
+
+        counts = {}
+        for row in rows:
+            if row[2] is None:
+                row[2] = outcome[row[3]]
+            counts[row[2]] = counts.get(row[2], 0) + 1
+            writer.writerow(row)
+        f.flush()
+        return counts
+
+    def run(self, source, report_path, credentials_path=None):
+        """Importa todas las imágenes pendientes; devuelve el recuento por estado"""
+        credentials = self.load_credentials(credentials_path)
+        items = self.collect_sources(source)
+        done = self.load_report(report_path)
+        pending = [item for item in items if item[0] not in done]
+
+        if done:
+            print(f"🔄 Reanudando: {len(items) - len(pending)} imágenes ya importadas")
+        if not pending:
+            print("✅ No hay imágenes pendientes")
+            return {}
+
+        invalid = [item for item in pending if item[1] is None]
+        pending = [item for item in pending if item[1] is not None]
+        if invalid:
+            print(f"⚠️  {len(invalid)} imágenes con un nombre de usuario no válido")
+
+        users = {item[1] for item in pending}
+        print(f"🚀 Importando {len(pending)} imágenes de {len(users)} usuarios con {self.workers} procesos")
+
+        new_file = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+        totals = {}
+        processed = 0
+        started = time.time()
+        last_report = 0.0
+
+        with open(report_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(REPORT_FIELDS)
+            for item_id, _, _, member in invalid:
+                writer.writerow([item_id, '', 'nombre_invalido', member])
+            if invalid:
+                totals['nombre_invalido'] = len(invalid)
+                f.flush()
+
+            chunk = []
+            with Pool(self.workers, initializer=_init_worker,
+                      initargs=(self.face_recognition.known_faces_dir,)) as pool:
+                for result in pool.imap_unordered(_extract, pending, chunksize=8):
+                    chunk.append(result)
+                    processed += 1
+                    if len(chunk) >= self.chunk_size or processed == len(pending):
+                        for state, count in self._commit_chunk(chunk, credentials, writer, f).items():
+                            totals[state] = totals.get(state, 0) + count
+                        chunk = []
+
+                    elapsed = time.time() - started
+                    if elapsed - last_report >= 1.0 or processed == len(pending):
+                        last_report = elapsed
+                        sys.stderr.write(f"\r📊 {processed}/{len(pending)} "
+                                         f"({processed / elapsed if elapsed > 0 else 0.0:.1f}/s)")
+                        sys.stderr.flush()
+
+        sys.stderr.write("\n")
+        print(f"✅ Importación terminada en {time.time() - started:.1f}s -> {report_path}")
+        for state in STATES:
+            if totals.get(state):
+                print(f"   {state:<14} {totals[state]:>6}")
+        return totals
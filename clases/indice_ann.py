@@ -0,0 +1,114 @@
+import copy
+import numpy as np
+
+
+class IVFIndex:
+    """Índice aproximado IVF (listas invertidas sobre k-means esférico) en NumPy.
+
+    Las plantillas se reparten en ``nlist`` particiones; una consulta solo
+    compara contra las filas de las ``nprobe`` particiones más cercanas, de modo
+    que ``nprobe`` controla el equilibrio entre recall y latencia.
+    """
+
+    def __init__(self, nlist=256, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        # Cada partición es un array de filas que no se modifica en su sitio: un
+        # cambio crea un array nuevo, así que las copias del índice las comparten
+        self._lists = []            # partición -> np.array de filas de la galería
+        self._assign = np.full(16, -1, dtype=np.int32)     # fila -> partición (-1 = ninguna)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _nearest(self, vectors, chunk=65536):
+        """Partición más cercana para cada vector (por bloques para acotar memoria)"""
+        result = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            # La escala por fila no cambia el argmax, así que sirve cualquier almacenamiento
+            block = vectors[start:start + chunk].astype(np.float32)
+            result[start:start + chunk] = np.argmax(block @ self.centroids.T, axis=1)
+        return result
+
+    def train(self, matrix, sample_size=100000):
+        """Entrena los centroides con k-means esférico y reparte todas las filas"""
+        rng = np.random.default_rng(self.seed)
+        count = len(matrix)
+        nlist = max(1, min(self.nlist, count // 8 or 1))
+
+        sample = matrix
+        if count > sample_size:
+            sample = matrix[rng.choice(count, sample_size, replace=False)]
+        sample = sample.astype(np.float32)
+        sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            self.centroids = centroids
+            labels = self._nearest(sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Las particiones vacías se reinician con puntos aleatorios de la muestra
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.trained_size = count
+        labels = self._nearest(matrix)
+        order = np.argsort(labels, kind='stable')
+        ends = np.cumsum(np.bincount(labels, minlength=nlist))
+        self._lists = [order[start:end] for start, end in zip(np.concatenate(([0], ends[:-1])), ends)]
+        self._assign = np.full(max(16, count), -1, dtype=np.int32)
+        self._assign[:count] = labels
+
+    def copy(self):
+        """Copia para una galería nueva: comparte centroides y particiones sin copiarlas"""
+        clone = copy.copy(self)
+        clone._lists = list(self._lists)
+        clone._assign = self._assign.copy()
+        return clone
+
+    def add(self, row, vector):
+        """Inserción incremental de una fila nueva"""
+        label = int(np.argmax(self.centroids @ vector))
+        self._lists[label] = np.append(self._lists[label], row)
+        if row >= len(self._assign):
+            assign = np.full(max(row + 1, 2 * len(self._assign)), -1, dtype=np.int32)
+            assign[:len(self._assign)] = self._assign
+            self._assign = assign
+        self._assign[row] = label
+
+    def remove(self, row):
+        label = int(self._assign[row]) if row < len(self._assign) else -1
+        if label >= 0:
+            rows = self._lists[label]
+            self._lists[label] = rows[rows != row]
+            self._assign[row] = -1
+
+    def move(self, old_row, new_row):
+        """Actualiza el índice cuando la galería reubica una fila"""
+        label = int(self._assign[old_row]) if old_row < len(self._assign) else -1
+        if label >= 0:
+            rows = self._lists[label].copy()
+            rows[rows == old_row] = new_row
+            self._lists[label] = rows
+            self._assign[old_row] = -1
+            self._assign[new_row] = label
+
+    def candidates(self, query, nprobe=None):
+        """Filas de la galería en las particiones más cercanas a la consulta (solo lectura)"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        if nprobe < len(centroid_scores):
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(len(centroid_scores))
+        return np.concatenate([self._lists[label] for label in probes])
@@ -0,0 +1,187 @@
+import hashlib
+import mmap
+import os
+import struct
+import numpy as np
+from clases.galeria import FaceGallery, STORAGE_DTYPES, FEATURE_TYPE
+from clases.galeria_compartida import STORAGE_CODES, SCORING_CODES, _align
+
+# Archivo de instantánea: cabecera fija + bloques alineados a 64 bytes (mapeables sin copia)
+MAGIC = b'FGSN'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sIBBBBHIQQQQQQQQ32s16s')  # magic, formato, tipo, almacenamiento, puntuación,
+                                                    # reservado, top_m, dim, época, versión, versión base,
+                                                    # filas, identidades, bytes de nombres, de rutas,
+                                                    # de rutas eliminadas, SHA-256 del contenido,
+                                                    # tipo de características
+# El formato 1 no guardaba el tipo de características: solo existía el histograma global
+HEADER_V1 = struct.Struct('<4sIBBBBHIQQQQQQQQ32s')
+PREAMBLE = struct.Struct('<4sI')
+HEADERS = {1: HEADER_V1, FORMAT_VERSION: HEADER}
+KIND_FULL = 0
+KIND_DELTA = 1
+
+
+class GallerySnapshot:
+    """Contenido de un archivo de instantánea (completa o delta)"""
+
+    def __init__(self, kind, epoch, version, base_version, gallery, user_ids, removed):
+        self.kind = kind
+        self.epoch = epoch
+        self.version = version
+        self.base_version = base_version
+        self.gallery = gallery          # plantillas completas o solo las modificadas
+        self.user_ids = user_ids        # nombre -> id de usuario en la base de datos
+        self.removed = removed          # rutas eliminadas desde la versión base (deltas)
+
+    @property
+    def is_delta(self):
+        return self.kind == KIND_DELTA
+
+    def upserts(self):
+        """Plantillas como (nombre, ruta, características) para aplicarlas a otra galería"""
+        names, matrix = self.gallery.matrix()
+        return list(zip(names, self.gallery.paths(), matrix))
+
+
+def _subset(gallery, paths):
+    """Arrays de la galería restringidos a las filas de ``paths`` (para deltas)"""
+    names, matrix, scales, owners = gallery.arrays()
+    wanted = set(paths)
+    rows = [row for row, path in enumerate(gallery.paths()) if path in wanted]
+    identities, owners = np.unique(owners[rows], return_inverse=True)
+    return ([names[i] for i in identities], matrix[rows], scales[rows],
+            owners.astype(np.int32), [gallery.paths()[row] for row in rows])
+
+
+def _blob(items):
+    return '\n'.join(items).encode('utf-8')
+
+
+def _split(blob, count):
+    return blob.decode('utf-8').split('\n') if count else []
+
+
+def write_snapshot_file(filename, gallery, version, epoch, user_ids=None,
+                        changed=None, removed=(), base_version=0):
+    """Escribe la galería en ``filename`` de forma atómica.
+
+    Sin ``changed`` se exporta completa; con ``changed`` (rutas modificadas desde
+    ``base_version``) y ``removed`` se exporta solo el delta. Devuelve los bytes escritos.
+    """
+    if changed is None:
+        kind = KIND_FULL
+        names, matrix, scales, owners = gallery.arrays()
+        paths = gallery.paths()
+    else:
+        kind = KIND_DELTA
+        names, matrix, scales, owners, paths = _subset(gallery, changed)
+
+    user_ids = user_ids or {}
+    ids = np.array([user_ids.get(name, -1) for name in names], dtype=np.int64)
+    names_blob = _blob(names)
+    paths_blob = _blob(path or '' for path in paths)
+    removed_blob = _blob(removed)
+
+    layout = {}
+    offset = _align(HEADER.size)
+    for key, nbytes in (('matrix', matrix.nbytes), ('scales', scales.nbytes),
+                        ('owners', owners.nbytes), ('ids', ids.nbytes), ('names', len(names_blob)),
+                        ('paths', len(paths_blob)), ('removed', len(removed_blob))):
+        layout[key] = offset
+        offset = _align(offset + nbytes)
+    size = offset
+
+    partial = f"{filename}.{os.getpid()}.tmp"
+    with open(partial, 'wb+') as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as buffer:
+            for key, array in (('matrix', matrix), ('scales', scales), ('owners', owners), ('ids', ids)):
+                target = np.ndarray(array.shape, dtype=array.dtype, buffer=buffer, offset=layout[key])
+                target[...] = array
+                del target
+            for key, blob in (('names', names_blob), ('paths', paths_blob), ('removed', removed_blob)):
+                buffer[layout[key]:layout[key] + len(blob)] = blob
+
+            checksum = hashlib.sha256(memoryview(buffer)[_align(HEADER.size):]).digest()
+            HEADER.pack_into(buffer, 0, MAGIC, FORMAT_VERSION, kind, STORAGE_CODES[gallery.storage],
+                             SCORING_CODES[gallery.scoring], 0, gallery.top_m, gallery.dim, epoch,
+                             version, base_version, len(matrix), len(names), len(names_blob),
+                             len(paths_blob), len(removed_blob), checksum,
+                             gallery.feature_type.encode('ascii'))
+            buffer.flush()
+    os.replace(partial, filename)
+    return size
+
+
+def read_snapshot_file(filename, verify=True, **params):
+    """Mapea un archivo de instantánea en memoria sin copiar las plantillas.
+
+    ``verify`` comprueba la suma SHA-256 antes de usarlo; ``params`` se pasan a la
+    galería (p. ej. ``max_templates`` y ``replacement`` de la configuración local).
+    """
+    with open(filename, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buffer) < PREAMBLE.size:
+        raise ValueError(f"Instantánea de galería truncada: {filename}")
+    magic, version_format = PREAMBLE.unpack_from(buffer, 0)
+    header = HEADERS.get(version_format)
+    if magic != MAGIC or header is None:
+        raise ValueError(f"Instantánea de galería no válida: {filename}")
+    if len(buffer) < header.size:
+        raise ValueError(f"Instantánea de galería truncada: {filename}")
+    fields = header.unpack_from(buffer, 0)
+    (_, _, kind, storage_code, scoring_code, _, top_m, dim, epoch, version, base_version, rows,
+     identities, names_bytes, paths_bytes, removed_bytes, checksum) = fields[:17]
+    feature_type = fields[17].rstrip(b'\0').decode('ascii') if len(fields) > 17 else FEATURE_TYPE
+    if verify and hashlib.sha256(memoryview(buffer)[_align(header.size):]).digest() != checksum:
+        raise ValueError(f"Suma de verificación incorrecta en la instantánea: {filename}")
+
+    storage = list(STORAGE_DTYPES)[storage_code]
+    scoring = {code: name for name, code in SCORING_CODES.items()}[scoring_code]
+
+    # np.frombuffer sobre un mmap de solo lectura devuelve arrays de solo lectura
+    offset = _align(header.size)
+    matrix = np.frombuffer(buffer, dtype=STORAGE_DTYPES[storage], count=rows * dim,
+                           offset=offset).reshape(rows, dim)
+    offset = _align(offset + matrix.nbytes)
+    scales = np.frombuffer(buffer, dtype=np.float32, count=rows, offset=offset)
+    offset = _align(offset + scales.nbytes)
+    owners = np.frombuffer(buffer, dtype=np.int32, count=rows, offset=offset)
+    offset = _align(offset + owners.nbytes)
+    ids = np.frombuffer(buffer, dtype=np.int64, count=identities, offset=offset)
+    offset = _align(offset + ids.nbytes)
+    names = _split(buffer[offset:offset + names_bytes], identities)
+    offset = _align(offset + names_bytes)
+    paths = [path or None for path in _split(buffer[offset:offset + paths_bytes], rows)]
+    offset = _align(offset + paths_bytes)
+    removed = _split(buffer[offset:offset + removed_bytes], removed_bytes)
+
+    gallery = FaceGallery.from_arrays(names, matrix, scales, owners, paths=paths,
+                                      storage=storage, scoring=scoring, top_m=top_m,
+                                      feature_type=feature_type, **params)
+    user_ids = {name: int(user_id) for name, user_id in zip(names, ids) if user_id >= 0}
+    return GallerySnapshot(kind, epoch, version, base_version, gallery, user_ids, removed)
+
+
+def gallery_diff(base, current, tolerance=1e-3):
+    """Cambios por ruta para pasar de ``base`` a ``current``: (altas, rutas eliminadas).
+
+    Las altas son (nombre, ruta, características) de plantillas nuevas, con otro
+    usuario o con características distintas.
+    """
+    base_names, base_matrix = base.matrix()
+    previous = {path: (name, row) for row, (name, path) in enumerate(zip(base_names, base.paths()))}
+
+    names, matrix = current.matrix()
+    upserts = []
+    seen = set()
+    for row, (name, path) in enumerate(zip(names, current.paths())):
+        seen.add(path)
+        old = previous.get(path)
+        if (old is None or old[0] != name
+                or not np.allclose(base_matrix[old[1]], matrix[row], atol=tolerance)):
+            upserts.append((name, path, matrix[row]))
+    removals = [path for path in previous if path not in seen]
+    return upserts, removals
@@ -0,0 +1,210 @@
+import cProfile
+import functools
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+import numpy as np
+import config
+
+# Intento en curso del hilo (None fuera de un intento muestreado)
+_local = threading.local()
+_NULL = nullcontext()
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+class _Span:
+    """Mide una etapa dentro del intento en curso"""
+
+    __slots__ = ('attempt', 'stage', 'parent', 'started')
+
+    def __init__(self, attempt, stage):
+        self.attempt = attempt
+        self.stage = stage
+
+    def __enter__(self):
+        self.parent = self.attempt.current
+        self.attempt.current = self.stage
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        finished = time.perf_counter()
+        self.attempt.current = self.parent
+        self.attempt.spans.append((self.stage, self.parent, self.started, finished))
+        return False
+
+
+class Attempt:
+    """Un intento de acceso perfilado: reúne sus etapas y las escribe al terminar"""
+
+    def __init__(self, profiler, kind):
+        self.profiler = profiler
+        self.kind = kind
+        self.request_id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self.current = None
+        self._profile = None
+
+    def __enter__(self):
+        _local.attempt = self
+        if self.profiler.slow_ms is not None:
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Ya hay otro perfilador activo en el proceso
+                self._profile = None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        finished = time.perf_counter()
+        if self._profile:
+            self._profile.disable()
+        _local.attempt = None
+        self.profiler.write(self, finished)
+        return False
+
+
+class Profiler:
+    """Escribe las etapas de los intentos muestreados como líneas JSON.
+
+    Cada proceso escribe en ``<directorio>/etapas-<pid>.jsonl``. Con
+    ``slow_ms`` cada intento muestreado se ejecuta además bajo cProfile y, si
+    supera ese tiempo, su perfil se guarda en ``<directorio>/<id>.prof``.
+    """
+
+    def __init__(self, directory=None, sample_rate=None, slow_ms=None):
+        self.directory = directory or config.SYSTEM_CONFIG['profiling_dir']
+        self.sample_rate = config.SYSTEM_CONFIG['profiling_sample_rate'] if sample_rate is None else sample_rate
+        self.slow_ms = config.SYSTEM_CONFIG['profiling_slow_ms'] if slow_ms is None else slow_ms
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def attempt(self, kind):
+        """Contexto de un intento; no mide nada si el intento no sale en la muestra"""
+        if getattr(_local, 'attempt', None) is not None:
+            # Un intento dentro de otro se registra como una etapa más
+            return _Span(_local.attempt, kind)
+        if random.random() >= self.sample_rate:
+            return _NULL
+        return Attempt(self, kind)
+
+    def write(self, attempt, finished):
+        """Añade las etapas del intento (y una línea 'total') al archivo del proceso"""
+        total_ms = (finished - attempt.started) * 1000
+        profile_path = None
+        if attempt._profile and total_ms >= self.slow_ms:
+            profile_path = os.path.join(self.directory, f"{attempt.request_id}.prof")
+            attempt._profile.dump_stats(profile_path)
+
+        date = time.strftime('%Y-%m-%d %H:%M:%S')
+        base = {'id': attempt.request_id, 'intento': attempt.kind, 'fecha': date}
+        lines = []
+        for stage, parent, started, ended in attempt.spans:
+            lines.append(dict(base, etapa=stage, padre=parent,
+                              inicio_ms=round((started - attempt.started) * 1000, 3),
+                              duracion_ms=round((ended - started) * 1000, 3)))
+        lines.append(dict(base, etapa='total', padre=None, inicio_ms=0.0,
+                          duracion_ms=round(total_ms, 3), perfil=profile_path))
+
+        path = os.path.join(self.directory, f"etapas-{os.getpid()}.jsonl")
+        with self._lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines))
+
+
+def get_profiler():
+    """Perfilador configurado (``profiling``); None si el perfilado está desactivado"""
+    global _profiler
+    if not config.SYSTEM_CONFIG['profiling']:
+        return None
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
+
+
+def attempt(kind):
+    """Contexto que agrupa las etapas de un intento de acceso bajo un id de petición"""
+    profiler = get_profiler()
+    return profiler.attempt(kind) if profiler else _NULL
+
+
+def span(stage):
+    """Contexto que mide una etapa del intento en curso (sin coste fuera de un intento)"""
+    current = getattr(_local, 'attempt', None)
+    return _Span(current, stage) if current is not None else _NULL
+
+
+def profiled(kind):
+    """Decorador: cada llamada es un intento perfilado del tipo ``kind``"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with attempt(kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stage(name):
+    """Decorador: cada llamada es una etapa del intento en curso"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def span_files(paths):
+    """Archivos de etapas: los indicados y los ``etapas-*.jsonl`` de los directorios"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, 'etapas-*.jsonl')))
+        else:
+            files.append(path)
+    return files
+
+
+def summarize_spans(paths):
+    """Percentiles de duración por (tipo de intento, etapa) de los archivos de etapas"""
+    durations = {}
+    attempts = {}
+    for path in span_files(paths):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                durations.setdefault((row['intento'], row['etapa']), []).append(row['duracion_ms'])
+                if row['etapa'] == 'total':
+                    attempts[row['intento']] = attempts.get(row['intento'], 0) + 1
+
+    summary = []
+    for (kind, stage_name), values in durations.items():
+        values = np.asarray(values)
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        summary.append({
+            'intento': kind,
+            'etapa': stage_name,
+            'muestras': len(values),
+            # Veces que aparece la etapa por intento (p. ej. una detección por frame)
+            'por_intento': round(len(values) / max(1, attempts.get(kind, 0)), 2),
+            'media_ms': round(float(values.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p90_ms': round(float(p90), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(values.max()), 3)
+        })
+    summary.sort(key=lambda row: (row['intento'], row['etapa'] != 'total', -row['p50_ms']))
+    return summary
@@ -1,158 +1,826 @@
-import cv2
-import numpy as np
-import os
-from datetime import datetime
-import config
-
-class FacialRecognition:
-    def __init__(self, database_manager):
-        self.db = database_manager
-        self.known_faces_dir = config.SYSTEM_CONFIG['known_faces_dir']
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.known_faces = {}
-        
-        self.load_known_faces()
-    
-    def load_known_faces(self):
-        """Carga rostros conocidos desde el directorio"""
-        self.known_faces = {}
-        
-        if not os.path.exists(self.known_faces_dir):
-            os.makedirs(self.known_faces_dir)
-            print(f"📁 Carpeta '{self.known_faces_dir}' creada.")
-            return
-        
-        print("🔄 Cargando rostros conocidos...")
-        
-        for filename in os.listdir(self.known_faces_dir):
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                name = os.path.splitext(filename)[0]
-                path = os.path.join(self.known_faces_dir, filename)
-                
-                # Sincronizar con base de datos
-                self.db.sync_user(name)
-                
-                img = cv2.imread(path)
-                if img is not None:
-                    self.known_faces[name] = {
-                        'path': path,
-                        'features': self.extract_advanced_features(img)
-                    }
-                    print(f"✅ {name}")
-    
-    def extract_advanced_features(self, image):
-        """Extrae características del rostro"""
-        if image is None:
-            return None
-        
-        try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)
-            
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-            
-            if len(faces) > 0:
-                x, y, w, h = faces[0]
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (200, 200))
-                
-                hist = cv2.calcHist([face_roi], [0], None, [256], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-                
-                return hist
-            
-            return None
-            
-        except Exception as e:
-            print(f"❌ Error extrayendo características: {e}")
-            return None
-    
-    def compare_faces(self, features1, features2):
-        """Compara características faciales y devuelve float nativo"""
-        if features1 is None or features2 is None:
-            return 0.0
-        
-        min_len = min(len(features1), len(features2))
-        feat1 = features1[:min_len]
-        feat2 = features2[:min_len]
-        
-        dot_product = np.dot(feat1, feat2)
-        norm1 = np.linalg.norm(feat1)
-        norm2 = np.linalg.norm(feat2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        similarity = dot_product / (norm1 * norm2)
-        
-        # Convertir a float nativo de Python
-        if hasattr(similarity, 'item'):
-            return max(0.0, similarity.item())
-        else:
-            return max(0.0, float(similarity))
-    
-    def capture_face(self):
-        """Captura rostro desde cámara"""
-        cap = cv2.VideoCapture(0)
-        
-        if not cap.isOpened():
-            print("❌ No se puede acceder a la cámara")
-            return None
-        
-        print("\n📷 Mire a la cámara...")
-        print("🟢 Presione ESPACIO para capturar")
-        print("🔴 Presione Q para cancelar")
-        
-        captured_frame = None
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-            
-            display_frame = frame.copy()
-            
-            for (x, y, w, h) in faces:
-                cv2.rectangle(display_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            
-            cv2.putText(display_frame, "ESPACIO: Capturar - Q: Cancelar", (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-            
-            cv2.imshow('Reconocimiento Facial', display_frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord(' '):
-                captured_frame = frame.copy()
-                print("✅ Foto capturada")
-                break
-            elif key == ord('q'):
-                print("❌ Captura cancelada")
-                break
-        
-        cap.release()
-        cv2.destroyAllWindows()
-        return captured_frame
-    
-    def recognize_face(self, frame):
-        """Reconoce un rostro en el frame capturado"""
-        current_features = self.extract_advanced_features(frame)
-        
-        if current_features is None:
-            print("❌ No se detectó rostro")
-            return "Desconocido", 0.0
-        
-        best_match = "Desconocido"
-        best_similarity = 0.0
-        
-        for name, user_data in self.known_faces.items():
-            similarity = self.compare_faces(current_features, user_data['features'])
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = name
-        
-        print(f"🔍 Similitud: {best_similarity:.3f}")
-        return best_match, best_similarity
\ No newline at end of file
+import cv2
+import numpy as np
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import config
+from clases.galeria import FaceGallery
+from clases.descriptores import get_descriptor
+from clases.cache_resultados import ResultCache, face_hash
+from clases.calidad_rostro import QUALITY_OK, QUALITY_REASONS, QualityGate, frame_gray, largest_face
+from clases.detectores import create_detector
+from clases.duplicados import similar_identities, record_enrollment_alert
+from clases.perfilado import attempt, span, stage
+from clases.servicio_galeria import GalleryService
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+class FacialRecognition:
+    def __init__(self, database_manager, load_faces=True, services=True):
+        self.db = database_manager
+        self.known_faces_dir = config.SYSTEM_CONFIG['known_faces_dir']
+        try:
+            self.detector = create_detector()
+        except (FileNotFoundError, SystemError, cv2.error) as e:
+            backend = config.SYSTEM_CONFIG['face_detector']
+            print(f"⚠️  ATENCIÓN: no se pudo crear el detector '{backend}' ({e})")
+            print("⚠️  Se usa el detector Haar: menos preciso y más lento. "
+                  "Descarga los modelos con: python herramientas.py descargar-modelos")
+            self.detector = create_detector('haar')
+        # Extractor configurado: las plantillas solo se comparan con las del mismo tipo
+        self.feature_type = config.SYSTEM_CONFIG['feature_type']
+        _, self.descriptor = get_descriptor(self.feature_type)
+        # Filtro de calidad previo a la extracción en los caminos de comparación en vivo
+        self.quality_gate = QualityGate() if config.SYSTEM_CONFIG['quality_gate'] else None
+        # Resultados recientes por rostro y cámara (frames casi idénticos no se vuelven a comparar)
+        self.result_cache = ResultCache() if config.SYSTEM_CONFIG['result_cache'] else None
+        # Todas las modificaciones de la galería pasan por el servicio
+        self.gallery_service = GalleryService(self.new_gallery)
+        self.gallery_service.subscribe(self._on_gallery_published)
+        self.publisher = None
+        self.watcher = None
+        self.shards = None
+        self._template_sync_stop = None
+        
+        # Sincronización incremental con la tabla de plantillas
+        self.last_template_sync = None
+        self.template_versions = {}
+        
+        # Firma (mtime, tamaño) de cada imagen ya incorporada a la galería
+        self.file_signatures = {}
+        
+        # Umbral de similitud propio de cada usuario (nombre -> umbral)
+        self.user_thresholds = {}
+        self.thresholds_loaded_at = None
+        
+        # Los procesos de trabajo (p. ej. identificación por lotes) solo necesitan el extractor.
+        # Sin ``services`` (herramientas puntuales) se carga la galería pero no se arrancan
+        # fragmentos, memoria compartida, vigilante ni sincronización en segundo plano
+        if load_faces:
+            if services and config.SYSTEM_CONFIG['gallery_shards'] > 1:
+                self.enable_shards(config.SYSTEM_CONFIG['gallery_shards'])
+            snapshot_path = config.SYSTEM_CONFIG['gallery_snapshot']
+            if snapshot_path and os.path.exists(snapshot_path):
+                self.load_gallery_snapshot(snapshot_path)
+            elif config.SYSTEM_CONFIG['template_source'] == 'database' and self.db:
+                self.load_templates_from_db()
+                if services and config.SYSTEM_CONFIG['template_sync_interval']:
+                    self.start_template_sync(config.SYSTEM_CONFIG['template_sync_interval'])
+            else:
+                self.load_known_faces()
+            if services and config.SYSTEM_CONFIG['shared_gallery_name']:
+                self.enable_shared_gallery(config.SYSTEM_CONFIG['shared_gallery_name'])
+            if services and config.SYSTEM_CONFIG['watch_faces_dir']:
+                self.start_watcher()
+            if config.SYSTEM_CONFIG['adaptive_thresholds'] and self.db:
+                self.load_user_thresholds()
+    
+    @property
+    def gallery(self):
+        """Instantánea inmutable vigente de la galería"""
+        return self.gallery_service.snapshot()
+    
+    @staticmethod
+    def new_gallery():
+        """Crea una galería vacía con la política de plantillas configurada"""
+        feature_type = config.SYSTEM_CONFIG['feature_type']
+        gallery = FaceGallery(
+            dim=get_descriptor(feature_type)[0],
+            feature_type=feature_type,
+            max_templates=config.SYSTEM_CONFIG['max_templates_per_user'],
+            replacement=config.SYSTEM_CONFIG['template_replacement'],
+            scoring=config.SYSTEM_CONFIG['template_scoring'],
+            top_m=config.SYSTEM_CONFIG['template_top_m'],
+            storage=config.SYSTEM_CONFIG['gallery_storage']
+        )
+        if config.SYSTEM_CONFIG['ann_index']:
+            gallery.enable_ann(
+                nlist=config.SYSTEM_CONFIG['ann_nlist'],
+                nprobe=config.SYSTEM_CONFIG['ann_nprobe'],
+                min_templates=config.SYSTEM_CONFIG['ann_min_templates']
+            )
+        return gallery
+    
+    def enable_shared_gallery(self, prefix):
+        """Publica la galería en memoria compartida para procesos de reconocimiento"""
+        from clases.galeria_compartida import SharedGalleryPublisher
+        
+        self.publisher = SharedGalleryPublisher(prefix)
+        self.publish_gallery()
+        print(f"🔗 Galería publicada en memoria compartida '{prefix}'")
+    
+    def publish_gallery(self):
+        """Publica una nueva generación si hay memoria compartida configurada"""
+        if self.publisher:
+            self.publisher.publish(self.gallery)
+    
+    def _on_gallery_published(self, gallery, version):
+        """Propaga cada nueva instantánea del servicio de galería"""
+        if self.publisher:
+            self.publisher.publish(gallery)
+    
+    def enable_shards(self, shards):
+        """Reparte la búsqueda 1:N entre procesos que siguen al servicio de galería"""
+        from clases.galeria_fragmentada import ShardedGallery
+        
+        self.shards = ShardedGallery(
+            shards,
+            storage=config.SYSTEM_CONFIG['gallery_storage'],
+            scoring=config.SYSTEM_CONFIG['template_scoring'],
+            top_m=config.SYSTEM_CONFIG['template_top_m'],
+            dim=self.gallery.dim,
+            feature_type=self.feature_type
+        )
+        self.shards.attach(self.gallery_service)
+        print(f"🧩 Galería repartida en {shards} procesos")
+    
+    def start_watcher(self):
+        """Inicia la recarga en caliente del directorio de rostros"""
+        from clases.vigilante_rostros import FacesDirectoryWatcher
+        
+        self.watcher = FacesDirectoryWatcher(self, interval=config.SYSTEM_CONFIG['watch_interval'])
+        self.watcher.start()
+    
+    def start_template_sync(self, interval):
+        """Sincroniza periódicamente la galería con la tabla de plantillas en segundo plano"""
+        self._template_sync_stop = threading.Event()
+        
+        def run(stop):
+            while not stop.wait(interval):
+                try:
+                    self.sync_templates_from_db()
+                except Exception as e:
+                    print(f"❌ Error sincronizando plantillas: {e}")
+        
+        threading.Thread(target=run, args=(self._template_sync_stop,), daemon=True).start()
+        print(f"🔄 Sincronización de plantillas cada {interval}s")
+    
+    def close(self):
+        """Libera los recursos compartidos"""
+        if self._template_sync_stop:
+            self._template_sync_stop.set()
+            self._template_sync_stop = None
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        if self.publisher:
+            self.publisher.close()
+            self.publisher = None
+        if self.shards:
+            self.shards.close()
+            self.shards = None
+    
+    def list_face_images(self):
+        """Lista (nombre, ruta) de las imágenes de rostros.
+        
+        Admite el formato antiguo ``<usuario>.jpg`` y una carpeta ``<usuario>/``
+        con varias plantillas del mismo usuario.
+        """
+        images = []
+        for entry in sorted(os.listdir(self.known_faces_dir)):
+            path = os.path.join(self.known_faces_dir, entry)
+            if os.path.isdir(path):
+                for filename in sorted(os.listdir(path)):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        images.append((entry, os.path.join(path, filename)))
+            elif entry.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.splitext(entry)[0], path))
+        return images
+    
+    @staticmethod
+    def file_signature(path):
+        """Firma barata para detectar cambios en una imagen: (mtime_ns, tamaño)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_known_faces(self):
+        """Carga rostros conocidos desde el directorio"""
+        self.file_signatures = {}
+        
+        if not os.path.exists(self.known_faces_dir):
+            os.makedirs(self.known_faces_dir)
+            print(f"📁 Carpeta '{self.known_faces_dir}' creada.")
+            self.gallery_service.bulk_load([])
+            return
+        
+        print("🔄 Cargando rostros conocidos...")
+        
+        items = []
+        synced = set()
+        for name, path in self.list_face_images():
+            # Sincronizar con base de datos (opcional en herramientas offline)
+            if self.db and name not in synced:
+                self.db.sync_user(name)
+                synced.add(name)
+            
+            self.file_signatures[path] = self.file_signature(path)
+            img = cv2.imread(path)
+            if img is not None:
+                items.append((name, path, self.extract_advanced_features(img)))
+        
+        for name, path, added in self.gallery_service.bulk_load(items):
+            if added:
+                print(f"✅ {name}")
+            else:
+                print(f"⚠️  {name}: plantilla descartada ({os.path.basename(path)})")
+    
+    def load_templates_from_db(self):
+        """Carga la galería completa desde la tabla de plantillas con una consulta en streaming.
+        
+        Las plantillas llegan ya extraídas: no se lee ninguna imagen ni se
+        ejecuta el detector. Recuerda la última fecha de actualización vista
+        para que ``sync_templates_from_db`` pida solo lo posterior. Si la lectura
+        falla se conserva la galería anterior (la sincronización periódica la
+        completará) y devuelve False.
+        """
+        started = datetime.now()
+        versions = {}
+        
+        def items():
+            for rows in self.db.iter_templates(self.feature_type):
+                for name, path, dimension, blob, _, updated in rows:
+                    versions[path] = updated
+                    yield name, path, np.frombuffer(blob, dtype=np.float32, count=dimension)
+        
+        try:
+            # bulk_load solo publica tras consumir todas las filas
+            discarded = sum(1 for _, _, added in self.gallery_service.bulk_load(items()) if not added)
+        except Exception as e:
+            print(f"❌ No se pudieron cargar las plantillas ({e}); se conserva la galería anterior")
+            return False
+        self.template_versions = versions
+        self.last_template_sync = max(versions.values(), default=None)
+        
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"🗄️  {self.gallery.template_count} plantillas de {len(self.gallery)} usuarios "
+              f"cargadas desde la base de datos ({elapsed:.2f}s)")
+        if discarded:
+            print(f"⚠️  {discarded} plantillas descartadas por el máximo por usuario")
+        return True
+    
+    def sync_templates_from_db(self):
+        """Aplica a la galería solo las filas de plantillas cambiadas desde la última sincronización.
+        
+        Se consulta con un pequeño margen hacia atrás para no perder filas
+        confirmadas tarde; las filas ya aplicadas con la misma fecha se omiten.
+        Si la lectura falla no se aplica nada ni avanza la fecha: la siguiente
+        sincronización vuelve a pedir las mismas filas. Devuelve el número de
+        plantillas afectadas.
+        """
+        since = self.last_template_sync
+        if since is None:
+            since = datetime(1970, 1, 1)
+        else:
+            since -= timedelta(seconds=config.SYSTEM_CONFIG['template_sync_overlap'])
+        
+        upserts, removals = [], []
+        latest = self.last_template_sync
+        versions = {}               # ruta -> fecha (None: baja) hasta terminar la lectura
+        for rows in self.db.iter_templates(self.feature_type, since=since):
+            for name, path, dimension, blob, deleted, updated in rows:
+                latest = updated if latest is None else max(latest, updated)
+                if versions.get(path, self.template_versions.get(path)) == updated:
+                    continue
+                # Sin nombre el usuario ya no existe: la plantilla es una baja
+                if deleted or name is None:
+                    if versions.get(path, self.template_versions.get(path)) is not None:
+                        versions[path] = None
+                        removals.append(path)
+                else:
+                    versions[path] = updated
+                    upserts.append((name, path, np.frombuffer(blob, dtype=np.float32, count=dimension)))
+        
+        for path, updated in versions.items():
+            if updated is None:
+                self.template_versions.pop(path, None)
+            else:
+                self.template_versions[path] = updated
+        self.last_template_sync = latest
+        if upserts or removals:
+            self.gallery_service.apply(upserts, removals)
+            print(f"🔄 Plantillas sincronizadas: {len(upserts)} altas/cambios, {len(removals)} bajas")
+        return len(upserts) + len(removals)
+    
+    def _persist_templates(self, upserts, removals):
+        """Refleja altas y bajas de plantillas en la base de datos (si hay conexión)"""
+        if not self.db:
+            return
+        removals = [path for path in removals if path]
+        if upserts and not self.db.save_templates(upserts, self.feature_type):
+            print("⚠️  Plantillas guardadas solo localmente")
+        if removals:
+            self.db.delete_templates(removals)
+    
+    def load_user_thresholds(self, verbose=True):
+        """Carga los umbrales por usuario calculados por la calibración"""
+        self.user_thresholds = {row['nombre']: row['umbral'] for row in self.db.get_user_thresholds()
+                                if row['umbral'] is not None}
+        self.thresholds_loaded_at = time.time()
+        if verbose:
+            print(f"🎚️  {len(self.user_thresholds)} usuarios con umbral propio")
+    
+    def threshold_for(self, name):
+        """Umbral de similitud de un usuario (el global si no tiene uno propio).
+        
+        La calibración corre en otro proceso: los umbrales se vuelven a leer
+        cada ``adaptive_threshold_reload`` segundos.
+        """
+        interval = config.SYSTEM_CONFIG['adaptive_threshold_reload']
+        if (self.thresholds_loaded_at is not None and interval
+                and time.time() - self.thresholds_loaded_at >= interval):
+            self.load_user_thresholds(verbose=False)
+        return self.user_thresholds.get(name, config.SYSTEM_CONFIG['similarity_threshold'])
+    
+    def user_ids(self):
+        """Ids de usuario de la base de datos por nombre (vacío sin base de datos)"""
+        if not self.db:
+            return {}
+        return {user['nombre']: user['id'] for user in self.db.get_all_users()}
+    
+    def export_gallery(self, filename, since_version=None):
+        """Exporta la galería a un archivo de instantánea.
+        
+        Con ``since_version`` solo se exportan los cambios posteriores a esa
+        versión; si ya no hay historial para ella se exporta la galería completa.
+        """
+        from clases.instantanea_galeria import write_snapshot_file
+        
+        service = self.gallery_service
+        gallery, version = service.snapshot(), service.version
+        changes = None if since_version is None else service.changes_since(since_version)
+        if since_version is not None and changes is None:
+            print(f"⚠️  Sin historial desde la versión {since_version}: se exporta la galería completa")
+        
+        if changes is None:
+            size = write_snapshot_file(filename, gallery, version, service.epoch, self.user_ids())
+            print(f"💾 Galería exportada: {len(gallery)} usuarios, {gallery.template_count} plantillas, "
+                  f"versión {version} ({size / 1e6:.1f} MB)")
+        else:
+            changed, removed = changes
+            size = write_snapshot_file(filename, gallery, version, service.epoch, self.user_ids(),
+                                       changed=changed, removed=removed, base_version=since_version)
+            print(f"💾 Delta exportado: versión {since_version} -> {version}, "
+                  f"{len(changed)} plantillas modificadas, {len(removed)} eliminadas")
+        return version
+    
+    def load_gallery_snapshot(self, filename):
+        """Carga una instantánea completa o aplica un delta sin extraer características.
+        
+        La instantánea completa se mapea en memoria y se publica tal cual; la
+        réplica adopta su época y versión para poder aplicar después los deltas
+        del mismo origen.
+        """
+        from clases.instantanea_galeria import read_snapshot_file
+        
+        started = datetime.now()
+        snapshot = read_snapshot_file(
+            filename,
+            max_templates=config.SYSTEM_CONFIG['max_templates_per_user'],
+            replacement=config.SYSTEM_CONFIG['template_replacement']
+        )
+        if snapshot.gallery.feature_type != self.feature_type:
+            raise ValueError(f"La instantánea usa características '{snapshot.gallery.feature_type}' "
+                             f"y este equipo '{self.feature_type}'")
+        service = self.gallery_service
+        
+        if snapshot.is_delta:
+            if snapshot.epoch != service.epoch or snapshot.base_version > service.version:
+                raise ValueError(f"El delta parte de la versión {snapshot.base_version} de otro origen "
+                                 f"o posterior a la local ({service.version}); cargue una instantánea completa")
+            upserts = snapshot.upserts()
+            service.apply(upserts, snapshot.removed, version=max(snapshot.version, service.version))
+            for path in snapshot.removed:
+                self.file_signatures.pop(path, None)
+            paths = [path for _, path, _ in upserts]
+        else:
+            gallery = snapshot.gallery
+            if config.SYSTEM_CONFIG['ann_index']:
+                gallery.enable_ann(
+                    nlist=config.SYSTEM_CONFIG['ann_nlist'],
+                    nprobe=config.SYSTEM_CONFIG['ann_nprobe'],
+                    min_templates=config.SYSTEM_CONFIG['ann_min_templates']
+                )
+            service.replace(gallery, version=snapshot.version, epoch=snapshot.epoch)
+            self.file_signatures = {}
+            paths = gallery.paths()
+        
+        # Solo las imágenes presentes en este nodo: el vigilante ignora el resto
+        for path in paths:
+            if path and os.path.exists(path):
+                self.file_signatures[path] = self.file_signature(path)
+        
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"⚡ Instantánea '{filename}' cargada: {len(self.gallery)} usuarios, "
+              f"versión {service.version} ({elapsed:.2f}s)")
+        return snapshot
+    
+    def extract_advanced_features(self, image):
+        """Extrae características del rostro más grande (el mismo que usa ``analyze_face``)"""
+        if image is None:
+            return None
+        
+        try:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.equalizeHist(gray)
+            
+            box = largest_face(self.detector.detect(image, gray))
+            
+            if box is not None:
+                return self.features_from_roi(gray, box)
+            
+            return None
+            
+        except Exception as e:
+            print(f"❌ Error extrayendo características: {e}")
+            return None
+    
+    def extract_features_from_box(self, image, box):
+        """Extrae características de un rostro ya detectado (sin volver a detectar)"""
+        if image is None or box is None:
+            return None
+        
+        try:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.equalizeHist(gray)
+            return self.features_from_roi(gray, box)
+        except Exception as e:
+            print(f"❌ Error extrayendo características: {e}")
+            return None
+    
+    def analyze_face(self, image, box=None):
+        """Filtro de calidad y extracción: devuelve (características o None, código de motivo).
+        
+        Sin ``box`` se detecta y se usa el rostro más grande. Los rostros que no
+        pasan el filtro se descartan antes de calcular el descriptor, con el
+        motivo ('rostro_pequeno', 'desenfocado', ...; ver ``calidad_rostro``).
+        """
+        equalized, box, reason = self.prepare_face(image, box)
+        if reason != QUALITY_OK:
+            return None, reason
+        try:
+            features = self.features_from_roi(equalized, box)
+        except Exception as e:
+            print(f"❌ Error extrayendo características: {e}")
+            features = None
+        return features, QUALITY_OK if features is not None else 'sin_rostro'
+    
+    def prepare_face(self, image, box=None):
+        """Detección (si falta ``box``) y filtro de calidad: (gris ecualizado, recuadro, motivo)"""
+        if image is None:
+            return None, None, 'sin_rostro'
+        
+        try:
+            with span('preprocesado'):
+                gray = frame_gray(image)
+                equalized = cv2.equalizeHist(gray)
+            if box is None:
+                with span('deteccion'):
+                    box = largest_face(self.detector.detect(image, equalized))
+                if box is None:
+                    return equalized, None, 'sin_rostro'
+            
+            if self.quality_gate:
+                with span('calidad'):
+                    reason, _ = self.quality_gate.assess(gray, box)
+                if reason != QUALITY_OK:
+                    return equalized, box, reason
+            return equalized, box, QUALITY_OK
+        except Exception as e:
+            print(f"❌ Error preparando el rostro: {e}")
+            return None, None, 'sin_rostro'
+    
+    @stage('descriptor')
+    def features_from_roi(self, gray, box):
+        """Descriptor configurado del recorte del rostro en escala de grises ecualizada"""
+        x, y, w, h = box
+        face_roi = gray[y:y+h, x:x+w]
+        if face_roi.size == 0:
+            return None
+        return self.descriptor(face_roi)
+    
+    def new_template_path(self, name):
+        """Ruta para una nueva plantilla del usuario dentro de su carpeta"""
+        user_dir = os.path.join(self.known_faces_dir, name)
+        if not os.path.exists(user_dir):
+            os.makedirs(user_dir)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(user_dir, f"{timestamp}.jpg")
+    
+    def enroll_face(self, name, path, features):
+        """Agrega una plantilla del usuario a la galería.
+        
+        Si el usuario ya tiene el máximo de plantillas, la política de reemplazo
+        decide cuál sale y su imagen se borra del disco para que el directorio
+        y la galería sigan coincidiendo.
+        """
+        added, evicted_path = self.gallery_service.enroll(name, features, path)
+        if added:
+            self.file_signatures[path] = self.file_signature(path)
+            self._persist_templates([(name, path, features)], [evicted_path])
+        if evicted_path:
+            self.file_signatures.pop(evicted_path, None)
+            if os.path.exists(evicted_path):
+                os.remove(evicted_path)
+        return added
+    
+    def enroll_capture(self, name, frame, box):
+        """Alta de una plantilla en un solo paso a partir de la captura y su detección.
+        
+        Las características se calculan una vez sobre el recuadro ya detectado en
+        la vista previa. Si no hay rostro utilizable la alta se rechaza antes de
+        escribir nada; si la galería no la acepta, la imagen escrita se borra.
+        Si el rostro se parece a otro usuario, ``duplicate_policy`` decide si
+        solo se avisa ('warn') o se rechaza la alta ('block'); quien se registra
+        recibe un mensaje genérico y el usuario parecido y la similitud solo se
+        anotan en el informe de duplicados del administrador. En un nodo de
+        puerta la galería es una réplica y las altas se hacen en el central.
+        Devuelve (éxito, mensaje).
+        """
+        if self.gallery_service.read_only:
+            return False, "Este equipo es un nodo de puerta: registre el rostro en el servidor central"
+        if frame is None:
+            return False, "No se pudo capturar el rostro"
+        
+        features, reason = self.analyze_face(frame, box)
+        if features is None:
+            return False, f"Captura rechazada: {QUALITY_REASONS[reason]}"
+        
+        warning = ""
+        policy = config.SYSTEM_CONFIG['duplicate_policy']
+        if policy != 'off':
+            similar = similar_identities(self.gallery, features, name)
+            if similar:
+                other, similarity = similar[0]
+                try:
+                    record_enrollment_alert(name, other, similarity, blocked=policy == 'block')
+                except OSError as e:
+                    print(f"❌ Error anotando la alerta de duplicado: {e}")
+                if policy == 'block':
+                    return False, "No se pudo registrar el rostro: contacte con el administrador"
+                warning = " (quedará pendiente de revisión por el administrador)"
+        
+        filepath = self.new_template_path(name)
+        if not cv2.imwrite(filepath, frame):
+            return False, "Error guardando la imagen del rostro"
+        
+        if not self.enroll_face(name, filepath, features):
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return False, "La captura es redundante con las plantillas existentes"
+        
+        return True, f"Rostro registrado exitosamente para {name}{warning}"
+    
+    def remove_user(self, name):
+        """Da de baja a un usuario en la galería y en la base de datos.
+        
+        Sus plantillas quedan marcadas como eliminadas para que los demás
+        equipos las retiren en su siguiente sincronización. Las imágenes no se
+        borran y conservan su firma, así que el vigilante no las vuelve a cargar.
+        Devuelve las rutas de las plantillas retiradas.
+        """
+        paths = self.gallery_service.remove(name)
+        if self.db and not self.db.delete_user(name):
+            print(f"⚠️  {name} retirado solo de la galería local")
+        return paths
+    
+    def apply_gallery_changes(self, upserts, removals):
+        """Aplica en bloque altas/cambios y bajas de plantillas de forma atómica.
+        
+        Los cambios se hacen sobre una copia y la galería se sustituye con una
+        sola asignación: las identificaciones en curso terminan con la anterior.
+        ``upserts`` es una lista de (nombre, ruta, características). Como en
+        ``load_known_faces``, nunca se borra ningún archivo: las imágenes que la
+        política de reemplazo rechaza o descarta quedan en disco fuera de la
+        galería y conservan su firma, así que el vigilante no las vuelve a
+        procesar. Devuelve (nombre, ruta, agregada, ruta_descartada).
+        """
+        results = self.gallery_service.apply(upserts, removals)
+        for path in removals:
+            self.file_signatures.pop(path, None)
+        for _, path, _ in upserts:
+            self.file_signatures[path] = self.file_signature(path)
+        
+        stored = [(name, path, features) for (name, path, features), (_, _, added, _)
+                  in zip(upserts, results) if added]
+        dropped = list(removals) + [evicted for _, _, _, evicted in results if evicted]
+        self._persist_templates(stored, dropped)
+        return results
+    
+    def compare_faces(self, features1, features2):
+        """Compara características faciales y devuelve float nativo"""
+        if features1 is None or features2 is None:
+            return 0.0
+        
+        min_len = min(len(features1), len(features2))
+        feat1 = features1[:min_len]
+        feat2 = features2[:min_len]
+        
+        dot_product = np.dot(feat1, feat2)
+        norm1 = np.linalg.norm(feat1)
+        norm2 = np.linalg.norm(feat2)
+        
+        if norm1 == 0 or norm2 == 0:
+            return 0.0
+        
+        similarity = dot_product / (norm1 * norm2)
+        
+        # Convertir a float nativo de Python
+        if hasattr(similarity, 'item'):
+            return max(0.0, similarity.item())
+        else:
+            return max(0.0, float(similarity))
+    
+    def capture_face(self):
+        """Captura rostro desde cámara"""
+        frame, _ = self.capture_face_with_box()
+        return frame
+    
+    def capture_face_with_box(self):
+        """Captura desde cámara y devuelve (frame, recuadro del rostro más grande o None).
+        
+        La vista previa depende de cuándo pulse el usuario, así que no se perfila;
+        solo la apertura de la cámara se mide como un intento propio.
+        """
+        if config.SYSTEM_CONFIG['capture_mode'] == 'continuous':
+            return self.capture_best_face()
+        
+        with attempt('camara_apertura'):
+            cap = cv2.VideoCapture(0)
+        
+        if not cap.isOpened():
+            print("❌ No se puede acceder a la cámara")
+            return None, None
+        
+        print("\n📷 Mire a la cámara...")
+        print("🟢 Presione ESPACIO para capturar")
+        print("🔴 Presione Q para cancelar")
+        
+        captured_frame = None
+        captured_box = None
+        
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            faces = self.detector.detect(frame)
+            
+            display_frame = frame.copy()
+            
+            for (x, y, w, h) in faces:
+                cv2.rectangle(display_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            
+            cv2.putText(display_frame, "ESPACIO: Capturar - Q: Cancelar", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+            
+            cv2.imshow('Reconocimiento Facial', display_frame)
+            
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord(' '):
+                captured_frame = frame.copy()
+                if len(faces) > 0:
+                    # Se reutiliza la detección de la vista previa para el frame capturado
+                    captured_box = tuple(max(faces, key=lambda f: f[2] * f[3]))
+                print("✅ Foto capturada")
+                break
+            elif key == ord('q'):
+                print("❌ Captura cancelada")
+                break
+        
+        cap.release()
+        cv2.destroyAllWindows()
+        return captured_frame, captured_box
+    
+    def capture_best_face(self, window=None):
+        """Captura continua: devuelve (frame, recuadro) del mejor rostro de una ventana corta.
+        
+        La ventana de ``quality_window`` segundos empieza con el primer rostro que
+        pasa el filtro de calidad; durante ella se conserva el frame con mayor
+        puntuación, así que un parpadeo o un movimiento no deciden la captura.
+        """
+        window = config.SYSTEM_CONFIG['quality_window'] if window is None else window
+        gate = self.quality_gate or QualityGate()
+        with attempt('camara_apertura'):
+            cap = cv2.VideoCapture(0)
+        
+        if not cap.isOpened():
+            print("❌ No se puede acceder a la cámara")
+            return None, None
+        
+        print("\n📷 Mire a la cámara (captura automática)...")
+        print("🔴 Presione Q para cancelar")
+        
+        best_frame, best_box, best_score = None, None, 0.0
+        deadline = None
+        reason = 'sin_rostro'
+        
+        while deadline is None or time.time() < deadline:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            gray = frame_gray(frame)
+            box = largest_face(self.detector.detect(frame, cv2.equalizeHist(gray)))
+            if box is not None:
+                reason, score = gate.assess(gray, box)
+                if reason == QUALITY_OK and score > best_score:
+                    best_frame, best_box, best_score = frame.copy(), box, score
+                    if deadline is None:
+                        deadline = time.time() + window
+            else:
+                reason = 'sin_rostro'
+            
+            display_frame = frame.copy()
+            if box is not None:
+                x, y, w, h = box
+                color = (0, 255, 0) if reason == QUALITY_OK else (0, 0, 255)
+                cv2.rectangle(display_frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(display_frame, reason, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+            cv2.imshow('Reconocimiento Facial', display_frame)
+            
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("❌ Captura cancelada")
+                best_frame, best_box = None, None
+                break
+        
+        cap.release()
+        cv2.destroyAllWindows()
+        if best_frame is not None:
+            print(f"✅ Foto capturada (calidad {best_score:.0f})")
+        return best_frame, best_box
+    
+    def recognize_face(self, frame, box=None):
+        """Reconoce un rostro en el frame capturado"""
+        candidates = self.identify_face(frame, k=1, box=box)
+        
+        if candidates is None:
+            return "Desconocido", 0.0
+        
+        best_match, best_similarity = candidates[0] if candidates else ("Desconocido", 0.0)
+        
+        print(f"🔍 Similitud: {best_similarity:.3f}")
+        return best_match, best_similarity
+    
+    def identify_face(self, frame, k=None, min_similarity=None, box=None, camera_id=None):
+        """Devuelve los k mejores candidatos (nombre, similitud); None si no hay rostro válido.
+        
+        Con la caché de resultados activa, un rostro casi idéntico a uno reciente
+        de la misma cámara reutiliza el resultado anterior sin la búsqueda 1:N.
+        El hash solo indica que las imágenes se parecen, así que cada acierto se
+        confirma con una verificación 1:1 contra el usuario guardado; si no
+        supera su umbral se hace la búsqueda completa.
+        """
+        equalized, box, reason = self.prepare_face(frame, box)
+        if reason != QUALITY_OK:
+            print(f"❌ {QUALITY_REASONS[reason]}")
+            return None
+        
+        k = k or config.SYSTEM_CONFIG['top_k']
+        if self.result_cache:
+            with span('cache'):
+                space = (camera_id, k, min_similarity)
+                key = face_hash(equalized, box)
+                # La versión se toma antes de comparar: si cambia mientras, el resultado no se guarda
+                version = self.gallery_service.version
+                cached = self.result_cache.get(space, key, version)
+            if cached is not None and not cached:
+                # Un rostro que no coincidía con nadie no da acceso a nadie: no hace falta confirmarlo
+                return []
+        
+        current_features = self.features_from_roi(equalized, box)
+        if current_features is None:
+            print(f"❌ {QUALITY_REASONS['sin_rostro']}")
+            return None
+        
+        if self.result_cache and cached:
+            name = cached[0][0]
+            with span('cache_verificacion'):
+                similarity = self.gallery.verify(current_features, name)
+            if similarity > self.threshold_for(name):
+                return [(name, similarity)] + list(cached[1:])
+        
+        with span('galeria'):
+            if self.shards:
+                candidates = self.shards.identify(current_features, k=k, min_similarity=min_similarity)
+            else:
+                candidates = self.gallery.identify(current_features, k=k, min_similarity=min_similarity)
+        if self.result_cache:
+            self.result_cache.put(space, key, version, tuple(candidates))
+        return candidates
+    
+    def verify_face(self, frame, name, box=None):
+        """Verificación 1:1 del frame contra las plantillas del usuario indicado"""
+        current_features, reason = self.analyze_face(frame, box)
+        
+        if current_features is None:
+            print(f"❌ {QUALITY_REASONS[reason]}")
+            return 0.0
+        
+        with span('galeria'):
+            similarity = self.gallery.verify(current_features, name)
+        print(f"🔍 Similitud con {name}: {similarity:.3f}")
+        return similarity
@@ -0,0 +1,171 @@
+import threading
+import time
+
+
+class GalleryService:
+    """Dueño único de la galería con semántica lectores-escritor.
+
+    Los lectores obtienen la instantánea vigente con ``snapshot()`` y comparan
+    contra ella sin bloqueos: nadie la modifica nunca. Los escritores (altas,
+    bajas, cargas masivas) trabajan sobre una copia bajo un candado y la
+    publican con una sola asignación de referencia (copy-on-write).
+
+    Cada publicación incrementa ``version`` y anota qué rutas cambiaron, de modo
+    que ``changes_since`` puede devolver solo los cambios posteriores a una
+    versión dada. ``epoch`` identifica la historia de versiones: cambia con cada
+    carga completa que no proviene de una instantánea.
+
+    Una réplica (``read_only``) solo acepta instantáneas y cambios con la
+    versión de su origen: una alta local la haría divergir de la historia de
+    versiones del servidor central.
+    """
+
+    def __init__(self, gallery_factory):
+        self._factory = gallery_factory
+        self._snapshot = gallery_factory()
+        # Reentrante: los suscriptores pueden consultar changes_since durante la publicación
+        self._lock = threading.RLock()
+        self._listeners = []
+        self.version = 0
+        self.epoch = time.time_ns()
+        self._changes = {}          # ruta -> (versión, eliminada)
+        self._history_start = 0     # versión desde la que hay historial de cambios
+        self.read_only = False      # réplica de otro nodo: sin altas ni bajas locales
+
+    def snapshot(self):
+        """Galería inmutable vigente (para lectores)"""
+        return self._snapshot
+
+    def subscribe(self, callback):
+        """Registra callback(galería, versión) que se llama tras cada publicación"""
+        self._listeners.append(callback)
+
+    def _publish(self, gallery, changes=(), version=None):
+        # El índice aproximado se prepara aquí para que los lectores nunca lo modifiquen
+        gallery.prepare()
+        version = self.version + 1 if version is None else version
+        # ``changes``: (ruta, eliminada) en orden de aplicación; el último gana
+        for path, deleted in changes:
+            if path is not None:
+                self._changes[path] = (version, deleted)
+        # La galería se publica antes que su versión: un lector que ve la versión
+        # nueva ve también la galería nueva, y un resultado calculado con la
+        # galería nueva bajo la versión anterior solo se descarta de la caché
+        self._snapshot = gallery
+        self.version = version
+        for callback in self._listeners:
+            callback(gallery, self.version)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("La galería es una réplica de solo lectura: "
+                               "las altas y bajas se hacen en el servidor central")
+
+    def _reset_history(self, epoch=None, version=None):
+        """Una sustitución completa de la galería no tiene cambios anteriores que consultar.
+
+        Se llama antes de publicarla: ``version`` es la que se va a publicar.
+        """
+        self._changes = {}
+        self._history_start = self.version + 1 if version is None else version
+        self.epoch = time.time_ns() if epoch is None else epoch
+
+    def changes_since(self, version):
+        """Devuelve (rutas modificadas, rutas eliminadas) después de ``version``.
+
+        Devuelve None si no hay historial suficiente (versión anterior a la última
+        carga completa): el llamador debe usar una instantánea completa.
+        """
+        with self._lock:
+            if version < self._history_start or version > self.version:
+                return None
+            changed, removed = [], []
+            for path, (changed_at, deleted) in self._changes.items():
+                if changed_at > version:
+                    (removed if deleted else changed).append(path)
+            return changed, removed
+
+    # --- Lectura -----------------------------------------------------------
+
+    def identify(self, features, k=1, min_similarity=None):
+        return self._snapshot.identify(features, k=k, min_similarity=min_similarity)
+
+    def verify(self, features, name):
+        return self._snapshot.verify(features, name)
+
+    # --- Escritura ---------------------------------------------------------
+
+    def enroll(self, name, features, path=None):
+        """Agrega (o sustituye, si la ruta ya existe) una plantilla; devuelve (agregada, ruta_descartada)"""
+        self._check_writable()
+        with self._lock:
+            gallery = self._snapshot.copy()
+            if path is not None:
+                gallery.remove_template(path)
+            added, evicted_path = gallery.add(name, features, path)
+            if added:
+                self._publish(gallery, [(evicted_path, True), (path, False)])
+            return added, evicted_path
+
+    def remove(self, name):
+        """Elimina un usuario; devuelve las rutas de sus plantillas"""
+        self._check_writable()
+        with self._lock:
+            if name not in self._snapshot:
+                return []
+            gallery = self._snapshot.copy()
+            paths = gallery.remove(name)
+            self._publish(gallery, [(path, True) for path in paths])
+            return paths
+
+    def apply(self, upserts, removals, version=None):
+        """Aplica en un solo paso una lista de (nombre, ruta, características) y de rutas a borrar.
+
+        Devuelve (nombre, ruta, agregada, ruta_descartada) por cada alta.
+        ``version`` fija el número de versión publicado (réplicas que aplican
+        los cambios de otro nodo) y es obligatoria en una réplica.
+        """
+        if version is None:
+            self._check_writable()
+        if not upserts and not removals and (version is None or version == self.version):
+            # Sin cambios no se copia ni se publica nada
+            return []
+        with self._lock:
+            gallery = self._snapshot.copy()
+            for path in removals:
+                gallery.remove_template(path)
+            changes = [(path, True) for path in removals]
+            results = []
+            for name, path, features in upserts:
+                if path is not None:
+                    gallery.remove_template(path)
+                added, evicted_path = gallery.add(name, features, path)
+                results.append((name, path, added, evicted_path))
+                changes.append((path, not added))
+                if added and evicted_path:
+                    changes.append((evicted_path, True))
+            self._publish(gallery, changes, version=version)
+            return results
+
+    def bulk_load(self, items):
+        """Sustituye la galería completa a partir de (nombre, ruta, características).
+
+        Devuelve la lista de (nombre, ruta, agregada) para que el llamador informe.
+        """
+        self._check_writable()
+        gallery = self._factory()
+        results = [(name, path, gallery.add(name, features, path)[0]) for name, path, features in items]
+        with self._lock:
+            self._reset_history()
+            self._publish(gallery)
+        return results
+
+    def replace(self, gallery, version=None, epoch=None):
+        """Publica una galería ya construida (p. ej. cargada de una instantánea).
+
+        Con ``version`` y ``epoch`` la réplica adopta la historia de versiones del
+        nodo que exportó la instantánea y puede aplicar después sus deltas.
+        """
+        with self._lock:
+            self._reset_history(epoch, version)
+            self._publish(gallery, version=version)
@@ -0,0 +1,330 @@
+import concurrent.futures
+import http.server
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import cpu_count
+from urllib.parse import urlparse, parse_qs
+import cv2
+import numpy as np
+import config
+from clases.cache_resultados import face_hash
+from clases.calidad_rostro import QUALITY_OK
+from clases.reconocimiento_fac import FacialRecognition
+
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'application/octet-stream')
+
+# Estado de cada proceso de extracción (se inicializa una sola vez por proceso)
+_worker = {}
+
+
+def _init_worker():
+    """Prepara el extractor en el proceso de trabajo"""
+    cv2.setNumThreads(1)
+    _worker['recognizer'] = FacialRecognition(None, load_faces=False)
+
+
+def _extract(payload):
+    """Decodifica la imagen y extrae sus características: (estado, características, hash del rostro)"""
+    image = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return 'imagen_invalida', None, None
+    # Los rostros que no pasan el filtro de calidad se rechazan con su motivo
+    recognizer = _worker['recognizer']
+    equalized, box, reason = recognizer.prepare_face(image)
+    if reason != QUALITY_OK:
+        return reason, None, None
+    features = recognizer.features_from_roi(equalized, box)
+    if features is None:
+        return 'sin_rostro', None, None
+    return QUALITY_OK, features, face_hash(equalized, box)
+
+
+def _percentile(samples, q):
+    return round(float(np.percentile(samples, q)), 3) if samples else 0.0
+
+
+class RecognitionBatcher:
+    """Agrupa peticiones de reconocimiento en micro-lotes.
+
+    Cada petición espera como mucho ``max_wait_ms`` a que lleguen otras; el lote
+    (hasta ``batch_size`` imágenes) se reparte entre los procesos de extracción y
+    se compara contra la galería en una sola multiplicación de matrices. Si la
+    caché de resultados está activa, los rostros casi idénticos a uno reciente
+    de la misma cámara reutilizan su resultado tras confirmar 1:1 el mejor
+    candidato; las peticiones sin cámara no usan la caché.
+    """
+
+    def __init__(self, facial_recognition, batch_size=None, max_wait_ms=None, workers=None, top_k=None):
+        self.face_recognition = facial_recognition
+        self.batch_size = max(1, batch_size or config.SYSTEM_CONFIG['recognition_batch_size'])
+        wait_ms = config.SYSTEM_CONFIG['recognition_max_wait_ms'] if max_wait_ms is None else max_wait_ms
+        self.max_wait = wait_ms / 1000.0
+        self.workers = workers or config.SYSTEM_CONFIG['recognition_workers'] or cpu_count()
+        self.top_k = top_k or config.SYSTEM_CONFIG['top_k']
+        self._queue = queue.Queue()
+        self._pool = None
+        self._thread = None
+
+        # Métricas de los últimos lotes y peticiones
+        self._metrics_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self._batch_sizes = deque(maxlen=1000)
+        self._queue_ms = deque(maxlen=10000)
+        self._extract_ms = deque(maxlen=1000)
+        self._match_ms = deque(maxlen=1000)
+
+    def start(self):
+        """Arranca los procesos de extracción y el hilo que forma los lotes"""
+        # 'spawn': el servidor ya tiene hilos (HTTP, lotes, vigilante) y un fork
+        # podría heredar un candado tomado por alguno de ellos
+        context = multiprocessing.get_context('spawn')
+        self._pool = context.Pool(self.workers, initializer=_init_worker)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload, camera_id=None):
+        """Encola una imagen codificada (JPEG/PNG); devuelve un ``Future`` con el resultado"""
+        future = concurrent.futures.Future()
+        self._queue.put((payload, future, time.perf_counter(), camera_id))
+        return future
+
+    def recognize(self, payload, timeout=None, camera_id=None):
+        """Reconoce una imagen esperando a que se procese su lote"""
+        return self.submit(payload, camera_id).result(timeout)
+
+    def _collect(self):
+        """Espera la primera petición y reúne las que lleguen dentro de la ventana"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        # La ventana cuenta desde que llegó la primera: si el lote anterior tardó,
+        # solo se recoge lo que ya está en cola sin esperar más
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"❌ Error procesando lote de reconocimiento: {e}")
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        waits = [(started - enqueued) * 1000 for _, _, enqueued, _ in batch]
+
+        extracted = self._pool.map(_extract, [payload for payload, _, _, _ in batch])
+        extracted_at = time.perf_counter()
+
+        valid = [i for i, (status, _, _) in enumerate(extracted) if status == QUALITY_OK]
+        candidates = {}
+        cache = self.face_recognition.result_cache
+        if cache:
+            version = self.face_recognition.gallery_service.version
+            gallery = self.face_recognition.gallery
+            for i in valid:
+                # Sin cámara (cabecera X-Camara) no se usa la caché: mezclaría peticiones de origen distinto
+                if batch[i][3] is None:
+                    continue
+                cached = cache.get((batch[i][3], self.top_k, None), extracted[i][2], version)
+                if cached is None:
+                    continue
+                if not cached:
+                    # Un rostro que no coincidía con nadie no da acceso a nadie
+                    candidates[i] = cached
+                    continue
+                # Como en identify_face, el mejor candidato se confirma 1:1 antes de fiarse del hash
+                name = cached[0][0]
+                similarity = gallery.verify(extracted[i][1], name)
+                if similarity > self.face_recognition.threshold_for(name):
+                    candidates[i] = [(name, similarity)] + list(cached[1:])
+        pending = [i for i in valid if i not in candidates]
+        matcher = self.face_recognition.shards or self.face_recognition.gallery
+        matches = matcher.identify_batch([extracted[i][1] for i in pending], k=self.top_k) if pending else []
+        for i, match in zip(pending, matches):
+            candidates[i] = match
+            if cache and batch[i][3] is not None:
+                cache.put((batch[i][3], self.top_k, None), extracted[i][2], version, tuple(match))
+        finished = time.perf_counter()
+
+        for i, (_, future, _, _) in enumerate(batch):
+            top = [{'nombre': name, 'similitud': round(float(similarity), 4)}
+                   for name, similarity in candidates.get(i, [])]
+            similarity = top[0]['similitud'] if top else 0.0
+            recognized = bool(top) and similarity > self.face_recognition.threshold_for(top[0]['nombre'])
+            future.set_result({
+                'estado': extracted[i][0],
+                'mejor_coincidencia': top[0]['nombre'] if recognized else "Desconocido",
+                'similitud': similarity,
+                'reconocido': recognized,
+                'top_k': top,
+                'desde_cache': i in candidates and i not in pending,
+                'tamano_lote': len(batch),
+                'espera_ms': round(waits[i], 3)
+            })
+
+        with self._metrics_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self._batch_sizes.append(len(batch))
+            self._queue_ms.extend(waits)
+            self._extract_ms.append((extracted_at - started) * 1000)
+            self._match_ms.append((finished - extracted_at) * 1000)
+
+    def metrics(self):
+        """Llenado de los lotes, tiempo en cola y duración de cada etapa (ms)"""
+        cache = self.face_recognition.result_cache
+        with self._metrics_lock:
+            sizes = list(self._batch_sizes)
+            mean_size = float(np.mean(sizes)) if sizes else 0.0
+            return {
+                'cache': cache.metrics() if cache else None,
+                'peticiones': self.requests,
+                'lotes': self.batches,
+                'en_cola': self._queue.qsize(),
+                'tamano_maximo_lote': self.batch_size,
+                'espera_maxima_ms': self.max_wait * 1000,
+                'tamano_medio_lote': round(mean_size, 3),
+                'llenado_medio_lote': round(mean_size / self.batch_size, 3),
+                'espera_cola_p50_ms': _percentile(self._queue_ms, 50),
+                'espera_cola_p99_ms': _percentile(self._queue_ms, 99),
+                'extraccion_p50_ms': _percentile(self._extract_ms, 50),
+                'comparacion_p50_ms': _percentile(self._match_ms, 50)
+            }
+
+    def reset_metrics(self):
+        """Reinicia las métricas (p. ej. entre dos niveles de carga)"""
+        if self.face_recognition.result_cache:
+            self.face_recognition.result_cache.reset_metrics()
+        with self._metrics_lock:
+            self.requests = self.batches = 0
+            for samples in (self._batch_sizes, self._queue_ms, self._extract_ms, self._match_ms):
+                samples.clear()
+
+    def stop(self):
+        """Termina los lotes pendientes y detiene los procesos de extracción"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._pool:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class RecognitionServer:
+    """Servicio HTTP de reconocimiento por micro-lotes.
+
+    ``POST /reconocer`` recibe la imagen (JPEG o PNG) en el cuerpo y devuelve la
+    mejor coincidencia, su similitud y el top-k; ``GET /reconocer/metricas``
+    devuelve las métricas del agrupador y de la caché de resultados
+    (``?reiniciar=1`` las pone a cero).
+    """
+
+    def __init__(self, facial_recognition, port=None, **batcher_params):
+        self.face_recognition = facial_recognition
+        self.port = config.SYSTEM_CONFIG['recognition_service_port'] if port is None else port
+        self.timeout = config.SYSTEM_CONFIG['recognition_timeout']
+        self.max_body = config.SYSTEM_CONFIG['recognition_max_body_bytes']
+        self.batcher = RecognitionBatcher(facial_recognition, **batcher_params)
+        self.server = None
+
+    def start(self):
+        """Inicia el agrupador y el servidor en un hilo en segundo plano"""
+        service = self
+        self.batcher.start()
+
+        class RecognitionHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                """Silencia los logs del servidor para evitar spam"""
+                return
+
+            def send_json(self, status, payload):
+                content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                try:
+                    parsed = urlparse(self.path)
+                    if parsed.path == '/reconocer/metricas':
+                        self.send_json(200, service.batcher.metrics())
+                        if parse_qs(parsed.query).get('reiniciar') == ['1']:
+                            service.batcher.reset_metrics()
+                    else:
+                        self.send_error(404, "Endpoint no encontrado")
+                except Exception as e:
+                    print(f"❌ Error en GET {self.path}: {e}")
+                    self.send_error(500, f"Error interno: {str(e)}")
+
+            def do_POST(self):
+                try:
+                    if self.path != '/reconocer':
+                        self.send_error(404, "Endpoint no encontrado")
+                        return
+                    content_type = self.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+                    if content_type not in IMAGE_TYPES:
+                        self.send_json(415, {'error': "Se espera una imagen JPEG o PNG"})
+                        return
+                    length = int(self.headers.get('Content-Length', 0))
+                    if length <= 0:
+                        self.send_json(400, {'error': "Imagen vacía"})
+                        return
+                    if length > service.max_body:
+                        # El cuerpo no se lee: la conexión se cierra tras la respuesta
+                        self.close_connection = True
+                        self.send_json(413, {'error': f"La imagen supera el máximo de {service.max_body} bytes"})
+                        return
+                    # Las cámaras se identifican con la cabecera X-Camara para no mezclar sus resultados en caché
+                    result = service.batcher.recognize(self.rfile.read(length), timeout=service.timeout,
+                                                       camera_id=self.headers.get('X-Camara'))
+                    self.send_json(400 if result['estado'] == 'imagen_invalida' else 200, result)
+                except concurrent.futures.TimeoutError:
+                    self.send_json(504, {'error': "Tiempo de espera agotado"})
+                except Exception as e:
+                    print(f"❌ Error en POST {self.path}: {e}")
+                    self.send_error(500, f"Error interno: {str(e)}")
+
+        http.server.ThreadingHTTPServer.allow_reuse_address = True
+        http.server.ThreadingHTTPServer.daemon_threads = True
+        self.server = http.server.ThreadingHTTPServer(("", self.port), RecognitionHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"🎯 Servicio de reconocimiento en http://localhost:{self.port}/reconocer "
+              f"(lotes de {self.batcher.batch_size}, espera {self.batcher.max_wait * 1000:.0f} ms, "
+              f"{self.batcher.workers} procesos)")
+        return True
+
+    def shutdown(self):
+        """Detiene el servidor y los procesos de extracción"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.batcher.stop()
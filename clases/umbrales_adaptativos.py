@@ -0,0 +1,149 @@
+import math
+import time
+import numpy as np
+import config
+
+# Usuarios cuyas plantillas se comparan a la vez con toda la galería y filas por bloque
+USER_GROUP = 256
+ROW_BLOCK = 16384
+
+
+def impostor_thresholds(gallery, names, target_far):
+    """Umbral por usuario que deja pasar a una fracción ``target_far`` de impostores.
+
+    Cada plantilla del resto de la galería actúa como intento de impostor: su
+    puntuación contra el usuario es la máxima sobre las plantillas de este
+    (como ``verify`` con puntuación 'max'). Se conservan solo las K mayores por
+    usuario, así que la memoria no depende del tamaño de la galería.
+    """
+    row_names, matrix = gallery.matrix()
+    identity = {}
+    owners = np.array([identity.setdefault(name, len(identity)) for name in row_names], dtype=np.int64)
+    rows_of = {}
+    for row, name in enumerate(row_names):
+        rows_of.setdefault(name, []).append(row)
+
+    users = [name for name in names if name in rows_of]
+    impostors = len(matrix) - 1
+    k = max(1, math.ceil(target_far * impostors))
+    thresholds = {}
+    for start in range(0, len(users), USER_GROUP):
+        group = users[start:start + USER_GROUP]
+        columns = [rows_of[name] for name in group]
+        starts = np.cumsum([0] + [len(rows) for rows in columns[:-1]])
+        probes = matrix[np.concatenate(columns)]
+        group_ids = np.array([identity[name] for name in group], dtype=np.int64)
+
+        top = np.full((k, len(group)), -np.inf, dtype=np.float32)
+        for block in range(0, len(matrix), ROW_BLOCK):
+            scores = np.maximum.reduceat(matrix[block:block + ROW_BLOCK] @ probes.T, starts, axis=1)
+            scores[owners[block:block + ROW_BLOCK, None] == group_ids[None, :]] = -np.inf
+            merged = np.vstack([top, scores])
+            top = -np.partition(-merged, k - 1, axis=0)[:k]
+
+        for name, value in zip(group, top.min(axis=0)):
+            if np.isfinite(value):
+                thresholds[name] = float(value)
+    return thresholds
+
+
+class AdaptiveThresholdCalibrator:
+    """Calcula un umbral de similitud por usuario a partir de sus puntuaciones.
+
+    Las similitudes genuinas salen de los accesos permitidos y se resumen por
+    usuario con la media y la varianza acumuladas (algoritmo de Welford), de
+    modo que cada ejecución solo lee los accesos nuevos y solo recalcula los
+    usuarios con datos nuevos. El umbral es la media menos ``sigma``
+    desviaciones, nunca por debajo del umbral que fija el FAR objetivo frente
+    al resto de la galería, y limitado al rango configurado.
+
+    Sesgo conocido: los intentos genuinos que fueron denegados no cuentan (un
+    acceso denegado no dice quién era en realidad), así que la muestra está
+    truncada por el umbral vigente. La media sale algo alta y la desviación
+    algo baja, y el umbral tiende a subir entre calibraciones; el límite
+    superior de ``adaptive_threshold_range`` lo acota. Conviene revisar la tasa
+    de rechazos de los usuarios con umbral propio.
+    """
+
+    def __init__(self, facial_recognition, database_manager, target_far=None, sigma=None,
+                 min_samples=None, threshold_range=None):
+        self.face_recognition = facial_recognition
+        self.db = database_manager
+        self.target_far = config.SYSTEM_CONFIG['adaptive_threshold_far'] if target_far is None else target_far
+        self.sigma = config.SYSTEM_CONFIG['adaptive_threshold_sigma'] if sigma is None else sigma
+        self.min_samples = (config.SYSTEM_CONFIG['adaptive_threshold_min_samples']
+                            if min_samples is None else min_samples)
+        self.threshold_range = threshold_range or config.SYSTEM_CONFIG['adaptive_threshold_range']
+
+    @staticmethod
+    def _update(stats, scores):
+        """Incorpora un bloque de similitudes a (muestras, media, m2)"""
+        count, mean, m2 = stats['muestras'], stats['media'], stats['m2']
+        for score in scores:
+            count += 1
+            delta = score - mean
+            mean += delta / count
+            m2 += delta * (score - mean)
+        stats['muestras'], stats['media'], stats['m2'] = count, mean, m2
+
+    def threshold(self, stats, impostor_threshold):
+        """Umbral de un usuario; None si aún no tiene muestras suficientes"""
+        if stats['muestras'] < self.min_samples:
+            return None
+        # Con una sola muestra (``min_samples`` 0 o 1) la desviación es 0
+        std = math.sqrt(stats['m2'] / max(1, stats['muestras'] - 1))
+        value = stats['media'] - self.sigma * std
+        if impostor_threshold is not None:
+            value = max(value, impostor_threshold)
+        low, high = self.threshold_range
+        return float(min(max(value, low), high))
+
+    def run(self):
+        """Recalcula los umbrales de los usuarios con accesos nuevos; devuelve cuántos cambiaron"""
+        started = time.time()
+        saved = {row['usuario_id']: row for row in self.db.get_user_thresholds()}
+        # El avance se guarda aparte: no depende de que sigan existiendo los usuarios
+        since = self.db.get_calibration_cursor()
+        if since is None:
+            return 0
+
+        # Similitudes nuevas agrupadas por usuario en una sola consulta en streaming
+        new_scores = {}
+        last_id = since
+        for rows in self.db.iter_genuine_scores(since):
+            for access_id, user_id, similarity in rows:
+                new_scores.setdefault(user_id, []).append(float(similarity))
+                last_id = access_id
+        if not new_scores:
+            print("✅ Sin accesos nuevos desde la última calibración")
+            return 0
+
+        # Usuarios borrados o desconocidos: sus accesos se saltan pero el avance se guarda igual
+        names = {user['id']: user['nombre'] for user in self.db.get_all_users()}
+        touched = [user_id for user_id in new_scores if user_id in names]
+        impostor = impostor_thresholds(self.face_recognition.gallery,
+                                       [names[user_id] for user_id in touched], self.target_far)
+
+        rows = []
+        for user_id in touched:
+            stats = dict(saved.get(user_id) or {'muestras': 0, 'media': 0.0, 'm2': 0.0})
+            self._update(stats, new_scores[user_id])
+            impostor_threshold = impostor.get(names[user_id])
+            rows.append({
+                'usuario_id': user_id,
+                'umbral': self.threshold(stats, impostor_threshold),
+                'muestras': stats['muestras'],
+                'media': stats['media'],
+                'm2': stats['m2'],
+                'umbral_impostor': impostor_threshold,
+                'ultimo_acceso_id': last_id
+            })
+
+        if not self.db.save_user_thresholds(rows, last_access_id=last_id):
+            return 0
+        # Este proceso usa ya los umbrales nuevos; el sistema en marcha los relee periódicamente
+        self.face_recognition.load_user_thresholds(verbose=False)
+        calibrated = sum(1 for row in rows if row['umbral'] is not None)
+        print(f"🎚️  {len(rows)} usuarios con accesos nuevos, {calibrated} con umbral propio "
+              f"({time.time() - started:.2f}s)")
+        return len(rows)
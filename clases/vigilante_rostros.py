@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+import cv2
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class FacesDirectoryWatcher:
+    """Recarga en caliente de ``known_faces_dir``.
+
+    Detecta imágenes nuevas, modificadas y eliminadas comparando su firma
+    (mtime, tamaño) con la registrada al cargarlas, extrae características solo
+    de esas imágenes y aplica los cambios a la galería en un único paso. Usa
+    inotify si ``inotify_simple`` está instalado y, si no, sondeo periódico.
+    """
+
+    def __init__(self, facial_recognition, interval=2.0):
+        self.face_recognition = facial_recognition
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._watched_dirs = set()
+
+    def scan(self):
+        """Devuelve (nuevas, modificadas, eliminadas) como listas de (nombre, ruta)"""
+        # Copia: las altas desde la aplicación modifican el diccionario en otro hilo
+        known = dict(self.face_recognition.file_signatures)
+        current = {}
+        if os.path.exists(self.face_recognition.known_faces_dir):
+            current = dict((path, name) for name, path in self.face_recognition.list_face_images())
+
+        added, modified = [], []
+        for path, name in current.items():
+            if path not in known:
+                added.append((name, path))
+            elif self.face_recognition.file_signature(path) != known[path]:
+                modified.append((name, path))
+        deleted = [path for path in known if path not in current]
+        return added, modified, deleted
+
+    def sync(self):
+        """Aplica los cambios pendientes; devuelve el número de archivos afectados"""
+        started = time.time()
+        added, modified, deleted = self.scan()
+        if not (added or modified or deleted):
+            return 0
+
+        db = self.face_recognition.db
+        upserts = []
+        for name, path in added + modified:
+            if db and name not in self.face_recognition.gallery:
+                db.sync_user(name)
+            image = cv2.imread(path)
+            if image is None:
+                # Archivo a medio copiar: se reintenta en la siguiente pasada
+                continue
+            upserts.append((name, path, self.face_recognition.extract_advanced_features(image)))
+
+        self.face_recognition.apply_gallery_changes(upserts, deleted)
+        changed = len(upserts) + len(deleted)
+        print(f"🔄 Galería recargada: {len(added)} nuevas, {len(modified)} modificadas, "
+              f"{len(deleted)} eliminadas ({(time.time() - started) * 1000:.0f} ms)")
+        return changed
+
+    def _setup_inotify(self):
+        """Registra vigilancias inotify en el directorio y sus subcarpetas"""
+        if INotify is None:
+            return
+        if self._inotify is None:
+            self._inotify = INotify()
+        mask = flags.CREATE | flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM
+        base = self.face_recognition.known_faces_dir
+        # inotify retira sola la vigilancia de carpetas borradas
+        self._watched_dirs = {d for d in self._watched_dirs if os.path.isdir(d)}
+        directories = [base] + [os.path.join(base, entry) for entry in os.listdir(base)
+                                if os.path.isdir(os.path.join(base, entry))]
+        for directory in directories:
+            if directory not in self._watched_dirs:
+                self._inotify.add_watch(directory, mask)
+                self._watched_dirs.add(directory)
+
+    def _wait(self):
+        """Espera a un evento de inotify o al siguiente intervalo de sondeo"""
+        if self._inotify is not None:
+            events = self._inotify.read(timeout=int(self.interval * 1000))
+            if events:
+                # Agrupar ráfagas de eventos (p. ej. una copia de muchos archivos)
+                time.sleep(0.2)
+                self._inotify.read(timeout=0)
+        else:
+            self._stop.wait(self.interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._setup_inotify()
+                self._wait()
+                if not self._stop.is_set():
+                    self.sync()
+            except Exception as e:
+                print(f"❌ Error en recarga de rostros: {e}")
+                self._stop.wait(self.interval)
+
+    def start(self):
+        """Inicia la vigilancia en un hilo en segundo plano"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        mode = "inotify" if INotify is not None else f"sondeo cada {self.interval}s"
+        print(f"👀 Vigilando '{self.face_recognition.known_faces_dir}' ({mode})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
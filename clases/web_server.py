@@ -165,6 +165,8 @@ class WebServerManager:
                             self.export_data('accesos')
                         elif self.path.startswith('/historial-usuario'):
                             self.serve_user_history()
+                        elif self.path == '/duplicados':
+                            self.send_duplicates()
                         else:
                             self.send_error(404, "Página no encontrada")
                     except Exception as e:
@@ -797,6 +799,23 @@ class WebServerManager:
                         if conn and conn.is_connected():
                             conn.close()
                 
+                def send_duplicates(self):
+                    """Envía el último informe de usuarios duplicados ('herramientas.py buscar-duplicados')"""
+                    report_path = config.SYSTEM_CONFIG['duplicate_report_path']
+                    if not os.path.exists(report_path):
+                        self.send_error(404, "Aún no se ha generado el informe de duplicados")
+                        return
+                    
+                    with open(report_path, 'rb') as f:
+                        content = f.read()
+                    
+                    self.send_response(200)
+                    self.send_header('Content-type', 'application/json; charset=utf-8')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                
                 def export_personal_history(self):
                     """Exporta el historial personal a CSV"""
                     try:
@@ -943,9 +962,14 @@ class WebServerManager:
                         
                         if tipo == "accesos":
                             cursor.execute("TRUNCATE TABLE accesos")
+                            # Los ids de acceso vuelven a empezar: la calibración también
+                            cursor.execute("UPDATE calibracion_umbrales SET ultimo_acceso_id = 0")
                             mensaje = "Historial de accesos eliminado correctamente"
                         elif tipo == "todo":
                             cursor.execute("TRUNCATE TABLE accesos")
+                            cursor.execute("UPDATE calibracion_umbrales SET ultimo_acceso_id = 0")
+                            # Las plantillas quedan como bajas para que los demás equipos las retiren
+                            cursor.execute("UPDATE plantillas SET eliminada = TRUE, usuario_id = NULL")
                             cursor.execute("TRUNCATE TABLE usuarios")
                             mensaje = "Todos los datos eliminados correctamente"
                         else:
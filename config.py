@@ -22,6 +22,69 @@ EMAIL_CONFIG = {
 SYSTEM_CONFIG = {
     'known_faces_dir': "usuarios_autorizados",
     'similarity_threshold': 0.6,
+    'adaptive_thresholds': False,       # umbral por usuario calculado con 'herramientas.py calibrar-umbrales'
+    'adaptive_threshold_far': 0.001,    # FAR objetivo de cada usuario frente al resto de la galería
+    'adaptive_threshold_sigma': 2.0,    # desviaciones bajo la media de sus similitudes genuinas
+    'adaptive_threshold_min_samples': 5,
+    'adaptive_threshold_range': (0.5, 0.95),
+    'adaptive_threshold_reload': 300,   # segundos entre relecturas de los umbrales calibrados (0: solo al arrancar)
+    'top_k': 3,
+    'feature_type': 'hist256_v1',       # 'hist256_v1' o 'lbp_u2_7x7_v1' (recalibrar similarity_threshold al cambiarlo)
+    'face_detector': 'haar',            # 'haar', 'lbp' o 'yunet' (cv2.FaceDetectorYN)
+    'lbp_cascade_path': 'modelos/lbpcascade_frontalface_improved.xml',
+    'yunet_model_path': 'modelos/face_detection_yunet_2023mar.onnx',
+    'yunet_score_threshold': 0.8,
+    'duplicate_threshold': 0.9,         # similitud a partir de la cual dos usuarios parecen la misma persona
+    'duplicate_policy': 'warn',         # al registrar un rostro parecido a otro usuario: 'warn', 'block' u 'off'
+    'duplicate_report_path': 'duplicados.json',
+    'quality_gate': True,               # descarta rostros pequeños, movidos o mal expuestos antes de comparar
+    'quality_min_face': 80,             # lado mínimo del rostro en píxeles
+    'quality_min_sharpness': 25.0,      # varianza del Laplaciano sobre el rostro reducido a 64x64
+    'quality_brightness_range': (40, 215),
+    'quality_edge_margin': 2,           # píxeles mínimos entre el rostro y el borde del frame
+    'capture_mode': 'manual',           # 'manual' (ESPACIO) o 'continuous' (mejor frame de una ventana)
+    'quality_window': 1.0,              # segundos de la ventana de captura continua
+    'result_cache': True,               # reutiliza la identificación de frames casi idénticos de una cámara
+    'result_cache_ttl': 2.0,            # segundos que vale un resultado (se descarta antes si cambia la galería)
+    'result_cache_size': 256,
+    'result_cache_max_distance': 4,     # bits distintos admitidos entre hashes perceptuales (de 64)
+    'max_templates_per_user': 5,
+    'template_replacement': 'diverse',  # 'diverse' o 'fifo'
+    'template_scoring': 'max',          # 'max' o 'mean_top'
+    'template_top_m': 2,
+    'gallery_storage': 'float32',       # 'float32', 'float16' (solo instantáneas/memoria compartida más pequeñas) o 'uint8' (menos RAM, búsqueda ~2x más lenta)
+    'ann_index': False,                 # índice aproximado para galerías muy grandes
+    'ann_nlist': 256,
+    'ann_nprobe': 8,
+    'ann_min_templates': 20000,
+    'shared_gallery_name': None,        # p. ej. 'galeria_facial' para publicar en memoria compartida
+    'watch_faces_dir': False,           # recarga en caliente de known_faces_dir
+    'watch_interval': 2.0,
+    'gallery_snapshot': None,           # p. ej. 'galeria.fgs': arranque desde una instantánea exportada
+    'template_source': 'files',         # 'files' (imágenes en disco) o 'database' (tabla plantillas)
+    'template_sync_interval': 0,        # segundos entre sincronizaciones incrementales (0: desactivada)
+    'template_sync_overlap': 5.0,       # margen en segundos para no perder filas confirmadas tarde
+    'gallery_shards': 0,                # >1: búsqueda 1:N repartida entre procesos (galerías muy grandes)
+    'central_gallery_port': 8100,       # puerto del servicio central de galería
+    'central_gallery_host': '127.0.0.1',   # interfaz de escucha ('0.0.0.0' para las puertas de la red)
+    'central_gallery_token': None,      # secreto compartido con los nodos; obligatorio fuera de la máquina local
+    'central_gallery_url': None,        # p. ej. 'http://central:8100': este equipo es un nodo de puerta
+    'node_id': 'puerta-1',
+    'node_snapshot_path': 'galeria_nodo.fgs',
+    'node_sync_interval': 5.0,
+    'node_event_batch': 100,
+    'node_max_pending_events': 100000,
+    'node_events_path': 'eventos_nodo.jsonl',   # accesos pendientes de enviar (sobreviven a un reinicio)
+    'recognition_service_port': 8200,   # servicio HTTP de reconocimiento por lotes (POST /reconocer)
+    'recognition_batch_size': 16,       # máximo de peticiones agrupadas en un lote
+    'recognition_max_wait_ms': 10,      # espera máxima para completar un lote
+    'recognition_workers': None,        # procesos de extracción (None: uno por núcleo)
+    'recognition_timeout': 10.0,
+    'recognition_max_body_bytes': 10 * 1024 * 1024,   # imágenes mayores se rechazan con 413
+    'profiling': False,                 # etapas de cada intento de acceso en profiling_dir/etapas-<pid>.jsonl
+    'profiling_dir': 'perfiles',
+    'profiling_sample_rate': 1.0,       # fracción de intentos que se perfilan
+    'profiling_slow_ms': None,          # p. ej. 2000: guarda un perfil cProfile de los intentos más lentos
     'web_server_port': 8000,
     'admin_password': "123456798"
 }
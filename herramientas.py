@@ -0,0 +1,353 @@
+# Herramientas de línea de comandos para tareas offline del sistema
+import argparse
+from clases.reconocimiento_fac import FacialRecognition
+
+
+def cmd_identificar_lote(args):
+    """Identificación por lotes sobre carpetas de imágenes y videos"""
+    from clases.identificacion_lote import BatchIdentifier
+
+    face_recognition = FacialRecognition(None, services=False)
+    identifier = BatchIdentifier(
+        face_recognition,
+        workers=args.procesos,
+        top_k=args.top_k,
+        output_format=args.formato,
+        frame_step=args.paso_frames
+    )
+    identifier.run(args.entradas, args.salida)
+
+
+def cmd_importar(args):
+    """Alta masiva de usuarios y rostros desde una carpeta o un zip"""
+    from clases.importacion_masiva import BulkImporter
+
+    db = None
+    if not args.sin_bd:
+        from clases.database import DatabaseManager
+        db = DatabaseManager()
+        if not db.test_connection():
+            raise SystemExit(1)
+
+    # La galería se carga sin sincronizar usuarios: el importador los crea con sus credenciales
+    face_recognition = FacialRecognition(None, services=False)
+    face_recognition.db = db
+    importer = BulkImporter(face_recognition, db, workers=args.procesos, chunk_size=args.bloque)
+    importer.run(args.origen, args.informe, credentials_path=args.credenciales)
+    face_recognition.close()
+
+
+def cmd_exportar_galeria(args):
+    """Exporta la galería a un archivo de instantánea completo o delta"""
+    from clases.instantanea_galeria import gallery_diff
+
+    db = None
+    if not args.sin_bd:
+        from clases.database import DatabaseManager
+        db = DatabaseManager()
+        if not db.test_connection():
+            raise SystemExit(1)
+
+    current = FacialRecognition(None, services=False)
+    if not args.base:
+        current.db = db
+        current.export_gallery(args.salida)
+        return
+
+    # Delta: se parte de la instantánea base y se aplican las diferencias con el disco
+    node = FacialRecognition(db, load_faces=False)
+    base = node.load_gallery_snapshot(args.base)
+    upserts, removals = gallery_diff(node.gallery, current.gallery)
+    node.gallery_service.apply(upserts, removals)
+    node.export_gallery(args.salida, since_version=base.version)
+
+
+def cmd_verificar_galeria(args):
+    """Comprueba la suma de verificación de una instantánea y muestra su contenido"""
+    from clases.instantanea_galeria import read_snapshot_file
+
+    snapshot = read_snapshot_file(args.archivo)
+    kind = f"delta desde la versión {snapshot.base_version}" if snapshot.is_delta else "completa"
+    print(f"✅ Instantánea {kind}, versión {snapshot.version}, época {snapshot.epoch}")
+    print(f"   {len(snapshot.gallery)} usuarios, {snapshot.gallery.template_count} plantillas "
+          f"({snapshot.gallery.storage}), {len(snapshot.user_ids)} con id de usuario, "
+          f"{len(snapshot.removed)} rutas eliminadas")
+
+
+def cmd_migrar_plantillas(args):
+    """Guarda en la tabla de plantillas las extraídas de las imágenes en disco"""
+    from clases.database import DatabaseManager
+
+    db = DatabaseManager()
+    if not db.test_connection() or not db.create_tables():
+        raise SystemExit(1)
+
+    # La carga desde disco sincroniza también los usuarios que falten en la base de datos
+    face_recognition = FacialRecognition(db, services=False)
+    names, matrix = face_recognition.gallery.matrix()
+    paths = face_recognition.gallery.paths()
+    for start in range(0, len(paths), args.bloque):
+        end = start + args.bloque
+        if not db.save_templates(list(zip(names[start:end], paths[start:end], matrix[start:end])),
+                                 face_recognition.feature_type):
+            raise SystemExit(1)
+        print(f"🗄️  {min(end, len(paths))}/{len(paths)} plantillas guardadas")
+    face_recognition.close()
+
+
+def cmd_galeria_central(args):
+    """Servicio central de galería para los nodos de puerta"""
+    import time
+    from clases.galeria_central import CentralGalleryServer
+
+    db = None
+    if not args.sin_bd:
+        from clases.database import DatabaseManager
+        db = DatabaseManager()
+        if not db.test_connection() or not db.create_tables():
+            raise SystemExit(1)
+
+    face_recognition = FacialRecognition(db)
+    central = CentralGalleryServer(face_recognition, db, port=args.puerto, host=args.host)
+    if not central.start():
+        face_recognition.close()
+        raise SystemExit(1)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo galería central")
+    finally:
+        central.shutdown()
+        face_recognition.close()
+
+
+def cmd_descargar_modelos(args):
+    """Descarga y comprueba los modelos de los detectores LBP y YuNet"""
+    import cv2
+    from clases.detectores import MODEL_SOURCES, download_model
+
+    failed = False
+    for backend in args.detectores or list(MODEL_SOURCES):
+        if backend not in MODEL_SOURCES:
+            print(f"❌ Detector sin modelo descargable: {backend} (disponibles: {', '.join(MODEL_SOURCES)})")
+            failed = True
+            continue
+        try:
+            path = download_model(backend, force=args.forzar)
+            print(f"✅ Modelo '{backend}' listo: {path}")
+        except (OSError, ValueError, SystemError, cv2.error) as e:
+            print(f"❌ Modelo '{backend}': {e}")
+            failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+def cmd_servicio_reconocimiento(args):
+    """Servicio HTTP de reconocimiento por micro-lotes"""
+    import time
+    from clases.servicio_reconocimiento import RecognitionServer
+
+    face_recognition = FacialRecognition(None)
+    server = RecognitionServer(face_recognition, port=args.puerto, batch_size=args.lote,
+                               max_wait_ms=args.espera_ms, workers=args.procesos)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo servicio de reconocimiento")
+    finally:
+        server.shutdown()
+        face_recognition.close()
+
+
+def cmd_evaluar_umbral(args):
+    """FAR/FRR sobre un directorio etiquetado para calibrar el umbral de similitud"""
+    from clases.evaluacion import ThresholdEvaluator
+
+    evaluator = ThresholdEvaluator(workers=args.procesos, tile=args.bloque)
+    if evaluator.run(args.datos, args.salida) is None:
+        raise SystemExit(1)
+
+
+def cmd_calibrar_umbrales(args):
+    """Umbral de similitud por usuario a partir de sus accesos y del resto de la galería"""
+    from clases.database import DatabaseManager
+    from clases.umbrales_adaptativos import AdaptiveThresholdCalibrator
+
+    db = DatabaseManager()
+    if not db.test_connection() or not db.create_tables():
+        raise SystemExit(1)
+
+    face_recognition = FacialRecognition(db, services=False)
+    calibrator = AdaptiveThresholdCalibrator(face_recognition, db, target_far=args.far, sigma=args.sigma)
+    calibrator.run()
+    face_recognition.close()
+
+
+def cmd_buscar_duplicados(args):
+    """Pares de usuarios de la galería que parecen la misma persona"""
+    from clases.duplicados import DuplicateDetector
+
+    face_recognition = FacialRecognition(None, services=False)
+    detector = DuplicateDetector(face_recognition, threshold=args.umbral, tile=args.bloque)
+    report = detector.run(args.informe)
+    face_recognition.close()
+    if report is None:
+        raise SystemExit(1)
+
+
+def cmd_resumen_perfiles(args):
+    """Percentiles por etapa de los archivos de etapas del modo de perfilado"""
+    import json
+    import config
+    from clases.perfilado import summarize_spans
+
+    summary = summarize_spans(args.rutas or [config.SYSTEM_CONFIG['profiling_dir']])
+    if not summary:
+        print("❌ No hay etapas registradas (active 'profiling' en la configuración)")
+        raise SystemExit(1)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'INTENTO':<14} {'ETAPA':<18} {'N':>6} {'X/INT':>6} {'P50 MS':>9} {'P90 MS':>9} "
+          f"{'P99 MS':>9} {'MAX MS':>9}")
+    print("-" * 86)
+    for row in summary:
+        print(f"{row['intento']:<14} {row['etapa']:<18} {row['muestras']:>6} {row['por_intento']:>6.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}")
+
+
+def cmd_generar_datos(args):
+    """Usuarios, accesos y rostros sintéticos deterministas para pruebas de escala"""
+    from datetime import date
+    from clases.database import DatabaseManager
+    from clases.datos_sinteticos import SyntheticDataGenerator
+
+    db = DatabaseManager()
+    if not db.test_connection() or not db.create_tables():
+        raise SystemExit(1)
+
+    generator = SyntheticDataGenerator(
+        db,
+        seed=args.semilla,
+        batch_size=args.bloque,
+        days=args.dias,
+        end=date.fromisoformat(args.hasta) if args.hasta else None,
+        allowed_ratio=args.permitidos,
+        prefix=args.prefijo
+    )
+    users = generator.load_users(args.usuarios)
+    if not users:
+        raise SystemExit(1)
+    if args.rostros == 'plantillas' and generator.load_templates(users, args.por_usuario) is None:
+        raise SystemExit(1)
+    if args.rostros == 'imagenes':
+        generator.write_images(users, args.por_usuario, args.directorio)
+    if args.accesos and generator.load_accesses(users, args.accesos) is None:
+        raise SystemExit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Herramientas del sistema de reconocimiento facial")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    lote = subparsers.add_parser('identificar-lote', help="Identifica rostros en imágenes y videos almacenados")
+    lote.add_argument('entradas', nargs='+', help="Carpetas, imágenes o videos")
+    lote.add_argument('--salida', required=True, help="Archivo de resultados (se reanuda si existe)")
+    lote.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+    lote.add_argument('--procesos', type=int, default=None, help="Procesos de trabajo (por defecto: núcleos)")
+    lote.add_argument('--top-k', type=int, default=3)
+    lote.add_argument('--paso-frames', type=int, default=1, help="Procesar 1 de cada N frames de video")
+    lote.set_defaults(func=cmd_identificar_lote)
+
+    importar = subparsers.add_parser('importar', help="Importa usuarios y rostros desde una carpeta o un zip")
+    importar.add_argument('origen', help="Carpeta o zip con <usuario>.jpg, <usuario>.N.jpg o <usuario>/*.jpg "
+                          "(una única carpeta que lo envuelve todo se ignora)")
+    importar.add_argument('--informe', required=True, help="CSV con el resultado por imagen (se reanuda si existe)")
+    importar.add_argument('--credenciales', help="CSV con columnas usuario,password")
+    importar.add_argument('--procesos', type=int, default=None, help="Procesos de trabajo (por defecto: núcleos)")
+    importar.add_argument('--bloque', type=int, default=500, help="Imágenes por inserción y actualización de galería")
+    importar.add_argument('--sin-bd', action='store_true', help="Solo actualiza la galería, sin crear usuarios")
+    importar.set_defaults(func=cmd_importar)
+
+    exportar = subparsers.add_parser('exportar-galeria', help="Exporta la galería a una instantánea binaria")
+    exportar.add_argument('salida', help="Archivo de instantánea a escribir")
+    exportar.add_argument('--base', help="Instantánea anterior: exporta solo los cambios desde ella")
+    exportar.add_argument('--sin-bd', action='store_true', help="No incluir los ids de usuario")
+    exportar.set_defaults(func=cmd_exportar_galeria)
+
+    verificar = subparsers.add_parser('verificar-galeria', help="Comprueba una instantánea de la galería")
+    verificar.add_argument('archivo')
+    verificar.set_defaults(func=cmd_verificar_galeria)
+
+    migrar = subparsers.add_parser('migrar-plantillas', help="Copia las plantillas del disco a la base de datos")
+    migrar.add_argument('--bloque', type=int, default=1000, help="Plantillas por transacción")
+    migrar.set_defaults(func=cmd_migrar_plantillas)
+
+    central = subparsers.add_parser('galeria-central', help="Sirve la galería a los nodos de puerta")
+    central.add_argument('--puerto', type=int, default=None, help="Puerto HTTP (por defecto: configuración)")
+    central.add_argument('--host', default=None,
+                         help="Interfaz de escucha (por defecto: configuración; fuera de la máquina local "
+                              "requiere central_gallery_token)")
+    central.add_argument('--sin-bd', action='store_true', help="Sin base de datos: eventos solo en memoria")
+    central.set_defaults(func=cmd_galeria_central)
+
+    modelos = subparsers.add_parser('descargar-modelos', help="Descarga y comprueba los modelos de los detectores")
+    modelos.add_argument('detectores', nargs='*', help="Detectores a preparar: lbp, yunet (por defecto: todos)")
+    modelos.add_argument('--forzar', action='store_true', help="Vuelve a descargar aunque el modelo ya exista")
+    modelos.set_defaults(func=cmd_descargar_modelos)
+
+    servicio = subparsers.add_parser('servicio-reconocimiento', help="Reconocimiento por HTTP agrupando peticiones")
+    servicio.add_argument('--puerto', type=int, default=None, help="Puerto HTTP (por defecto: configuración)")
+    servicio.add_argument('--lote', type=int, default=None, help="Máximo de peticiones por lote")
+    servicio.add_argument('--espera-ms', type=float, default=None, help="Espera máxima para completar un lote")
+    servicio.add_argument('--procesos', type=int, default=None, help="Procesos de extracción (por defecto: núcleos)")
+    servicio.set_defaults(func=cmd_servicio_reconocimiento)
+
+    evaluar = subparsers.add_parser('evaluar-umbral', help="Curvas ROC/DET, EER y umbrales recomendados")
+    evaluar.add_argument('datos', help="Carpeta con <persona>/*.jpg o <persona>.N.jpg")
+    evaluar.add_argument('--salida', default='evaluacion', help="Prefijo de los archivos .csv y .json")
+    evaluar.add_argument('--procesos', type=int, default=None, help="Procesos de extracción (por defecto: núcleos)")
+    evaluar.add_argument('--bloque', type=int, default=2048, help="Lado del bloque de la matriz de similitudes")
+    evaluar.set_defaults(func=cmd_evaluar_umbral)
+
+    calibrar = subparsers.add_parser('calibrar-umbrales', help="Recalcula los umbrales de los usuarios con accesos nuevos")
+    calibrar.add_argument('--far', type=float, default=None, help="FAR objetivo por usuario (por defecto: configuración)")
+    calibrar.add_argument('--sigma', type=float, default=None, help="Desviaciones bajo la media genuina")
+    calibrar.set_defaults(func=cmd_calibrar_umbrales)
+
+    duplicados = subparsers.add_parser('buscar-duplicados', help="Busca usuarios registrados dos veces en la galería")
+    duplicados.add_argument('--umbral', type=float, default=None, help="Similitud mínima (por defecto: configuración)")
+    duplicados.add_argument('--informe', default=None, help="Archivo JSON del informe (también se escribe un .csv)")
+    duplicados.add_argument('--bloque', type=int, default=4096, help="Lado del bloque de la matriz de similitudes")
+    duplicados.set_defaults(func=cmd_buscar_duplicados)
+
+    perfiles = subparsers.add_parser('resumen-perfiles', help="Percentiles por etapa de los intentos perfilados")
+    perfiles.add_argument('rutas', nargs='*', help="Archivos o carpetas de etapas (por defecto: profiling_dir)")
+    perfiles.add_argument('--json', action='store_true', help="Salida en JSON")
+    perfiles.set_defaults(func=cmd_resumen_perfiles)
+
+    generar = subparsers.add_parser('generar-datos', help="Carga usuarios, accesos y rostros sintéticos")
+    generar.add_argument('--usuarios', type=int, default=10000)
+    generar.add_argument('--accesos', type=int, default=1000000)
+    generar.add_argument('--semilla', type=int, default=0, help="Misma semilla (y --hasta), mismos datos")
+    generar.add_argument('--dias', type=int, default=365, help="Días de historial de accesos")
+    generar.add_argument('--hasta', default=None, help="Último día del historial, AAAA-MM-DD (por defecto: hoy)")
+    generar.add_argument('--permitidos', type=float, default=0.85, help="Proporción de accesos permitidos")
+    generar.add_argument('--rostros', choices=['plantillas', 'imagenes', 'ninguno'], default='plantillas',
+                         help="Plantillas en la base de datos o imágenes en disco para la galería")
+    generar.add_argument('--por-usuario', type=int, default=2, help="Plantillas o imágenes por usuario")
+    generar.add_argument('--directorio', default=None, help="Carpeta de imágenes (por defecto: known_faces_dir)")
+    generar.add_argument('--prefijo', default='sintetico', help="Prefijo de los nombres de usuario")
+    generar.add_argument('--bloque', type=int, default=10000, help="Filas por INSERT y por transacción")
+    generar.set_defaults(func=cmd_generar_datos)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
@@ -15,7 +15,25 @@ class FacialRecognitionSystem:
         
         # Inicializar componentes
         self.db = DatabaseManager()
-        self.face_recognition = FacialRecognition(self.db)
+        self.door_node = None
+        if config.SYSTEM_CONFIG['central_gallery_url']:
+            # Nodo de puerta: la galería se replica desde el servidor central
+            from clases.galeria_central import DoorNode
+            self.face_recognition = FacialRecognition(self.db, load_faces=False)
+            self.door_node = DoorNode(
+                self.face_recognition,
+                config.SYSTEM_CONFIG['central_gallery_url'],
+                config.SYSTEM_CONFIG['node_id'],
+                config.SYSTEM_CONFIG['node_snapshot_path'],
+                sync_interval=config.SYSTEM_CONFIG['node_sync_interval'],
+                event_batch=config.SYSTEM_CONFIG['node_event_batch'],
+                max_pending_events=config.SYSTEM_CONFIG['node_max_pending_events'],
+                events_path=config.SYSTEM_CONFIG['node_events_path']
+            )
+            self.db.access_listeners.append(self.door_node.record_access)
+            self.door_node.start()
+        else:
+            self.face_recognition = FacialRecognition(self.db)
         self.email_sender = EmailSender(self.db)
         self.voice_handler = VoiceHandler()
         self.web_server = WebServerManager(self.db)
@@ -53,6 +71,9 @@ class FacialRecognitionSystem:
                         print("👋 ¡Hasta pronto!")
                         if self.web_server.web_server:
                             self.web_server.web_server.shutdown()
+                        if self.door_node:
+                            self.door_node.stop()
+                        self.face_recognition.close()
                         break
                     else:
                         print("❌ Opción no válida")
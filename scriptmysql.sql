@@ -47,4 +47,19 @@ LIMIT 10;
 
 -- 5. MANTENIMIENTO
 -- Elimina todos los registros de acceso del día actual (limpieza)
-DELETE FROM accesos WHERE DATE(fecha_acceso) = CURDATE();
\ No newline at end of file
+DELETE FROM accesos WHERE DATE(fecha_acceso) = CURDATE();
+
+-- 6. PLANTILLAS FACIALES
+-- Plantillas vigentes por usuario y tipo de características
+SELECT u.nombre, p.tipo_caracteristicas, COUNT(*) AS plantillas, MAX(p.fecha_actualizacion) AS ultima_actualizacion
+FROM plantillas p
+JOIN usuarios u ON p.usuario_id = u.id
+WHERE p.eliminada = FALSE
+GROUP BY u.nombre, p.tipo_caracteristicas
+ORDER BY u.nombre;
+-- 7. UMBRALES POR USUARIO
+-- Umbral propio de cada usuario frente al impostor más cercano y sus similitudes genuinas
+SELECT u.nombre, t.umbral, t.umbral_impostor, t.muestras, t.media, t.fecha_actualizacion
+FROM umbrales_usuario t
+JOIN usuarios u ON t.usuario_id = u.id
+ORDER BY t.umbral DESC;